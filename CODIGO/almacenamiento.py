@@ -0,0 +1,2709 @@
+import csv
+import hashlib
+import hmac
+import io
+import json
+import mmap
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import libro_mayor
+import merkle
+from archivos import escribir_atomico, sincronizar_directorio, valor_csv
+from bitacora import (COLUMNAS_BITACORA, COLUMNAS_ENCADENAMIENTO, CSV_BITACORA_HEREDADA, HASH_GENESIS,
+                      _clave_firma, calcular_hash_evento, firmar_sello, obtener_bitacora)
+from configuracion import DIRECTORIO_DATOS, ruta_datos, ruta_fragmentada
+
+# ==========================================
+# CONSTANTES DE ALMACENAMIENTO
+# ==========================================
+COLUMNAS_BLOQUE = [
+    'numero_bloque', 'hash_documento', 'nombre_documento', 'tipo', 'fecha_creacion',
+    'fecha_actualizacion', 'version', 'estatus', 'modificacion', 'creador', 'area',
+    'revisor', 'aprobador', 'no_conformidad', 'auditoria', 'hash_bloque_anterior',
+    'timestamp', 'accion', 'hash_bloque', 'usuario_accion'
+]
+
+COLUMNAS_REGISTRO = [
+    'HASH', 'NOMBRE', 'TIPO', 'FECHA_CREACION', 'FECHA_ACTUALIZACION',
+    'VERSION', 'ESTATUS', 'MODIFICACION', 'CREADOR', 'AREA', 'REVISOR',
+    'APROBADOR', 'NO_CONFORMIDAD', 'AUDITORIA'
+]
+
+COLUMNAS_CABEZA = ['hash_documento', 'numero_bloque', 'hash_bloque', 'accion', 'timestamp', 'tamaño']
+
+COLUMNAS_PUNTO_CONTROL = ['hash_documento', 'numero_bloque', 'hash_bloque']
+
+COLUMNAS_ACCION = ['clave', 'hash_documento', 'accion', 'usuario_accion', 'numero_bloque']
+
+CSV_REGISTROS = ruta_datos("registro_documentos.csv")
+INDICE_CABEZAS = ruta_datos("indice_cabezas.csv")
+INDICE_ACCIONES = ruta_datos("indice_acciones.csv")
+PUNTOS_CONTROL = ruta_datos("puntos_control.csv")
+BASE_DATOS_SQLITE = ruta_datos("clein.db")
+ARCHIVO_TRANSACCIONES = ruta_datos("transacciones.wal")
+ESTADO_TRANSACCIONES = ruta_datos("transacciones_estado.json")
+INDICE_DIGESTOS = ruta_datos("indice_digestos.bin")
+
+# Columnas del registro con índice secundario (listas de filas por valor) para las vistas filtradas
+COLUMNAS_INDEXADAS = ('AREA', 'ESTATUS', 'TIPO')
+
+# Transacciones confirmadas entre dos puntos de control del registro de transacciones
+TRANSACCIONES_POR_PUNTO = int(os.environ.get("CLEIN_TRANSACCIONES_POR_PUNTO", "64"))
+
+# Candados por franja de documentos para las escrituras concurrentes
+NUMERO_CANDADOS_DOCUMENTO = 256
+
+# Confirmación en grupo: segundos que el escritor espera más transacciones y máximo por lote
+VENTANA_ESCRITURA = float(os.environ.get("CLEIN_VENTANA_ESCRITURA", "0.002"))
+LOTE_ESCRITURA = int(os.environ.get("CLEIN_LOTE_ESCRITURA", "256"))
+
+# Formato de las cadenas nuevas: "csv" o "binario" (registros de ancho fijo con diccionario)
+FORMATO_CADENA = os.environ.get("CLEIN_FORMATO_CADENA", "csv")
+
+# Backend activo: "csv" (archivos sueltos) o "sqlite" (base de datos embebida en modo WAL)
+BACKEND_ALMACENAMIENTO = os.environ.get("CLEIN_BACKEND", "csv")
+TAMAÑO_LECTURA_COLA = 4096
+TAMAÑO_PAGINA_INVERSA = 64
+
+# ==========================================
+# ARCHIVOS DE CADENA (SOLO ANEXAR)
+# ==========================================
+
+def ruta_archivo_cadena(hash_doc, nombre):
+    """Ruta de un archivo de la cadena: la fragmentada o, si aún no se migró, la plana"""
+    ruta = ruta_fragmentada(hash_doc, nombre)
+    if not os.path.exists(ruta) and os.path.exists(ruta_datos(nombre)):
+        return ruta_datos(nombre)
+    return ruta
+
+def ruta_blockchain(hash_doc):
+    """Devuelve la ruta del archivo de cadena de un documento (binario o CSV)"""
+    base = f"blockchain_{hash_doc[:16]}"
+    for extension in (EXTENSION_BINARIA, '.csv'):
+        for ruta in (ruta_fragmentada(hash_doc, base + extension), ruta_datos(base + extension)):
+            if os.path.exists(ruta):
+                return ruta
+
+    # Cadena nueva: se crea fragmentada y en el formato configurado
+    return ruta_fragmentada(hash_doc, base + (EXTENSION_BINARIA if FORMATO_CADENA == 'binario' else '.csv'))
+
+def leer_encabezado_cadena(ruta):
+    """Lee solo la primera línea del archivo de cadena y devuelve sus columnas"""
+    with open(ruta, 'r', encoding='utf-8', newline='') as f:
+        primera_linea = f.readline()
+    if not primera_linea.strip():
+        return None
+    return next(csv.reader([primera_linea]))
+
+def _fin_filas_completas(f):
+    """Posición donde termina la última fila completa del archivo de cadena.
+
+    Las filas terminan en CRLF; si el archivo no termina así, la última quedó a medio
+    escribir (o es una cadena anterior escrita solo con LF). Como un texto puede llevar
+    saltos de línea entre comillas, se busca desde el inicio el último salto de línea con
+    un número par de comillas acumuladas.
+    """
+    tamaño = f.seek(0, os.SEEK_END)
+    if tamaño == 0:
+        return 0
+    f.seek(max(0, tamaño - 2))
+    if f.read(2) == b'\r\n':
+        return tamaño
+
+    f.seek(0)
+    fin = 0
+    comillas = 0
+    desplazamiento = 0
+    while True:
+        datos = f.read(TAMAÑO_LECTURA_COLA)
+        if not datos:
+            return fin
+        inicio = 0
+        salto = datos.find(b'\n')
+        while salto != -1:
+            comillas += datos.count(b'"', inicio, salto)
+            if comillas % 2 == 0:
+                fin = desplazamiento + salto + 1
+            inicio = salto + 1
+            salto = datos.find(b'\n', inicio)
+        comillas += datos.count(b'"', inicio)
+        desplazamiento += len(datos)
+
+def _reparar_cola(f):
+    """Descarta una fila incompleta al final del archivo (escritura interrumpida)"""
+    fin = _fin_filas_completas(f)
+    if fin < f.seek(0, os.SEEK_END):
+        f.truncate(fin)
+    f.seek(0, os.SEEK_END)
+
+def escribir_bloque(ruta, bloque, sincronizar=True):
+    """Anexa un bloque al archivo de cadena sin reescribir los bloques anteriores.
+
+    Devuelve el tamaño final del archivo, que el índice de cabezas usa para detectar desfases.
+    Con sincronizar=False no hace fsync (la durabilidad la da el registro de transacciones).
+    """
+    if ruta.endswith(EXTENSION_BINARIA):
+        return escribir_bloque_binario(ruta, bloque, sincronizar)
+
+    nuevo_archivo = not os.path.exists(ruta)
+
+    with open(ruta, 'ab+') as f:
+        _reparar_cola(f)
+        vacio = f.tell() == 0
+
+        if vacio:
+            columnas = COLUMNAS_BLOQUE
+        else:
+            columnas = leer_encabezado_cadena(ruta) or COLUMNAS_BLOQUE
+
+        # Construir la fila completa en memoria para escribirla en una sola operación
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        if vacio:
+            escritor.writerow(columnas)
+        escritor.writerow([valor_csv(bloque.get(col, '')) for col in columnas])
+
+        f.seek(0, os.SEEK_END)
+        f.write(buffer.getvalue().encode('utf-8'))
+        f.flush()
+        if sincronizar:
+            os.fsync(f.fileno())
+        tamaño_final = f.tell()
+
+    if nuevo_archivo and sincronizar:
+        sincronizar_directorio(ruta)
+    return tamaño_final
+
+def iterar_bloques_inverso(ruta):
+    """Recorre los bloques de una cadena del más reciente al más antiguo leyendo desde el final.
+
+    Solo lee del archivo lo necesario para cada bloque producido.
+    """
+    if not os.path.exists(ruta):
+        return
+
+    if ruta.endswith(EXTENSION_BINARIA):
+        fin = contar_bloques_binario(ruta)
+        while fin > 0:
+            inicio = max(0, fin - TAMAÑO_PAGINA_INVERSA)
+            yield from reversed(_leer_registros_binarios(ruta, inicio, fin))
+            fin = inicio
+        return
+
+    columnas = leer_encabezado_cadena(ruta)
+    if not columnas:
+        return
+
+    with open(ruta, 'rb') as f:
+        inicio_datos = len(f.readline())
+        # Una fila a medio escribir al final no es un bloque
+        fin = _fin_filas_completas(f)
+        leido = TAMAÑO_LECTURA_COLA
+
+        while fin > inicio_datos:
+            # La ventana incluye el salto de línea del encabezado para reconocer la primera fila
+            inicio_ventana = max(inicio_datos - 1, fin - leido)
+            f.seek(inicio_ventana)
+            cola = f.read(fin - inicio_ventana).rstrip(b'\r\n')
+
+            # Probar cada inicio de línea desde el final; un comentario puede contener saltos de línea
+            posicion = len(cola)
+            bloque = None
+            while posicion > 0:
+                posicion = cola.rfind(b'\n', 0, posicion)
+                if posicion == -1:
+                    break
+                filas = list(csv.reader(io.StringIO(cola[posicion + 1:].decode('utf-8', errors='replace'))))
+                if (len(filas) == 1 and len(filas[0]) == len(columnas)
+                        and filas[0][0].isdigit()):
+                    bloque = dict(zip(columnas, filas[0]))
+                    break
+
+            if bloque is None:
+                if inicio_ventana <= inicio_datos - 1:
+                    return
+                leido *= 2
+                continue
+
+            yield bloque
+            fin = inicio_ventana + posicion
+            leido = TAMAÑO_LECTURA_COLA
+
+def leer_ultimo_bloque(ruta):
+    """Lee el último bloque de una cadena desde el final del archivo, sin recorrerla completa"""
+    return next(iterar_bloques_inverso(ruta), None)
+
+# ==========================================
+# FORMATO BINARIO DE CADENA
+# ==========================================
+# blockchain_<hash16>.blk: cabecera + registros de ancho fijo (lectura del bloque k en O(1)).
+# blockchain_<hash16>.dic: diccionario de textos de solo anexar; cada texto se guarda una
+# vez como <longitud uint32><utf-8> y los registros lo referencian por su desplazamiento.
+# Los hashes se guardan como los 32 bytes crudos del digest SHA-256.
+
+EXTENSION_BINARIA = ".blk"
+EXTENSION_DICCIONARIO = ".dic"
+MAGIA_BINARIA = b"CLEINBLK"
+VERSION_BINARIA = 1
+
+CAMPOS_DIGEST = ['hash_documento', 'hash_bloque_anterior', 'hash_bloque']
+CAMPOS_TEXTO = [col for col in COLUMNAS_BLOQUE if col != 'numero_bloque' and col not in CAMPOS_DIGEST]
+
+FORMATO_CABECERA = struct.Struct('<8sHHI')
+FORMATO_REGISTRO = struct.Struct('<I' + '32s' * len(CAMPOS_DIGEST) + 'I' * len(CAMPOS_TEXTO))
+FORMATO_LONGITUD = struct.Struct('<I')
+TEXTO_VACIO = 0xFFFFFFFF
+DIGEST_GENESIS = bytes(32)
+
+_diccionarios = {}
+_candado_binario = threading.Lock()
+
+def ruta_diccionario(ruta):
+    """Devuelve la ruta del diccionario de textos asociado a una cadena binaria"""
+    return ruta[:-len(EXTENSION_BINARIA)] + EXTENSION_DICCIONARIO
+
+def _digest_a_bytes(valor):
+    """Convierte un hash hexadecimal (o '0' del génesis) en sus 32 bytes crudos"""
+    valor = str(valor_csv(valor))
+    if valor in ('', '0'):
+        return DIGEST_GENESIS
+    return bytes.fromhex(valor)
+
+def _bytes_a_digest(valor):
+    """Convierte 32 bytes crudos en el hash hexadecimal ('0' para el génesis)"""
+    return '0' if valor == DIGEST_GENESIS else valor.hex()
+
+def _cargar_diccionario(ruta_dic):
+    """Devuelve el mapa texto -> desplazamiento del diccionario, leyendo solo lo agregado"""
+    estado = _diccionarios.setdefault(ruta_dic, {'posicion': 0, 'desplazamientos': {}})
+    if not os.path.exists(ruta_dic):
+        estado.update(posicion=0, desplazamientos={})
+        return estado
+
+    tamaño = os.path.getsize(ruta_dic)
+    if tamaño < estado['posicion']:
+        estado.update(posicion=0, desplazamientos={})
+    if tamaño == estado['posicion']:
+        return estado
+
+    with open(ruta_dic, 'rb') as f:
+        f.seek(estado['posicion'])
+        datos = f.read(tamaño - estado['posicion'])
+
+    posicion = 0
+    while posicion + FORMATO_LONGITUD.size <= len(datos):
+        (longitud,) = FORMATO_LONGITUD.unpack_from(datos, posicion)
+        fin = posicion + FORMATO_LONGITUD.size + longitud
+        if fin > len(datos):
+            break  # Entrada incompleta por una escritura interrumpida
+        texto = datos[posicion + FORMATO_LONGITUD.size:fin].decode('utf-8')
+        estado['desplazamientos'].setdefault(texto, estado['posicion'] + posicion)
+        posicion = fin
+
+    estado['posicion'] += posicion
+    return estado
+
+def contar_bloques_binario(ruta):
+    """Cuenta los registros completos de una cadena binaria a partir del tamaño del archivo"""
+    try:
+        tamaño = os.path.getsize(ruta)
+    except OSError:
+        return 0
+    if tamaño < FORMATO_CABECERA.size:
+        return 0
+    return (tamaño - FORMATO_CABECERA.size) // FORMATO_REGISTRO.size
+
+def escribir_bloque_binario(ruta, bloque, sincronizar=True):
+    """Anexa un bloque a una cadena binaria: primero sus textos nuevos y luego el registro"""
+    ruta_dic = ruta_diccionario(ruta)
+
+    with _candado_binario:
+        diccionario = _cargar_diccionario(ruta_dic)
+
+        # Anexar al diccionario solo los textos que aún no existen
+        nuevos = io.BytesIO()
+        referencias = []
+        with open(ruta_dic, 'ab') as f_dic:
+            # Descartar una entrada incompleta que haya quedado al final
+            if f_dic.tell() > diccionario['posicion']:
+                f_dic.truncate(diccionario['posicion'])
+            for campo in CAMPOS_TEXTO:
+                texto = valor_csv(bloque.get(campo, ''))
+                texto = texto if isinstance(texto, str) else str(texto)
+                if texto == '':
+                    referencias.append(TEXTO_VACIO)
+                    continue
+                if texto not in diccionario['desplazamientos']:
+                    codificado = texto.encode('utf-8')
+                    diccionario['desplazamientos'][texto] = diccionario['posicion'] + nuevos.tell()
+                    nuevos.write(FORMATO_LONGITUD.pack(len(codificado)) + codificado)
+                referencias.append(diccionario['desplazamientos'][texto])
+
+            if nuevos.tell():
+                f_dic.write(nuevos.getvalue())
+                f_dic.flush()
+                if sincronizar:
+                    os.fsync(f_dic.fileno())
+                diccionario['posicion'] += nuevos.tell()
+
+        registro = FORMATO_REGISTRO.pack(
+            int(bloque['numero_bloque']),
+            *[_digest_a_bytes(bloque.get(campo, '')) for campo in CAMPOS_DIGEST],
+            *referencias
+        )
+
+        nuevo_archivo = not os.path.exists(ruta)
+        with open(ruta, 'ab') as f:
+            if f.tell() == 0:
+                f.write(FORMATO_CABECERA.pack(MAGIA_BINARIA, VERSION_BINARIA, FORMATO_REGISTRO.size, 0))
+            else:
+                # Truncar un registro incompleto de una escritura interrumpida
+                sobrante = (f.tell() - FORMATO_CABECERA.size) % FORMATO_REGISTRO.size
+                if sobrante:
+                    f.truncate(f.tell() - sobrante)
+            f.write(registro)
+            f.flush()
+            if sincronizar:
+                os.fsync(f.fileno())
+            tamaño_final = f.tell()
+
+    if nuevo_archivo and sincronizar:
+        sincronizar_directorio(ruta)
+    return tamaño_final
+
+def _leer_registros_binarios(ruta, inicio, fin):
+    """Decodifica los registros [inicio, fin) de una cadena binaria usando mmap"""
+    bloques = []
+    if fin <= inicio:
+        return bloques
+
+    with open(ruta, 'rb') as f, open(ruta_diccionario(ruta), 'rb') as f_dic:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+            magia, version, tamaño_registro, _ = FORMATO_CABECERA.unpack_from(datos, 0)
+            if magia != MAGIA_BINARIA or tamaño_registro != FORMATO_REGISTRO.size:
+                raise ValueError(f"Formato de cadena binaria no reconocido: {ruta}")
+
+            tamaño_dic = os.fstat(f_dic.fileno()).st_size
+            textos = mmap.mmap(f_dic.fileno(), 0, access=mmap.ACCESS_READ) if tamaño_dic else b''
+            try:
+                for k in range(inicio, fin):
+                    valores = FORMATO_REGISTRO.unpack_from(datos, FORMATO_CABECERA.size + k * FORMATO_REGISTRO.size)
+                    bloque = {'numero_bloque': valores[0]}
+                    for i, campo in enumerate(CAMPOS_DIGEST):
+                        bloque[campo] = _bytes_a_digest(valores[1 + i])
+                    for i, campo in enumerate(CAMPOS_TEXTO):
+                        desplazamiento = valores[1 + len(CAMPOS_DIGEST) + i]
+                        if desplazamiento == TEXTO_VACIO:
+                            bloque[campo] = ''
+                        else:
+                            (longitud,) = FORMATO_LONGITUD.unpack_from(textos, desplazamiento)
+                            inicio_texto = desplazamiento + FORMATO_LONGITUD.size
+                            bloque[campo] = bytes(textos[inicio_texto:inicio_texto + longitud]).decode('utf-8')
+                    bloques.append({col: bloque[col] for col in COLUMNAS_BLOQUE})
+            finally:
+                if tamaño_dic:
+                    textos.close()
+    return bloques
+
+def leer_bloque_binario(ruta, numero):
+    """Lee el bloque número k de una cadena binaria en O(1)"""
+    if numero < 0 or numero >= contar_bloques_binario(ruta):
+        return None
+    return _leer_registros_binarios(ruta, numero, numero + 1)[0]
+
+def leer_cadena_binaria(ruta):
+    """Lee todos los bloques de una cadena binaria con las mismas columnas que el CSV"""
+    bloques = _leer_registros_binarios(ruta, 0, contar_bloques_binario(ruta))
+    return pd.DataFrame(bloques, columns=COLUMNAS_BLOQUE)
+
+def convertir_cadena_a_binaria(hash_doc):
+    """Convierte la cadena CSV de un documento al formato binario y elimina el CSV"""
+    ruta_csv = ruta_blockchain(hash_doc)
+    if not ruta_csv.endswith('.csv') or not os.path.exists(ruta_csv):
+        return False
+    ruta_bin = ruta_csv[:-len('.csv')] + EXTENSION_BINARIA
+
+    df_blockchain = pd.read_csv(ruta_csv).sort_values('numero_bloque')
+
+    # Escribir en archivos temporales y publicarlos con reemplazos atómicos
+    ruta_temporal = f"{ruta_bin}.tmp{EXTENSION_BINARIA}"
+    for ruta in (ruta_temporal, ruta_diccionario(ruta_temporal)):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    for bloque in df_blockchain.to_dict('records'):
+        escribir_bloque_binario(ruta_temporal, bloque)
+
+    os.replace(ruta_diccionario(ruta_temporal), ruta_diccionario(ruta_bin))
+    os.replace(ruta_temporal, ruta_bin)
+    _diccionarios.pop(ruta_diccionario(ruta_temporal), None)
+    os.remove(ruta_csv)
+    sincronizar_directorio(ruta_bin)
+    return True
+
+# ==========================================
+# ÍNDICES PERSISTENTES DE SOLO ANEXAR
+# ==========================================
+# Cada índice es un CSV de solo anexar donde la última fila de cada clave es la vigente.
+# Se mantiene en memoria y solo se leen las filas agregadas desde la última consulta;
+# cuando acumula demasiadas filas obsoletas se compacta con un reemplazo atómico.
+
+class IndiceAnexable:
+    """Índice persistente clave -> fila, respaldado por un CSV de solo anexar"""
+
+    def __init__(self, ruta, columnas, campos_enteros=()):
+        self.ruta = ruta
+        self.columnas = columnas
+        self.campos_enteros = campos_enteros
+        self._entradas = {}
+        self._inodo = None
+        self._posicion = 0
+        self._filas = 0
+        self._candado = threading.RLock()
+
+    def _reiniciar(self, inodo=None):
+        self._entradas.clear()
+        self._inodo = inodo
+        self._posicion = 0
+        self._filas = 0
+
+    def _refrescar(self):
+        """Incorpora al diccionario en memoria las filas nuevas del archivo"""
+        if not os.path.exists(self.ruta):
+            self._reiniciar()
+            return
+
+        info = os.stat(self.ruta)
+
+        # Si el archivo fue compactado (otro inodo o más pequeño) se vuelve a leer desde cero
+        if info.st_ino != self._inodo or info.st_size < self._posicion:
+            self._reiniciar(info.st_ino)
+
+        if info.st_size == self._posicion:
+            return
+
+        with open(self.ruta, 'rb') as f:
+            f.seek(self._posicion)
+            datos = f.read(info.st_size - self._posicion)
+
+        # Procesar solo líneas completas; una fila a medio escribir se leerá en la próxima consulta
+        fin = datos.rfind(b'\n')
+        if fin == -1:
+            return
+
+        for fila in csv.reader(io.StringIO(datos[:fin + 1].decode('utf-8', errors='replace'))):
+            if len(fila) != len(self.columnas) or fila == self.columnas:
+                continue
+            entrada = dict(zip(self.columnas, fila))
+            try:
+                for campo in self.campos_enteros:
+                    entrada[campo] = int(entrada[campo])
+            except ValueError:
+                continue
+            self._entradas[entrada[self.columnas[0]]] = entrada
+            self._filas += 1
+
+        self._posicion += fin + 1
+
+    def obtener(self, clave):
+        """Devuelve una copia de la entrada vigente de una clave (o None)"""
+        with self._candado:
+            self._refrescar()
+            entrada = self._entradas.get(clave)
+        return dict(entrada) if entrada is not None else None
+
+    def todas(self):
+        """Devuelve una copia de todas las entradas vigentes"""
+        with self._candado:
+            self._refrescar()
+            return {clave: dict(entrada) for clave, entrada in self._entradas.items()}
+
+    def registrar(self, entrada, sincronizar=True):
+        """Anexa (con fsync, salvo que no se pida) la nueva entrada vigente de una clave"""
+        with self._candado:
+            with open(self.ruta, 'ab+') as f:
+                _reparar_cola(f)
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer)
+                if f.tell() == 0:
+                    escritor.writerow(self.columnas)
+                escritor.writerow([valor_csv(entrada[col]) for col in self.columnas])
+                f.write(buffer.getvalue().encode('utf-8'))
+                f.flush()
+                if sincronizar:
+                    os.fsync(f.fileno())
+
+            self._refrescar()
+            if self._filas > 2 * len(self._entradas) + 1000:
+                self.compactar()
+        return entrada
+
+    def registrar_lote(self, entradas):
+        """Anexa varias entradas con un solo fsync"""
+        if not entradas:
+            return
+        with self._candado:
+            with open(self.ruta, 'ab+') as f:
+                _reparar_cola(f)
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer)
+                if f.tell() == 0:
+                    escritor.writerow(self.columnas)
+                for entrada in entradas:
+                    escritor.writerow([valor_csv(entrada[col]) for col in self.columnas])
+                f.write(buffer.getvalue().encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._refrescar()
+            if self._filas > 2 * len(self._entradas) + 1000:
+                self.compactar()
+
+    def compactar(self):
+        """Reescribe el índice con una sola fila por clave (reemplazo atómico)"""
+        with self._candado:
+            self._refrescar()
+            ruta_temporal = f"{self.ruta}.tmp"
+
+            with open(ruta_temporal, 'w', encoding='utf-8', newline='') as f:
+                escritor = csv.writer(f)
+                escritor.writerow(self.columnas)
+                for entrada in self._entradas.values():
+                    escritor.writerow([entrada[col] for col in self.columnas])
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(ruta_temporal, self.ruta)
+            sincronizar_directorio(self.ruta)
+            self._refrescar()
+
+# ==========================================
+# CONTROL DE CONCURRENCIA
+# ==========================================
+# Streamlit atiende cada sesión en su propio hilo. Las escrituras de un documento se
+# serializan con un candado por franja de hash (NUMERO_CANDADOS_DOCUMENTO candados
+# reentrantes), de modo que acciones sobre documentos distintos avanzan en paralelo. Las
+# transacciones comprueban al confirmar que la cabeza de cada cadena sigue siendo la que
+# leyeron (compare-and-swap); si otra sesión anexó antes, se lanza ConflictoConcurrencia.
+
+class ConflictoConcurrencia(Exception):
+    """Otra sesión modificó el documento entre la lectura y la confirmación"""
+
+
+_candados_documento = [threading.RLock() for _ in range(NUMERO_CANDADOS_DOCUMENTO)]
+
+def _franja_documento(hash_doc):
+    """Índice del candado que protege a un documento (basta con el prefijo de 16 caracteres)"""
+    return hash(hash_doc[:16]) % NUMERO_CANDADOS_DOCUMENTO
+
+@contextmanager
+def candado_documentos(hashes_docs):
+    """Toma los candados de varios documentos en orden fijo (sin interbloqueos)"""
+    with ExitStack() as pila:
+        for franja in sorted({_franja_documento(hash_doc) for hash_doc in hashes_docs}):
+            pila.enter_context(_candados_documento[franja])
+        yield
+
+
+class CandadoCompartido:
+    """Candado de lectores y escritor: muchas operaciones compartidas o una exclusiva (reentrante)"""
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._compartidos = 0
+        self._esperando = 0
+        self._dueño = None
+        self._profundidad = 0
+
+    @contextmanager
+    def compartido(self):
+        """Sección que puede correr junto a otras compartidas"""
+        with self._condicion:
+            if self._dueño != threading.get_ident():
+                # Dar prioridad a una operación exclusiva en espera
+                while self._dueño is not None or self._esperando:
+                    self._condicion.wait()
+            self._compartidos += 1
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._compartidos -= 1
+                self._condicion.notify_all()
+
+    @contextmanager
+    def exclusivo(self):
+        """Sección que espera a que terminen las compartidas y las bloquea"""
+        actual = threading.get_ident()
+        with self._condicion:
+            if self._dueño == actual:
+                self._profundidad += 1
+            else:
+                self._esperando += 1
+                while self._dueño is not None or self._compartidos:
+                    self._condicion.wait()
+                self._esperando -= 1
+                self._dueño = actual
+                self._profundidad = 1
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    self._dueño = None
+                    self._condicion.notify_all()
+
+def comprobar_cabezas(operaciones, obtener_cabeza_actual):
+    """Verifica que cada bloque continúe la cabeza actual de su cadena (compare-and-swap)"""
+    esperadas = {}
+    for operacion in operaciones:
+        if operacion['tipo'] != 'bloque':
+            continue
+        hash_doc, bloque = operacion['hash'], operacion['bloque']
+        if hash_doc not in esperadas:
+            cabeza = obtener_cabeza_actual(hash_doc)
+            esperadas[hash_doc] = (int(cabeza['numero_bloque']), cabeza['hash_bloque']) if cabeza else (-1, None)
+        numero, hash_anterior = esperadas[hash_doc]
+        if int(bloque['numero_bloque']) != numero + 1 or (
+                hash_anterior is not None and bloque.get('hash_bloque_anterior') != hash_anterior):
+            raise ConflictoConcurrencia(
+                f"La cadena {hash_doc[:16]} avanzó al bloque #{numero} antes de confirmar"
+            )
+        esperadas[hash_doc] = (numero + 1, bloque['hash_bloque'])
+
+def documentos_de_operaciones(operaciones):
+    """Hashes de los documentos que tocan las operaciones de una transacción"""
+    hashes = set()
+    for operacion in operaciones:
+        if operacion['tipo'] == 'alta':
+            hashes.add(operacion['registro'].get('HASH', ''))
+        elif operacion['tipo'] == 'registro':
+            hashes.add(operacion['hash'])
+            hashes.add(operacion['cambios'].get('HASH', operacion['hash']))
+        elif operacion['tipo'] == 'bloque':
+            hashes.add(operacion['hash'])
+    return hashes
+
+# ==========================================
+# ÍNDICE PERSISTENTE DE CABEZAS DE CADENA
+# ==========================================
+
+_indice_cabezas = IndiceAnexable(INDICE_CABEZAS, COLUMNAS_CABEZA, ('numero_bloque', 'tamaño'))
+
+def compactar_indice_cabezas():
+    """Reescribe el índice de cabezas con una sola fila por documento"""
+    _indice_cabezas.compactar()
+
+def registrar_cabeza(hash_doc, bloque, tamaño, sincronizar=True):
+    """Registra en el índice la nueva cabeza de la cadena de un documento"""
+    return _indice_cabezas.registrar({
+        'hash_documento': hash_doc,
+        'numero_bloque': int(bloque['numero_bloque']),
+        'hash_bloque': bloque['hash_bloque'],
+        'accion': valor_csv(bloque.get('accion', '')),
+        'timestamp': valor_csv(bloque.get('timestamp', '')),
+        'tamaño': int(tamaño)
+    }, sincronizar)
+
+def obtener_cabeza(hash_doc):
+    """Devuelve la cabeza (último número, hash, acción y fecha) de la cadena de un documento"""
+    ruta = ruta_blockchain(hash_doc)
+    try:
+        tamaño = os.path.getsize(ruta)
+    except OSError:
+        return None
+
+    cabeza = _indice_cabezas.obtener(hash_doc)
+
+    # El tamaño registrado confirma que la cadena no creció después de actualizar el índice
+    if cabeza is not None and cabeza['tamaño'] == tamaño:
+        return cabeza
+
+    # Cadena previa al índice o índice desfasado tras un corte: reconstruir desde la cola
+    ultimo_bloque = leer_ultimo_bloque(ruta)
+    if ultimo_bloque is None:
+        return None
+    return dict(registrar_cabeza(hash_doc, ultimo_bloque, tamaño))
+
+def anexar_bloque(hash_doc, bloque, sincronizar=True):
+    """Anexa un bloque a la cadena del documento y actualiza su cabeza en el índice"""
+    # El candado evita que el migrador mueva el archivo entre resolver la ruta y escribir
+    with candado_documentos([hash_doc]):
+        ruta = ruta_blockchain(hash_doc)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tamaño = escribir_bloque(ruta, bloque, sincronizar)
+    # Sin sincronizar la cadena tampoco hace falta sincronizar el índice: obtener_cabeza
+    # detecta por el tamaño una cabeza desfasada y la reconstruye desde la cola
+    return registrar_cabeza(hash_doc, bloque, tamaño, sincronizar)
+
+# ==========================================
+# ÍNDICE DE ACCIONES POR USUARIO
+# ==========================================
+# Una fila por (documento, acción, usuario) con el primer bloque donde ocurrió, para
+# comprobar sin leer la cadena si un usuario ya aprobó o rechazó un documento. La fila
+# con clave igual al hash del documento indica hasta qué bloque está indexada su cadena;
+# los bloques posteriores se indexan al consultar, leyendo solo la cola de la cadena.
+
+_indice_acciones = IndiceAnexable(INDICE_ACCIONES, COLUMNAS_ACCION, ('numero_bloque',))
+
+def _clave_accion(hash_doc, accion, usuario):
+    return f"{hash_doc}|{accion}|{usuario}"
+
+def actualizar_indice_acciones(backend, hash_doc):
+    """Indexa las acciones de los bloques de una cadena posteriores al último bloque indexado"""
+    cabeza = backend.obtener_cabeza(hash_doc)
+    if cabeza is None:
+        return
+    cubierto = _indice_acciones.obtener(hash_doc)
+    desde = cubierto['numero_bloque'] + 1 if cubierto is not None else 0
+    if desde > int(cabeza['numero_bloque']):
+        return
+    entradas = []
+    ultimo = desde - 1
+    for bloque in backend.cargar_bloques_desde(hash_doc, desde):
+        ultimo = int(bloque['numero_bloque'])
+        clave = _clave_accion(hash_doc, valor_csv(bloque.get('accion', '')), valor_csv(bloque.get('usuario_accion', '')))
+        if _indice_acciones.obtener(clave) is None and all(e['clave'] != clave for e in entradas):
+            entradas.append({
+                'clave': clave, 'hash_documento': hash_doc, 'accion': bloque.get('accion', ''),
+                'usuario_accion': bloque.get('usuario_accion', ''), 'numero_bloque': ultimo
+            })
+    entradas.append({'clave': hash_doc, 'hash_documento': hash_doc, 'accion': '', 'usuario_accion': '', 'numero_bloque': ultimo})
+    _indice_acciones.registrar_lote(entradas)
+
+def usuario_realizo_accion(backend, hash_doc, accion, usuario):
+    """Indica si el usuario ya registró esa acción en la cadena del documento"""
+    actualizar_indice_acciones(backend, hash_doc)
+    return _indice_acciones.obtener(_clave_accion(hash_doc, accion, usuario)) is not None
+
+# ==========================================
+# MIGRACIÓN A LA DISPOSICIÓN FRAGMENTADA
+# ==========================================
+# Mueve los archivos planos de cada cadena (blockchain_*, instantaneas_* y su árbol
+# Merkle) a su subdirectorio mientras la aplicación sigue en uso. Cada archivo se enlaza
+# en el destino antes de borrar el original, de modo que la ruta siempre resuelve a un
+# archivo existente y los descriptores abiertos siguen apuntando al mismo contenido.
+# Con CLEIN_FORMATO_CADENA=binario las cadenas CSV se convierten al formato binario al
+# llegar a su subdirectorio; con el valor por defecto ("csv") se mueven sin cambios.
+
+_migracion_activa = {}
+
+def _enlazar(origen, destino):
+    """Enlaza 'origen' en 'destino'; un enlace previo al mismo archivo (migración interrumpida) sirve"""
+    try:
+        os.link(origen, destino)
+    except FileExistsError:
+        # rename() entre dos enlaces del mismo archivo no hace nada: hay que retirar el origen
+        if not os.path.samefile(origen, destino):
+            raise
+
+def _mover_archivo(origen, destino):
+    """Publica 'origen' en 'destino' y luego elimina 'origen'"""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        _enlazar(origen, destino)
+        os.unlink(origen)
+    except OSError:
+        os.replace(origen, destino)
+    sincronizar_directorio(destino)
+
+def _archivos_planos():
+    """Lista (hash16, nombres) de los archivos planos pendientes de migrar"""
+    pendientes = []
+    with os.scandir(DIRECTORIO_DATOS) as entradas:
+        for entrada in entradas:
+            nombre = entrada.name
+            if nombre.startswith("blockchain_") and nombre.endswith(('.csv', EXTENSION_BINARIA)):
+                hash16 = nombre[len("blockchain_"):].split('.')[0]
+            elif nombre.startswith("instantaneas_") and nombre.endswith('.jsonl'):
+                hash16 = nombre[len("instantaneas_"):].split('.')[0]
+            else:
+                continue
+            if len(hash16) == 16 and entrada.is_file():
+                pendientes.append((hash16, nombre))
+    return pendientes
+
+def _migrar_archivo(hash16, nombre):
+    """Mueve un archivo plano de una cadena a su subdirectorio"""
+    origen = ruta_datos(nombre)
+    with candado_documentos([hash16]), merkle.candado_arboles():
+        if not os.path.exists(origen):
+            return False
+        if nombre.endswith(EXTENSION_BINARIA):
+            # El diccionario se publica antes que los registros y se retira después
+            dic_origen = ruta_diccionario(origen)
+            dic_destino = ruta_fragmentada(hash16, os.path.basename(dic_origen))
+            os.makedirs(os.path.dirname(dic_destino), exist_ok=True)
+            if os.path.exists(dic_origen):
+                _enlazar(dic_origen, dic_destino)
+            _mover_archivo(origen, ruta_fragmentada(hash16, nombre))
+            if os.path.exists(dic_origen):
+                os.unlink(dic_origen)
+        else:
+            _mover_archivo(origen, ruta_fragmentada(hash16, nombre))
+            if FORMATO_CADENA == 'binario' and nombre.startswith("blockchain_"):
+                convertir_cadena_a_binaria(hash16)
+        if nombre.startswith("blockchain_"):
+            merkle.migrar_arbol_cadena(hash16)
+    return True
+
+def migrar_cadenas_fragmentadas(limite=None, pausa=0):
+    """Mueve los archivos planos (hasta 'limite') a la disposición fragmentada; devuelve cuántos movió"""
+    movidos = 0
+    for hash16, nombre in _archivos_planos():
+        if limite is not None and movidos >= limite:
+            break
+        if _migrar_archivo(hash16, nombre):
+            movidos += 1
+            if pausa:
+                time.sleep(pausa)
+    return movidos
+
+def iniciar_migracion_en_segundo_plano(pausa=0.001):
+    """Arranca (una vez por proceso) un hilo que migra los archivos planos pendientes"""
+    if _migracion_activa.get('hilo') is not None or not _archivos_planos():
+        return False
+    _migracion_activa['hilo'] = threading.Thread(
+        target=migrar_cadenas_fragmentadas, kwargs={'pausa': pausa}, name="migracion-cadenas", daemon=True
+    )
+    _migracion_activa['hilo'].start()
+    return True
+
+# ==========================================
+# PUNTOS DE CONTROL DE VALIDACIÓN
+# ==========================================
+# "Cadena validada hasta el bloque k con hash H": las validaciones siguientes solo
+# recalculan los bloques agregados después de k.
+
+_puntos_control = IndiceAnexable(PUNTOS_CONTROL, COLUMNAS_PUNTO_CONTROL, ('numero_bloque',))
+
+# ==========================================
+# ÁRBOLES MERKLE
+# ==========================================
+
+def actualizar_merkle(backend, hash_doc, bloque):
+    """Agrega un bloque recién anexado al árbol Merkle de su cadena y a la raíz global"""
+    numero = int(bloque['numero_bloque'])
+    if merkle.contar_hojas(hash_doc) != numero:
+        # Cadena anterior al árbol o corte entre la cadena y el árbol: reconstruir
+        previos = [b['hash_bloque'] for b in backend.cargar_bloques_desde(hash_doc, 0)
+                   if int(b['numero_bloque']) < numero]
+        merkle.reconstruir_arbol_cadena(hash_doc, previos)
+    return merkle.registrar_bloque(hash_doc, bloque['hash_bloque'])
+
+def sincronizar_arboles_merkle(backend, hashes_docs):
+    """Construye el árbol de las cadenas cuyo número de hojas no coincide con su cabeza"""
+    for hash_doc in hashes_docs:
+        cabeza = backend.obtener_cabeza(hash_doc)
+        if cabeza is None or merkle.contar_hojas(hash_doc) == int(cabeza['numero_bloque']) + 1:
+            continue
+        hashes_bloques = [b['hash_bloque'] for b in backend.cargar_bloques_desde(hash_doc, 0)]
+        merkle.reconstruir_arbol_cadena(hash_doc, hashes_bloques)
+        merkle.actualizar_documento_global(hash_doc, merkle.raiz_cadena(hash_doc))
+
+# ==========================================
+# LIBRO MAYOR GLOBAL
+# ==========================================
+
+def registrar_en_libro(hash_doc, bloque, archivo_origen):
+    """Agrega el bloque recién anexado como transacción del lote abierto del libro mayor.
+
+    La línea se escribe sin fsync: el bloque ya es durable en el registro de
+    transacciones y el archivo del libro se sincroniza con el resto de lo tocado.
+    """
+    libro_mayor.obtener_libro().registrar_transaccion(
+        libro_mayor.crear_transaccion(bloque, archivo_origen), sincronizar=False
+    )
+
+_historial_libro = {'candado': threading.Lock(), 'importado': False}
+
+def importar_historial_libro(backend, hashes_docs=None):
+    """Carga en el libro mayor, una sola vez, los bloques anteriores a él en orden cronológico.
+
+    Los bloques que el libro ya tiene (en un bloque sellado o en espera) no se repiten.
+    Devuelve True si se importó el historial en esta llamada.
+    """
+    with _historial_libro['candado']:
+        if _historial_libro['importado']:
+            return False
+        _historial_libro['importado'] = True
+        libro = libro_mayor.obtener_libro()
+        if libro.estado.get('historial_importado'):
+            return False
+
+        if hashes_docs is None:
+            hashes_docs = backend.cargar_registros()['HASH'].tolist()
+        registradas = libro.claves_registradas()
+        transacciones = []
+        for hash_doc in dict.fromkeys(hashes_docs):
+            archivo_origen = os.path.basename(ruta_blockchain(hash_doc))
+            for bloque in backend.cargar_bloques_desde(hash_doc, 0):
+                transaccion = libro_mayor.crear_transaccion(bloque, archivo_origen)
+                if (transaccion['hash_documento'], transaccion['numero_bloque_original']) not in registradas:
+                    transacciones.append(transaccion)
+        transacciones.sort(key=lambda t: (str(t['timestamp_original']), t['numero_bloque_original']))
+
+        for transaccion in transacciones:
+            libro.registrar_transaccion(transaccion, sincronizar=False)
+        libro.sellar_pendientes(forzar=True)
+        libro.sincronizar()
+        libro.marcar_historial_importado()
+        return True
+
+# ==========================================
+# INSTANTÁNEAS DE ESTADO
+# ==========================================
+# Cada INTERVALO_INSTANTANEAS bloques (o a pedido) se guarda el estado materializado del
+# documento y un hash acumulado sobre el contenido completo de todos los bloques hasta ese
+# punto. El estado en el bloque k se obtiene de la instantánea más reciente anterior a k
+# más los bloques que la siguen, sin reproducir la cadena desde el génesis.
+
+INTERVALO_INSTANTANEAS = int(os.environ.get("CLEIN_INTERVALO_INSTANTANEAS", "100"))
+CAMPOS_ESTADO = [
+    'nombre_documento', 'tipo', 'fecha_creacion', 'fecha_actualizacion', 'version',
+    'estatus', 'modificacion', 'creador', 'area', 'revisor', 'aprobador',
+    'no_conformidad', 'auditoria', 'accion', 'usuario_accion', 'timestamp'
+]
+
+def _texto_canonico(valor):
+    """Texto de un valor independiente del formato de origen (CSV, binario, SQLite o pandas)"""
+    valor = valor_csv(valor)
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor)
+
+def calcular_hash_acumulado(hash_anterior, bloque):
+    """Encadena el contenido completo de un bloque sobre el hash acumulado anterior"""
+    contenido = json.dumps([_texto_canonico(bloque.get(col, '')) for col in COLUMNAS_BLOQUE], ensure_ascii=False)
+    return hashlib.sha256(f"{hash_anterior}{contenido}".encode('utf-8')).hexdigest()
+
+def aplicar_bloque(estado, bloque):
+    """Aplica un bloque al estado del documento (los campos vacíos no cambian el valor previo)"""
+    for campo in CAMPOS_ESTADO:
+        valor = _texto_canonico(bloque.get(campo, ''))
+        if valor:
+            estado[campo] = valor
+    return estado
+
+def _reproducir_desde(instantanea, bloques, hasta=None):
+    """Aplica a una instantánea (o al estado vacío) los bloques posteriores hasta 'hasta'"""
+    if instantanea is None:
+        instantanea = {'numero_bloque': -1, 'hash_bloque': '0', 'hash_acumulado': '0', 'estado': {}}
+    numero, hash_bloque, hash_acumulado = instantanea['numero_bloque'], instantanea['hash_bloque'], instantanea['hash_acumulado']
+    estado = dict(instantanea['estado'])
+    for bloque in bloques:
+        numero_bloque = int(bloque['numero_bloque'])
+        if numero_bloque <= numero:
+            continue
+        if hasta is not None and numero_bloque > hasta:
+            break
+        aplicar_bloque(estado, bloque)
+        hash_acumulado = calcular_hash_acumulado(hash_acumulado, bloque)
+        numero, hash_bloque = numero_bloque, bloque['hash_bloque']
+    return {'numero_bloque': numero, 'hash_bloque': hash_bloque, 'hash_acumulado': hash_acumulado, 'estado': estado}
+
+def estado_documento(backend, hash_doc, hasta=None):
+    """Estado materializado del documento en el bloque 'hasta' (o en la cabeza).
+
+    Lee solo la instantánea más reciente anterior a 'hasta' y los bloques siguientes.
+    """
+    instantanea = backend.obtener_instantanea(hash_doc, hasta)
+    desde = instantanea['numero_bloque'] + 1 if instantanea else 0
+    resultado = _reproducir_desde(instantanea, backend.cargar_bloques_desde(hash_doc, desde), hasta)
+    return resultado if resultado['numero_bloque'] >= 0 else None
+
+def crear_instantanea(backend, hash_doc):
+    """Guarda a pedido una instantánea del estado en la cabeza actual de la cadena"""
+    resultado = estado_documento(backend, hash_doc)
+    if resultado is None:
+        return None
+    anterior = backend.obtener_instantanea(hash_doc)
+    if anterior is not None and anterior['numero_bloque'] >= resultado['numero_bloque']:
+        return anterior
+    resultado['hash_documento'] = hash_doc
+    resultado['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    backend.guardar_instantanea(resultado)
+    return resultado
+
+def instantaneas_periodicas(hash_doc, bloques):
+    """Instantáneas de cada intervalo de una cadena completa, calculadas en una sola pasada"""
+    instantaneas = []
+    if INTERVALO_INSTANTANEAS <= 0:
+        return instantaneas
+    resultado = None
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for bloque in bloques:
+        resultado = _reproducir_desde(resultado, [bloque])
+        if (resultado['numero_bloque'] + 1) % INTERVALO_INSTANTANEAS == 0:
+            instantaneas.append({**resultado, 'hash_documento': hash_doc, 'timestamp': timestamp})
+    return instantaneas
+
+def actualizar_instantaneas(backend, hash_doc, bloque):
+    """Crea la instantánea periódica cuando el bloque anexado completa un intervalo"""
+    if INTERVALO_INSTANTANEAS > 0 and (int(bloque['numero_bloque']) + 1) % INTERVALO_INSTANTANEAS == 0:
+        return crear_instantanea(backend, hash_doc)
+    return None
+
+def despues_de_anexar(backend, hash_doc, bloque, archivo_origen):
+    """Actualiza las estructuras derivadas de la cadena después de anexar un bloque"""
+    actualizar_merkle(backend, hash_doc, bloque)
+    registrar_en_libro(hash_doc, bloque, archivo_origen)
+    actualizar_instantaneas(backend, hash_doc, bloque)
+
+# ==========================================
+# ÍNDICE ORDENADO DE DIGESTOS
+# ==========================================
+# Los hashes registrados se guardan como un arreglo contiguo y ordenado de digests crudos
+# de 32 bytes, con la fila del registro de cada uno en un arreglo paralelo; la búsqueda es
+# binaria (np.searchsorted). Las altas y cambios de hash posteriores a la última fusión
+# viven en un diccionario pequeño que se fusiona en cada punto de control. El archivo se
+# guarda con la firma del CSV que describe para reutilizarlo al iniciar.
+
+FORMATO_CABECERA_DIGESTOS = struct.Struct('<8sIqqqq')
+MAGIA_DIGESTOS = b'CLEINDIG'
+
+def _digest_documento(hash_doc):
+    """Digest crudo de 32 bytes de un hash hexadecimal (None si no es un SHA-256)"""
+    if not isinstance(hash_doc, str) or len(hash_doc) != 64:
+        return None
+    try:
+        return bytes.fromhex(hash_doc)
+    except ValueError:
+        return None
+
+
+class IndiceDigestos:
+    """Arreglo ordenado de digests SHA-256 con la fila del registro que corresponde a cada uno"""
+
+    def __init__(self, ruta=INDICE_DIGESTOS):
+        self.ruta = ruta
+        self.digestos = np.empty(0, dtype='S32')
+        self.filas = np.empty(0, dtype=np.int64)
+        self.agregados = {}
+        self.quitados = set()
+
+    def construir(self, hashes):
+        """Ordena los digests de una lista de hashes en el orden de sus filas"""
+        digestos = [_digest_documento(hash_doc) for hash_doc in hashes]
+        filas = np.array([fila for fila, digest in enumerate(digestos) if digest is not None], dtype=np.int64)
+        arreglo = np.array([digest for digest in digestos if digest is not None], dtype='S32')
+        # Orden estable: ante hashes repetidos queda primero la fila más antigua
+        orden = np.argsort(arreglo, kind='stable')
+        self.digestos = arreglo[orden]
+        self.filas = filas[orden]
+        self.agregados = {}
+        self.quitados = set()
+
+    def cargar(self, firma, hashes):
+        """Usa el archivo guardado si describe el CSV con esa firma; si no, lo reconstruye"""
+        try:
+            with open(self.ruta, 'rb') as f:
+                magia, version, cantidad, *firma_guardada = FORMATO_CABECERA_DIGESTOS.unpack(
+                    f.read(FORMATO_CABECERA_DIGESTOS.size)
+                )
+                if magia == MAGIA_DIGESTOS and version == 1 and firma is not None and tuple(firma_guardada) == firma:
+                    datos = f.read(cantidad * 40)
+                    if len(datos) == cantidad * 40:
+                        self.digestos = np.frombuffer(datos, dtype='S32', count=cantidad)
+                        self.filas = np.frombuffer(datos, dtype='<i8', count=cantidad, offset=cantidad * 32).astype(np.int64)
+                        self.agregados = {}
+                        self.quitados = set()
+                        return False
+        except (OSError, struct.error):
+            pass
+        self.construir(hashes)
+        return True
+
+    def guardar(self, firma, ruta=None):
+        """Fusiona los cambios y escribe el arreglo junto a la firma del CSV"""
+        self.fusionar()
+        buffer = io.BytesIO()
+        buffer.write(FORMATO_CABECERA_DIGESTOS.pack(MAGIA_DIGESTOS, 1, len(self.digestos), *(firma or (0, 0, 0))))
+        buffer.write(self.digestos.tobytes())
+        buffer.write(self.filas.astype('<i8').tobytes())
+        escribir_atomico(ruta or self.ruta, buffer.getvalue())
+
+    def buscar(self, hash_doc):
+        """Fila del registro de un hash (la primera si está repetido) o None"""
+        digest = _digest_documento(hash_doc)
+        if digest is None or digest in self.quitados:
+            return None
+        if digest in self.agregados:
+            return self.agregados[digest]
+        posicion = int(np.searchsorted(self.digestos, digest))
+        # numpy devuelve los 'S32' sin los bytes nulos finales; con largo fijo la comparación es exacta
+        if posicion < len(self.digestos) and self.digestos[posicion] == digest.rstrip(b'\x00'):
+            return int(self.filas[posicion])
+        return None
+
+    def agregar(self, hash_doc, fila):
+        """Registra la fila de un hash nuevo (si ya existe se conserva la fila anterior)"""
+        digest = _digest_documento(hash_doc)
+        if digest is None or self.buscar(hash_doc) is not None:
+            return
+        self.quitados.discard(digest)
+        self.agregados[digest] = fila
+
+    def quitar(self, hash_doc):
+        """Deja de indexar un hash"""
+        digest = _digest_documento(hash_doc)
+        if digest is None:
+            return
+        self.agregados.pop(digest, None)
+        self.quitados.add(digest)
+
+    def fusionar(self):
+        """Incorpora al arreglo ordenado las altas y bajas pendientes"""
+        if not self.agregados and not self.quitados:
+            return
+        conservar = ~np.isin(self.digestos, np.array(list(self.quitados), dtype='S32')) if self.quitados else slice(None)
+        digestos = np.concatenate([self.digestos[conservar], np.array(list(self.agregados), dtype='S32')])
+        filas = np.concatenate([self.filas[conservar], np.array(list(self.agregados.values()), dtype=np.int64)])
+        orden = np.argsort(digestos, kind='stable')
+        self.digestos = digestos[orden]
+        self.filas = filas[orden]
+        self.agregados = {}
+        self.quitados = set()
+
+# ==========================================
+# ÍNDICES SECUNDARIOS DEL REGISTRO
+# ==========================================
+# Por cada columna de COLUMNAS_INDEXADAS se guarda, para cada valor, el conjunto de filas
+# del registro que lo tienen. Un filtro une las listas de los valores pedidos en cada
+# columna e intersecta las columnas empezando por la lista más corta, de modo que el costo
+# depende del tamaño del resultado y no del registro completo.
+
+def _valor_indexable(valor):
+    """Indica si un valor del registro entra al índice (los vacíos y NaN no)"""
+    return isinstance(valor, str) and valor != ''
+
+def normalizar_criterios(criterios):
+    """Criterios {columna: valor o lista de valores} sin los vacíos, con cada valor como lista"""
+    normalizados = {}
+    for columna, valores in (criterios or {}).items():
+        if valores is None:
+            continue
+        normalizados[columna] = list(valores) if isinstance(valores, (list, tuple, set)) else [valores]
+    return normalizados
+
+
+class IndiceSecundario:
+    """Listas de filas por valor de AREA, ESTATUS y TIPO, mantenidas con cada cambio del registro"""
+
+    def __init__(self, columnas=COLUMNAS_INDEXADAS):
+        self.columnas = columnas
+        self.listas = {columna: {} for columna in columnas}
+
+    def construir(self, df_registros):
+        """Arma las listas a partir de un DataFrame del registro (posiciones de fila)"""
+        for columna in self.columnas:
+            grupos = df_registros.groupby(columna, sort=False).indices if len(df_registros) else {}
+            self.listas[columna] = {
+                valor: set(filas.tolist()) for valor, filas in grupos.items() if _valor_indexable(valor)
+            }
+
+    def agregar(self, fila, registro):
+        """Indexa una fila nueva"""
+        for columna in self.columnas:
+            valor = registro.get(columna)
+            if _valor_indexable(valor):
+                self.listas[columna].setdefault(valor, set()).add(fila)
+
+    def cambiar(self, fila, anteriores, cambios):
+        """Mueve una fila entre listas según los valores anteriores y los cambios"""
+        for columna in self.columnas:
+            if columna not in cambios or cambios[columna] == anteriores.get(columna):
+                continue
+            lista = self.listas[columna].get(anteriores.get(columna))
+            if lista is not None:
+                lista.discard(fila)
+                if not lista:
+                    del self.listas[columna][anteriores[columna]]
+            if _valor_indexable(cambios[columna]):
+                self.listas[columna].setdefault(cambios[columna], set()).add(fila)
+
+    def buscar(self, criterios):
+        """Filas ordenadas que cumplen todos los criterios (None si no hay criterios)"""
+        criterios = normalizar_criterios(criterios)
+        if not criterios:
+            return None
+        conjuntos = []
+        for columna, valores in criterios.items():
+            listas = [self.listas[columna].get(valor, ()) for valor in valores]
+            conjuntos.append(listas[0] if len(listas) == 1 else set().union(*listas))
+        conjuntos.sort(key=len)
+        filas = set(conjuntos[0])
+        for conjunto in conjuntos[1:]:
+            filas.intersection_update(conjunto)
+            if not filas:
+                break
+        return sorted(filas)
+
+# ==========================================
+# TRANSACCIONES Y REGISTRO DE ESCRITURA ANTICIPADA
+# ==========================================
+# Una transacción agrupa los cambios de una acción (registro, bloques y bitácora). En el
+# backend CSV se confirma con una sola línea anexada y sincronizada al registro de
+# transacciones; después se aplica: los bloques y eventos se anexan sin fsync y los
+# cambios del registro quedan en memoria, fila por fila, sobre registro_documentos.csv.
+# Cada TRANSACCIONES_POR_PUNTO transacciones un hilo compacta en segundo plano: reescribe
+# el registro, sincroniza los archivos tocados y recorta el registro de transacciones.
+
+def _valor_transaccion(valor):
+    """Convierte un valor a un tipo serializable en JSON (NaN y None se guardan vacíos)"""
+    valor = valor_csv(valor)
+    return valor.item() if hasattr(valor, 'item') else valor
+
+def _fila_transaccion(datos):
+    """Copia un diccionario de datos con valores serializables"""
+    return {clave: _valor_transaccion(valor) for clave, valor in datos.items()}
+
+def materializar_registros(df_base, modificadas, altas):
+    """DataFrame completo del registro: la base con los cambios por fila y las altas al final"""
+    df_registros = df_base.copy()
+    por_columna = {}
+    for fila, cambios in modificadas.items():
+        for col, valor in cambios.items():
+            filas, valores = por_columna.setdefault(col, ([], []))
+            filas.append(fila)
+            valores.append(valor)
+    for col, (filas, valores) in por_columna.items():
+        columna = df_registros[col] if df_registros[col].dtype == object else df_registros[col].astype(object)
+        columna.iloc[filas] = valores
+        df_registros[col] = columna
+    if altas:
+        df_registros = pd.concat([df_registros, pd.DataFrame(altas, columns=COLUMNAS_REGISTRO)], ignore_index=True)
+    return df_registros
+
+def _leer_registros_csv():
+    """Lee registro_documentos.csv asegurando las columnas requeridas.
+
+    Un archivo ausente o vacío es un registro vacío; cualquier otro error de lectura
+    (un CSV dañado) se propaga en lugar de presentarse como un registro vacío.
+    """
+    try:
+        df = pd.read_csv(CSV_REGISTROS)
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        return pd.DataFrame(columns=COLUMNAS_REGISTRO)
+    for col in COLUMNAS_REGISTRO:
+        if col not in df.columns:
+            df[col] = ""
+    return df[COLUMNAS_REGISTRO]
+
+def _firma_archivo(ruta):
+    """Identifica la versión de un archivo por (mtime, tamaño, inodo); None si no existe"""
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+
+def _sincronizar_archivo(ruta):
+    """Hace fsync de un archivo existente"""
+    try:
+        with open(ruta, 'ab') as f:
+            os.fsync(f.fileno())
+    except OSError:
+        pass
+
+
+class RegistroTransacciones:
+    """Registro de escritura anticipada del backend CSV (una línea con su SHA-256 por transacción)"""
+
+    def __init__(self, ruta=ARCHIVO_TRANSACCIONES, ruta_estado=ESTADO_TRANSACCIONES):
+        self.ruta = ruta
+        self.ruta_estado = ruta_estado
+        # Las confirmaciones son compartidas entre sí; la recuperación y los puntos de control, exclusivos
+        self.candado = CandadoCompartido()
+        self._candado_anexar = threading.Lock()
+        self._descriptor = None
+        self._candado_cache = threading.Lock()
+        # Registro vigente compartido por todas las sesiones del proceso: la base leída del
+        # CSV (firma, generación, DataFrame) y encima, por fila, los cambios confirmados
+        # después; el índice de digestos lleva cada hash a su fila
+        self._base = None
+        self._aplicadas = 0
+        self._modificadas = {}
+        self._altas = []
+        self._materializado = None
+        self._compactando = False
+        self.indice = IndiceDigestos()
+        self.secundario = IndiceSecundario()
+        self.generacion = 0
+        self.pendientes = []
+        self.cadenas_tocadas = set()
+        self.confirmadas = 0
+        self.recuperado = False
+        self.estado = self._leer_estado()
+        self.secuencia = self.estado['secuencia']
+
+    def _leer_estado(self):
+        """Lee el último punto de control (o lo crea con la bitácora actual)"""
+        if os.path.exists(self.ruta_estado):
+            with open(self.ruta_estado, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        estado = {'secuencia': 0, 'bitacora': obtener_bitacora().tamaños()}
+        escribir_atomico(self.ruta_estado, json.dumps(estado).encode('utf-8'))
+        return estado
+
+    def leer_transacciones(self):
+        """Devuelve las transacciones completas y descarta la cola que no llegó a confirmarse"""
+        if not os.path.exists(self.ruta):
+            return []
+        transacciones = []
+        valido = 0
+        with open(self.ruta, 'rb+') as f:
+            for linea in f:
+                suma, _, contenido = linea.rstrip(b'\n').partition(b' ')
+                if not linea.endswith(b'\n') or hashlib.sha256(contenido).hexdigest().encode('ascii') != suma:
+                    break
+                transacciones.append(json.loads(contenido))
+                valido += len(linea)
+            if f.seek(0, os.SEEK_END) > valido:
+                f.truncate(valido)
+                f.flush()
+                os.fsync(f.fileno())
+        return transacciones
+
+    def recuperar(self):
+        """Rehace las transacciones confirmadas después del último punto de control.
+
+        Devuelve los bloques anexados de nuevo para actualizar sus estructuras derivadas.
+        """
+        with self.candado.exclusivo():
+            if self.recuperado:
+                return []
+            self.recuperado = True
+            transacciones = [t for t in self.leer_transacciones() if t['secuencia'] > self.estado['secuencia']]
+            if os.path.exists(CSV_BITACORA_HEREDADA):
+                # Bitácora de un solo archivo (versiones anteriores): se reparte en particiones
+                # sin los eventos posteriores al punto de control, que se rehacen abajo
+                tamaño = self.estado.get('tamaño_bitacora') if transacciones else None
+                obtener_bitacora().importar_heredada(CSV_BITACORA_HEREDADA, tamaño)
+                self.estado = {'secuencia': self.estado['secuencia'], 'bitacora': obtener_bitacora().tamaños()}
+                escribir_atomico(self.ruta_estado, json.dumps(self.estado).encode('utf-8'))
+            if not transacciones:
+                return []
+            # Los eventos posteriores al punto de control pueden estar incompletos: se reescriben
+            obtener_bitacora().truncar(self.estado.get('bitacora', {}))
+            bloques = []
+            for transaccion in transacciones:
+                bloques.extend(self._aplicar(transaccion['operaciones'], recuperando=True))
+                self.secuencia = transaccion['secuencia']
+            self.punto_control()
+            return bloques
+
+    def _archivo(self):
+        """Descriptor del registro de transacciones abierto en modo anexar"""
+        if self._descriptor is None:
+            self._descriptor = os.open(
+                self.ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644
+            )
+        return self._descriptor
+
+    def confirmar_lote(self, lote, al_aplicar=None):
+        """Hace durable un lote de transacciones con un solo fsync y las aplica en orden.
+
+        Devuelve por transacción los bloques anexados o la ConflictoConcurrencia que la
+        descartó. Los documentos tocados quedan bloqueados desde la comprobación de sus
+        cabezas hasta que 'al_aplicar' recibe los bloques; otros documentos confirman en paralelo.
+        """
+        if not self.recuperado:
+            self.recuperar()
+        resultados = [None] * len(lote)
+        documentos = set()
+        for operaciones in lote:
+            documentos |= documentos_de_operaciones(operaciones)
+
+        with self.candado.compartido(), candado_documentos(documentos):
+            # Las cabezas que dejan las transacciones anteriores del mismo lote
+            cabezas = {}
+            aceptadas = []
+            for posicion, operaciones in enumerate(lote):
+                try:
+                    comprobar_cabezas(operaciones, lambda h: cabezas[h] if h in cabezas else obtener_cabeza(h))
+                except ConflictoConcurrencia as error:
+                    resultados[posicion] = error
+                    continue
+                for operacion in operaciones:
+                    if operacion['tipo'] == 'bloque':
+                        cabezas[operacion['hash']] = operacion['bloque']
+                aceptadas.append(posicion)
+            if not aceptadas:
+                return resultados
+
+            with self._candado_anexar:
+                lineas = []
+                for posicion in aceptadas:
+                    self.secuencia += 1
+                    contenido = json.dumps(
+                        {'secuencia': self.secuencia, 'operaciones': lote[posicion]}, ensure_ascii=False, default=str
+                    ).encode('utf-8')
+                    lineas.append(hashlib.sha256(contenido).hexdigest().encode('ascii') + b' ' + contenido + b'\n')
+                os.write(self._archivo(), b''.join(lineas))
+            # El fsync queda fuera del candado: uno solo cubre las líneas escritas por otros hilos
+            os.fsync(self._archivo())
+            for posicion in aceptadas:
+                resultados[posicion] = self._aplicar(lote[posicion])
+                if al_aplicar is not None:
+                    al_aplicar(resultados[posicion])
+
+        with self._candado_anexar:
+            self.confirmadas += len(aceptadas)
+            lleno = self.confirmadas >= TRANSACCIONES_POR_PUNTO and not self._compactando
+            if lleno:
+                self._compactando = True
+        if lleno:
+            threading.Thread(target=self._compactar, name="compactacion-registro", daemon=True).start()
+        return resultados
+
+    def _aplicar(self, operaciones, recuperando=False):
+        """Aplica las operaciones de una transacción ya durable"""
+        bloques = []
+        for operacion in operaciones:
+            if operacion['tipo'] in ('alta', 'registro'):
+                with self._candado_anexar:
+                    self.pendientes.append(operacion)
+            elif operacion['tipo'] == 'bloque':
+                hash_doc, bloque = operacion['hash'], operacion['bloque']
+                if recuperando:
+                    # El bloque pudo llegar al archivo antes del corte
+                    cabeza = obtener_cabeza(hash_doc)
+                    if cabeza is not None and cabeza['numero_bloque'] >= int(bloque['numero_bloque']):
+                        continue
+                anexar_bloque(hash_doc, bloque, sincronizar=False)
+                self.cadenas_tocadas.add(hash_doc)
+                bloques.append((hash_doc, bloque))
+            elif operacion['tipo'] == 'bitacora':
+                obtener_bitacora().anexar(operacion['evento'])
+        return bloques
+
+    def registros_pendientes(self):
+        """Operaciones del registro de documentos aún no escritas en CSV_REGISTROS"""
+        with self._candado_anexar:
+            return list(self.pendientes)
+
+    def registros_vigentes(self):
+        """Registro de documentos con los cambios confirmados, servido desde la memoria del proceso.
+
+        Solo se relee el CSV si cambió su firma (otro proceso lo editó); los cambios propios
+        se aplican sobre la copia en memoria. Cada llamada recibe una copia superficial
+        (copy-on-write), así que modificarla no altera la copia compartida.
+        """
+        with self.candado.compartido():
+            with self._candado_cache:
+                self._ponerse_al_dia()
+                return self._registros_materializados().copy(deep=False)
+
+    def buscar_documento(self, hash_doc):
+        """Fila vigente de un documento por búsqueda binaria en el índice de digestos (o None)"""
+        with self.candado.compartido():
+            with self._candado_cache:
+                self._ponerse_al_dia()
+                fila = self.indice.buscar(hash_doc)
+                if fila is None:
+                    return None
+                df_base = self._base[2]
+                if fila >= len(df_base):
+                    return dict(self._altas[fila - len(df_base)])
+                return {**df_base.iloc[fila].to_dict(), **self._modificadas.get(fila, {})}
+
+    def filtrar_registros(self, criterios):
+        """Filas vigentes que cumplen los criterios, tomadas de los índices secundarios.
+
+        El DataFrame conserva como índice la posición de cada fila en el registro.
+        """
+        with self.candado.compartido():
+            with self._candado_cache:
+                self._ponerse_al_dia()
+                filas = self.secundario.buscar(criterios)
+                if filas is None:
+                    return self._registros_materializados().copy(deep=False)
+                df_base = self._base[2]
+                en_base = [fila for fila in filas if fila < len(df_base)]
+                modificadas = {
+                    posicion: self._modificadas[fila] for posicion, fila in enumerate(en_base) if fila in self._modificadas
+                }
+                altas = [self._altas[fila - len(df_base)] for fila in filas if fila >= len(df_base)]
+                df_registros = materializar_registros(df_base.take(en_base), modificadas, altas)
+                df_registros.index = filas
+                return df_registros
+
+    def _ponerse_al_dia(self):
+        """Aplica a la copia en memoria las operaciones pendientes nuevas, fila por fila.
+
+        Cada alta ocupa la siguiente fila y cada cambio se ubica con el índice de digestos y
+        se guarda solo para su fila, así que el costo no depende del tamaño del registro.
+        Requiere el candado de la copia en memoria.
+        """
+        with self._candado_anexar:
+            pendientes = list(self.pendientes[self._aplicadas:]) if self._base is not None else list(self.pendientes)
+            generacion = self.generacion
+        firma = _firma_archivo(CSV_REGISTROS)
+        if self._base is None or self._base[0] != firma or self._base[1] != generacion:
+            df_registros = _leer_registros_csv()
+            if self.indice.cargar(firma, df_registros['HASH'].tolist()) and firma is not None:
+                self.indice.guardar(firma)
+            self._reiniciar_base(firma, generacion, df_registros)
+            with self._candado_anexar:
+                pendientes = list(self.pendientes)
+        df_base = self._base[2]
+        for operacion in pendientes:
+            if operacion['tipo'] == 'alta':
+                registro = {col: operacion['registro'].get(col, '') for col in COLUMNAS_REGISTRO}
+                # Un alta ya presente (al rehacer transacciones que alcanzaron el CSV) no se duplica
+                if self.indice.buscar(registro['HASH']) is None:
+                    self.indice.agregar(registro['HASH'], len(df_base) + len(self._altas))
+                    self.secundario.agregar(len(df_base) + len(self._altas), registro)
+                    self._altas.append(registro)
+                continue
+            fila = self.indice.buscar(operacion['hash'])
+            if fila is None:
+                continue
+            cambios = {col: valor for col, valor in operacion['cambios'].items() if col in COLUMNAS_REGISTRO}
+            if fila >= len(df_base):
+                actual = self._altas[fila - len(df_base)]
+                anteriores = {col: actual.get(col) for col in COLUMNAS_INDEXADAS}
+                actual.update(cambios)
+            else:
+                actual = self._modificadas.setdefault(fila, {})
+                anteriores = {
+                    col: actual[col] if col in actual else df_base.iat[fila, df_base.columns.get_loc(col)]
+                    for col in COLUMNAS_INDEXADAS if col in cambios
+                }
+                actual.update(cambios)
+            self.secundario.cambiar(fila, anteriores, cambios)
+            if cambios.get('HASH', operacion['hash']) != operacion['hash']:
+                self.indice.quitar(operacion['hash'])
+                self.indice.agregar(cambios['HASH'], fila)
+        self._aplicadas += len(pendientes)
+
+    def _reiniciar_base(self, firma, generacion, df_registros, secundario=None):
+        """Toma un DataFrame como nueva base de la copia en memoria, sin cambios encima"""
+        if secundario is None:
+            secundario = IndiceSecundario()
+            secundario.construir(df_registros)
+        self.secundario = secundario
+        self._base = (firma, generacion, df_registros)
+        self._aplicadas = 0
+        self._modificadas = {}
+        self._altas = []
+        self._materializado = (0, df_registros)
+
+    def _registros_materializados(self):
+        """DataFrame completo de la copia en memoria (se arma de nuevo solo si hubo cambios)"""
+        if self._materializado is None or self._materializado[0] != self._aplicadas:
+            self._materializado = (
+                self._aplicadas, materializar_registros(self._base[2], self._modificadas, self._altas)
+            )
+        return self._materializado[1]
+
+    def _sincronizar_tocados(self, cadenas):
+        """Hace fsync de las cadenas indicadas, de las particiones de la bitácora y del libro mayor"""
+        for hash_doc in cadenas:
+            ruta = ruta_blockchain(hash_doc)
+            if ruta.endswith(EXTENSION_BINARIA):
+                _sincronizar_archivo(ruta_diccionario(ruta))
+            _sincronizar_archivo(ruta)
+        obtener_bitacora().sincronizar()
+        if cadenas:
+            libro_mayor.obtener_libro().sincronizar()
+
+    def punto_control(self, df_registros=None):
+        """Escribe el registro, sincroniza lo tocado y vacía el registro de transacciones"""
+        with self.candado.exclusivo():
+            externo = df_registros is not None
+            if not externo and self.pendientes:
+                # La copia en memoria ya tiene aplicadas las operaciones y su índice al día
+                with self._candado_cache:
+                    self._ponerse_al_dia()
+                    df_registros = self._registros_materializados()
+            if df_registros is not None:
+                escribir_atomico(CSV_REGISTROS, df_registros.to_csv(index=False).encode('utf-8'))
+            self._sincronizar_tocados(self.cadenas_tocadas)
+
+            self.estado = {'secuencia': self.secuencia, 'bitacora': obtener_bitacora().tamaños()}
+            escribir_atomico(self.ruta_estado, json.dumps(self.estado).encode('utf-8'))
+            os.ftruncate(self._archivo(), 0)
+            os.fsync(self._archivo())
+            with self._candado_anexar:
+                self.pendientes = []
+                self.generacion += 1
+            self.cadenas_tocadas = set()
+            self.confirmadas = 0
+            if df_registros is not None:
+                # El CSV recién escrito es la nueva base de la copia en memoria y del índice
+                with self._candado_cache:
+                    firma = _firma_archivo(CSV_REGISTROS)
+                    if externo:
+                        self.indice.construir(df_registros['HASH'].tolist())
+                    self.indice.guardar(firma)
+                    self._reiniciar_base(
+                        firma, self.generacion, df_registros.copy(deep=False), None if externo else self.secundario
+                    )
+
+    def _compactar(self):
+        """Punto de control en segundo plano: reescribe el CSV sin detener las confirmaciones.
+
+        Bajo el candado exclusivo solo se toman una instantánea (al inicio) y se publican
+        los archivos (al final); el DataFrame, el CSV y los índices se arman entre medio
+        mientras siguen llegando transacciones, que quedan en el registro de transacciones.
+        """
+        temporal = f"{CSV_REGISTROS}.compactando"
+        temporal_indice = f"{self.indice.ruta}.compactando"
+        try:
+            with self.candado.exclusivo():
+                with self._candado_cache:
+                    self._ponerse_al_dia()
+                    base = self._base
+                    modificadas = {fila: dict(cambios) for fila, cambios in self._modificadas.items()}
+                    altas = [dict(registro) for registro in self._altas]
+                cantidad = len(self.pendientes)
+                secuencia = self.secuencia
+                tamaños_bitacora = obtener_bitacora().tamaños()
+                desplazamiento = os.lseek(self._archivo(), 0, os.SEEK_END)
+                cadenas = self.cadenas_tocadas
+                self.cadenas_tocadas = set()
+                self.confirmadas = 0
+
+            df_registros = materializar_registros(base[2], modificadas, altas)
+            escribir_atomico(temporal, df_registros.to_csv(index=False).encode('utf-8'))
+            # os.replace conserva inodo y fecha: la firma del temporal será la del CSV publicado
+            firma = _firma_archivo(temporal)
+            indice = IndiceDigestos(self.indice.ruta)
+            indice.construir(df_registros['HASH'].tolist())
+            indice.guardar(firma, temporal_indice)
+            secundario = IndiceSecundario()
+            secundario.construir(df_registros)
+            self._sincronizar_tocados(cadenas)
+
+            with self.candado.exclusivo():
+                if self._base is not base or _firma_archivo(CSV_REGISTROS) != base[0]:
+                    # Otro punto de control o un cambio externo se adelantó: se descarta
+                    return
+                os.replace(temporal, CSV_REGISTROS)
+                os.replace(temporal_indice, indice.ruta)
+                sincronizar_directorio(CSV_REGISTROS)
+                self.estado = {'secuencia': secuencia, 'bitacora': tamaños_bitacora}
+                escribir_atomico(self.ruta_estado, json.dumps(self.estado).encode('utf-8'))
+                # Quedan en el registro de transacciones solo las posteriores a la instantánea
+                with open(self.ruta, 'rb') as f:
+                    f.seek(desplazamiento)
+                    restantes = f.read()
+                escribir_atomico(self.ruta, restantes)
+                os.close(self._archivo())
+                self._descriptor = None
+                with self._candado_anexar:
+                    self.pendientes = self.pendientes[cantidad:]
+                    self.generacion += 1
+                with self._candado_cache:
+                    self.indice = indice
+                    self._reiniciar_base(firma, self.generacion, df_registros, secundario)
+        finally:
+            with self._candado_anexar:
+                self._compactando = False
+            for ruta in (temporal, temporal_indice):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+
+# ==========================================
+# ESCRITOR ÚNICO CON CONFIRMACIÓN EN GRUPO
+# ==========================================
+# Todas las transacciones del proceso pasan por un solo hilo escritor. El hilo toma de la
+# cola las transacciones que lleguen durante VENTANA_ESCRITURA segundos (hasta
+# LOTE_ESCRITURA) y las confirma juntas con una sola sincronización. Quien envía recibe
+# un Future que se resuelve cuando su transacción es durable (o con su conflicto).
+
+class EscritorUnico:
+    """Hilo escritor que confirma en lotes las transacciones recibidas por una cola"""
+
+    def __init__(self, confirmar_lote, ventana=None, maximo=None):
+        self.confirmar_lote = confirmar_lote
+        self.ventana = VENTANA_ESCRITURA if ventana is None else ventana
+        self.maximo = LOTE_ESCRITURA if maximo is None else maximo
+        self._cola = queue.Queue()
+        self._candado = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self.lotes = 0
+        self.transacciones = 0
+
+    def enviar(self, operaciones):
+        """Encola una transacción y devuelve el Future de su confirmación"""
+        futuro = Future()
+        self._iniciar()
+        self._cola.put((operaciones, futuro))
+        return futuro
+
+    def en_hilo_escritor(self):
+        """Indica si el hilo actual es el escritor (que no debe esperar a su propia cola)"""
+        return threading.current_thread() is self._hilo
+
+    def _iniciar(self):
+        """Arranca el hilo escritor (una vez por proceso)"""
+        with self._candado:
+            if self._hilo is None or self._pid != os.getpid() or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._ciclo, name="escritor-almacenamiento", daemon=True)
+                self._pid = os.getpid()
+                self._hilo.start()
+
+    def _tomar_lote(self):
+        """Espera una transacción y junta las que lleguen dentro de la ventana"""
+        lote = [self._cola.get()]
+        limite = time.monotonic() + self.ventana
+        while len(lote) < self.maximo:
+            try:
+                restante = limite - time.monotonic()
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _ciclo(self):
+        """Confirma lotes indefinidamente y resuelve los Future de cada transacción"""
+        while True:
+            lote = self._tomar_lote()
+            try:
+                resultados = self.confirmar_lote([operaciones for operaciones, _ in lote])
+            except Exception as error:
+                for _, futuro in lote:
+                    futuro.set_exception(error)
+                continue
+            self.lotes += 1
+            self.transacciones += len(lote)
+            for (_, futuro), resultado in zip(lote, resultados):
+                if isinstance(resultado, Exception):
+                    futuro.set_exception(resultado)
+                else:
+                    futuro.set_result(resultado)
+
+
+_registros_transacciones = {}
+
+def obtener_registro_transacciones():
+    """Devuelve la instancia (única por proceso) del registro de transacciones"""
+    if ARCHIVO_TRANSACCIONES not in _registros_transacciones:
+        _registros_transacciones[ARCHIVO_TRANSACCIONES] = RegistroTransacciones()
+    return _registros_transacciones[ARCHIVO_TRANSACCIONES]
+
+
+class Transaccion:
+    """Cambios de una acción que se confirman juntos (misma interfaz de escritura que el backend)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.operaciones = []
+        self._cabezas = {}
+
+    def guardar_registro(self, registro):
+        """Agrega un documento nuevo al registro"""
+        self.operaciones.append({'tipo': 'alta', 'registro': _fila_transaccion(registro)})
+
+    def actualizar_registro(self, hash_doc, cambios):
+        """Cambia campos de un documento del registro"""
+        self.operaciones.append({'tipo': 'registro', 'hash': hash_doc, 'cambios': _fila_transaccion(cambios)})
+
+    def obtener_cabeza(self, hash_doc):
+        """Cabeza de la cadena contando los bloques ya agregados a esta transacción"""
+        if hash_doc in self._cabezas:
+            return self._cabezas[hash_doc]
+        return self.backend.obtener_cabeza(hash_doc)
+
+    def anexar_bloque(self, hash_doc, bloque):
+        """Agrega un bloque a la cadena del documento"""
+        bloque = _fila_transaccion(bloque)
+        self.operaciones.append({'tipo': 'bloque', 'hash': hash_doc, 'bloque': bloque})
+        self._cabezas[hash_doc] = {
+            'hash_documento': hash_doc,
+            'numero_bloque': int(bloque['numero_bloque']),
+            'hash_bloque': bloque['hash_bloque'],
+            'accion': bloque.get('accion', ''),
+            'timestamp': bloque.get('timestamp', '')
+        }
+        return self._cabezas[hash_doc]
+
+    def registrar_bitacora(self, evento):
+        """Agrega un evento a la bitácora"""
+        self.operaciones.append({'tipo': 'bitacora', 'evento': _fila_transaccion(evento)})
+        return True
+
+    def enviar(self):
+        """Envía las operaciones al escritor del backend y devuelve el Future de su confirmación"""
+        futuro = self.backend.enviar_transaccion(self.operaciones)
+        self.operaciones = []
+        return futuro
+
+    def confirmar(self):
+        """Confirma todas las operaciones y espera a que sean durables"""
+        if self.operaciones:
+            self.enviar().result()
+        self.operaciones = []
+
+
+@contextmanager
+def transaccion(backend=None):
+    """Abre una transacción que se confirma al salir del bloque 'with' (y se descarta si hay error)"""
+    actual = Transaccion(backend or obtener_backend())
+    yield actual
+    actual.confirmar()
+
+# ==========================================
+# BACKENDS DE ALMACENAMIENTO
+# ==========================================
+# Ambos backends exponen la misma interfaz: registro de documentos, cadenas por
+# documento y bitácora. La aplicación obtiene el activo con obtener_backend().
+
+class BackendCSV:
+    """Backend de archivos CSV: registro, bitácora y un archivo de cadena por documento"""
+
+    nombre = "csv"
+
+    def __init__(self):
+        self.transacciones = obtener_registro_transacciones()
+        self.escritor = EscritorUnico(self._confirmar_lote)
+
+    def recuperar(self):
+        """Rehace las transacciones pendientes del registro de transacciones (al iniciar)"""
+        if self.transacciones.recuperado:
+            return 0
+        bloques = self.transacciones.recuperar()
+        self._actualizar_derivadas(bloques)
+        return len(bloques)
+
+    def _actualizar_derivadas(self, bloques):
+        """Actualiza árboles Merkle, libro mayor e instantáneas de los bloques anexados"""
+        for hash_doc, bloque in bloques:
+            despues_de_anexar(self, hash_doc, bloque, os.path.basename(ruta_blockchain(hash_doc)))
+
+    def _confirmar_lote(self, lote):
+        """Confirma en el registro de transacciones un lote recibido por el escritor"""
+        return self.transacciones.confirmar_lote(lote, self._actualizar_derivadas)
+
+    def enviar_transaccion(self, operaciones):
+        """Envía una transacción al escritor único; devuelve un Future"""
+        return self.escritor.enviar(operaciones)
+
+    def confirmar_transaccion(self, operaciones):
+        """Confirma una transacción y espera a que sea durable"""
+        return self.enviar_transaccion(operaciones).result()
+
+    def cargar_registros(self):
+        """Devuelve el registro de documentos (copia en memoria compartida por las sesiones)"""
+        return self.transacciones.registros_vigentes()
+
+    def filtrar_registros(self, criterios):
+        """Documentos que cumplen los criterios {columna: valor o lista de valores} (índices secundarios)"""
+        return self.transacciones.filtrar_registros(criterios)
+
+    def buscar_documento(self, hash_doc):
+        """Devuelve como diccionario el registro de un documento (índice ordenado de digestos) o None"""
+        return self.transacciones.buscar_documento(hash_doc)
+
+    def existe_documento(self, hash_doc):
+        """Indica si el hash ya está registrado"""
+        return self.buscar_documento(hash_doc) is not None
+
+    def guardar_registro(self, registro):
+        """Agrega un documento nuevo al registro"""
+        with transaccion(self) as actual:
+            actual.guardar_registro(registro)
+        return self.cargar_registros()
+
+    def guardar_registros(self, df_registros):
+        """Reemplaza el registro completo de documentos"""
+        self.transacciones.punto_control(df_registros)
+
+    def cargar_blockchain(self, hash_doc):
+        """Carga la cadena completa de un documento ordenada por número de bloque"""
+        blockchain_path = ruta_blockchain(hash_doc)
+        if not os.path.exists(blockchain_path):
+            return pd.DataFrame()
+        try:
+            if blockchain_path.endswith(EXTENSION_BINARIA):
+                return leer_cadena_binaria(blockchain_path)
+            return pd.read_csv(blockchain_path).sort_values('numero_bloque')
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            # Archivo movido por la migración entre la comprobación y la lectura, o vacío
+            return pd.DataFrame()
+
+    def cargar_bloques_desde(self, hash_doc, desde):
+        """Devuelve como diccionarios los bloques con número mayor o igual a 'desde'"""
+        blockchain_path = ruta_blockchain(hash_doc)
+        if blockchain_path.endswith(EXTENSION_BINARIA):
+            # Los registros de ancho fijo permiten saltar directamente al bloque 'desde'
+            return _leer_registros_binarios(blockchain_path, max(desde, 0), contar_bloques_binario(blockchain_path))
+
+        if not os.path.exists(blockchain_path):
+            return []
+        if desde > 0:
+            # Solo la cola: leer desde el final hasta el bloque 'desde'
+            bloques = []
+            for bloque in iterar_bloques_inverso(blockchain_path):
+                if int(bloque['numero_bloque']) < desde:
+                    break
+                bloques.append(bloque)
+            return bloques[::-1]
+        with open(blockchain_path, 'r', encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+
+    def iterar_historial(self, hash_doc, tamaño_pagina):
+        """Produce páginas de bloques del más reciente al más antiguo, leyendo el archivo desde el final"""
+        pagina = []
+        for bloque in iterar_bloques_inverso(ruta_blockchain(hash_doc)):
+            pagina.append(bloque)
+            if len(pagina) == tamaño_pagina:
+                yield pagina
+                pagina = []
+        if pagina:
+            yield pagina
+
+    def obtener_cabeza(self, hash_doc):
+        """Devuelve la cabeza de la cadena de un documento desde el índice de cabezas"""
+        return obtener_cabeza(hash_doc)
+
+    def realizo_accion(self, hash_doc, accion, usuario):
+        """Indica si el usuario ya registró la acción en la cadena (índice de acciones por usuario)"""
+        return usuario_realizo_accion(self, hash_doc, accion, usuario)
+
+    def obtener_punto_control(self, hash_doc):
+        """Devuelve el último punto de control de validación de una cadena"""
+        return _puntos_control.obtener(hash_doc)
+
+    def guardar_punto_control(self, hash_doc, numero_bloque, hash_bloque):
+        """Registra que la cadena está validada hasta el bloque indicado"""
+        _puntos_control.registrar({
+            'hash_documento': hash_doc,
+            'numero_bloque': int(numero_bloque),
+            'hash_bloque': hash_bloque
+        })
+
+    @staticmethod
+    def _ruta_instantaneas(hash_doc):
+        """Archivo de instantáneas de la cadena (una línea JSON por instantánea, en orden)"""
+        return ruta_archivo_cadena(hash_doc, f"instantaneas_{hash_doc[:16]}.jsonl")
+
+    def obtener_instantanea(self, hash_doc, hasta=None):
+        """Devuelve la instantánea más reciente con número de bloque menor o igual a 'hasta'"""
+        ruta = self._ruta_instantaneas(hash_doc)
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, 'rb') as f:
+            fin = f.seek(0, os.SEEK_END)
+            leido = TAMAÑO_LECTURA_COLA
+            # Recorrer las líneas desde el final
+            while fin > 0:
+                inicio = max(0, fin - leido)
+                f.seek(inicio)
+                datos = f.read(fin - inicio)
+                corte = datos.rfind(b'\n', 0, len(datos) - 1)
+                if corte == -1 and inicio > 0:
+                    leido *= 2
+                    continue
+                linea = datos[corte + 1:]
+                fin = inicio + corte + 1
+                leido = TAMAÑO_LECTURA_COLA
+                if not linea.endswith(b'\n'):
+                    continue
+                instantanea = json.loads(linea)
+                if hasta is None or instantanea['numero_bloque'] <= hasta:
+                    return instantanea
+        return None
+
+    def guardar_instantanea(self, instantanea):
+        """Anexa una instantánea al archivo de la cadena"""
+        ruta = self._ruta_instantaneas(instantanea['hash_documento'])
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'ab+') as f:
+            _reparar_cola(f)
+            f.seek(0, os.SEEK_END)
+            f.write((json.dumps(instantanea, ensure_ascii=False) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def anexar_bloque(self, hash_doc, bloque):
+        """Anexa un bloque a la cadena del documento"""
+        with transaccion(self) as actual:
+            cabeza = actual.anexar_bloque(hash_doc, bloque)
+        return cabeza
+
+    def registrar_bitacora(self, evento):
+        """Agrega un evento a la bitácora"""
+        with transaccion(self) as actual:
+            actual.registrar_bitacora(evento)
+        return True
+
+    def cargar_bitacora(self, filtro_hash=None, desde=None, hasta=None, ultimos=None, hashes=None,
+                        filtro_usuario=None):
+        """Carga la bitácora del evento más reciente al más antiguo.
+
+        Solo se abren las particiones que cubren el rango de fechas (o que hacen falta
+        para los 'ultimos' N eventos); 'filtro_hash', 'hashes' y 'filtro_usuario' se
+        resuelven con el índice por documento y por usuario de la bitácora.
+        """
+        # La bitácora de un solo archivo de versiones anteriores se migra al recuperar
+        self.recuperar()
+        return obtener_bitacora().cargar(desde, hasta, ultimos, filtro_hash, hashes, filtro_usuario)
+
+    def usuarios_bitacora(self):
+        """Usuarios con eventos en la bitácora (índice por usuario)"""
+        self.recuperar()
+        return obtener_bitacora().usuarios()
+
+    def verificar_bitacora(self, completa=False):
+        """Verifica firmas y encadenamiento de la bitácora (desde el último sello verificado)"""
+        self.recuperar()
+        return obtener_bitacora().verificar(completa)
+
+    def resumen_bitacora(self):
+        """Total de eventos y fechas del primero y el último, según el manifiesto"""
+        self.recuperar()
+        return obtener_bitacora().resumen()
+
+
+class BackendSQLite:
+    """Backend sobre sqlite3 (modo WAL) con tablas de documentos, bloques y eventos"""
+
+    nombre = "sqlite"
+
+    ESQUEMA = f"""
+    CREATE TABLE IF NOT EXISTS documentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        {', '.join(f'{col} TEXT' for col in COLUMNAS_REGISTRO)}
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_documentos_hash ON documentos (HASH);
+    CREATE INDEX IF NOT EXISTS idx_documentos_area ON documentos (AREA);
+    CREATE INDEX IF NOT EXISTS idx_documentos_estatus ON documentos (ESTATUS);
+    CREATE INDEX IF NOT EXISTS idx_documentos_tipo ON documentos (TIPO);
+
+    CREATE TABLE IF NOT EXISTS bloques (
+        numero_bloque INTEGER NOT NULL,
+        {', '.join(f'{col} TEXT' for col in COLUMNAS_BLOQUE if col != 'numero_bloque')},
+        PRIMARY KEY (hash_documento, numero_bloque)
+    );
+    CREATE INDEX IF NOT EXISTS idx_bloques_hash_documento ON bloques (hash_documento);
+    CREATE INDEX IF NOT EXISTS idx_bloques_accion ON bloques (accion);
+    CREATE INDEX IF NOT EXISTS idx_bloques_usuario_accion ON bloques (usuario_accion);
+
+    CREATE TABLE IF NOT EXISTS puntos_control (
+        hash_documento TEXT PRIMARY KEY,
+        numero_bloque INTEGER NOT NULL,
+        hash_bloque TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS instantaneas (
+        hash_documento TEXT NOT NULL,
+        numero_bloque INTEGER NOT NULL,
+        hash_bloque TEXT NOT NULL,
+        hash_acumulado TEXT NOT NULL,
+        timestamp TEXT,
+        estado TEXT NOT NULL,
+        PRIMARY KEY (hash_documento, numero_bloque)
+    );
+
+    CREATE TABLE IF NOT EXISTS eventos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        {', '.join(f'{col} TEXT' for col in COLUMNAS_BITACORA + COLUMNAS_ENCADENAMIENTO)}
+    );
+    CREATE INDEX IF NOT EXISTS idx_eventos_hash ON eventos (hash);
+    CREATE INDEX IF NOT EXISTS idx_eventos_accion ON eventos (accion);
+    CREATE INDEX IF NOT EXISTS idx_eventos_usuario ON eventos (usuario);
+    CREATE INDEX IF NOT EXISTS idx_eventos_fecha ON eventos (fecha_hora);
+
+    CREATE TABLE IF NOT EXISTS sellos_bitacora (
+        numero INTEGER PRIMARY KEY,
+        fecha_hora TEXT NOT NULL,
+        id_evento INTEGER NOT NULL,
+        eventos INTEGER NOT NULL,
+        hash_cabeza TEXT NOT NULL,
+        anterior TEXT NOT NULL,
+        firma TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS verificacion_bitacora (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        sello INTEGER NOT NULL,
+        firma_sello TEXT NOT NULL,
+        id_evento INTEGER NOT NULL,
+        hash_evento TEXT NOT NULL,
+        eventos INTEGER NOT NULL,
+        fecha_hora TEXT NOT NULL,
+        firma TEXT NOT NULL
+    );
+    """
+
+    # La tabla de eventos es una cadena como las particiones CSV: cada evento lleva el hash
+    # del anterior y el suyo. Cada TRANSACCIONES_POR_PUNTO eventos se anexa un sello firmado
+    # (HMAC) con el último evento, el total de eventos y la cabeza; el verificador parte del
+    # último sello ya verificado y revisa solo los eventos posteriores.
+    COLUMNAS_SELLO = ['numero', 'fecha_hora', 'id_evento', 'eventos', 'hash_cabeza', 'anterior', 'firma']
+    COLUMNAS_VERIFICACION = ['sello', 'firma_sello', 'id_evento', 'hash_evento', 'eventos', 'fecha_hora', 'firma']
+
+    INSERTAR_DOCUMENTO = (f"INSERT INTO documentos ({', '.join(COLUMNAS_REGISTRO)}) "
+                          f"VALUES ({', '.join('?' for _ in COLUMNAS_REGISTRO)})")
+    INSERTAR_BLOQUE = (f"INSERT INTO bloques ({', '.join(COLUMNAS_BLOQUE)}) "
+                       f"VALUES ({', '.join('?' for _ in COLUMNAS_BLOQUE)})")
+    INSERTAR_EVENTO = (f"INSERT INTO eventos ({', '.join(COLUMNAS_BITACORA + COLUMNAS_ENCADENAMIENTO)}) "
+                       f"VALUES ({', '.join('?' for _ in COLUMNAS_BITACORA + COLUMNAS_ENCADENAMIENTO)})")
+    INSERTAR_SELLO = (f"INSERT INTO sellos_bitacora ({', '.join(COLUMNAS_SELLO)}) "
+                      f"VALUES ({', '.join('?' for _ in COLUMNAS_SELLO)})")
+
+    def __init__(self, ruta=BASE_DATOS_SQLITE):
+        self.ruta = ruta
+        self.escritor = EscritorUnico(self._confirmar_lote)
+        self._local = threading.local()
+        self._candado_cache = threading.Lock()
+        self._cache_registros = None
+        self._version = 0
+        # Sin una clave fuera de los datos no se aceptan eventos: se falla al abrir la base de datos
+        _clave_firma()
+        with self._conexion() as conexion:
+            conexion.executescript(self.ESQUEMA)
+            columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(eventos)")}
+        if 'hash_evento' not in columnas:
+            # Base de datos anterior al encadenamiento de la bitácora
+            self.confirmar_transaccion([{'tipo': 'encadenar_eventos'}])
+
+    def _conexion(self):
+        """Devuelve la conexión del hilo actual (Streamlit atiende cada sesión en su propio hilo)"""
+        conexion = getattr(self._local, 'conexion', None)
+        # Un proceso hijo (grupo de verificación) no debe reutilizar la conexión del padre
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=30)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=FULL")
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    @staticmethod
+    def _texto(valor):
+        """Convierte un valor a texto para SQLite (NaN y None se guardan vacíos)"""
+        valor = valor_csv(valor)
+        return valor if isinstance(valor, str) else str(valor)
+
+    def recuperar(self):
+        """SQLite recupera sus transacciones al abrir la base de datos"""
+        return 0
+
+    def enviar_transaccion(self, operaciones):
+        """Envía una transacción al escritor único; devuelve un Future"""
+        return self.escritor.enviar(operaciones)
+
+    def confirmar_transaccion(self, operaciones):
+        """Confirma una transacción y espera a que sea durable"""
+        return self.enviar_transaccion(operaciones).result()
+
+    def _confirmar_lote(self, lote):
+        """Confirma un lote en una sola transacción de SQLite (un punto de guardado por transacción).
+
+        Solo lo llama el hilo escritor: es el único que escribe en la base de datos.
+        """
+        resultados = []
+        documentos = set()
+        for operaciones in lote:
+            documentos |= documentos_de_operaciones(operaciones)
+        with candado_documentos(documentos):
+            conexion = self._conexion()
+            with conexion:
+                conexion.execute("BEGIN IMMEDIATE")
+                for operaciones in lote:
+                    try:
+                        # La misma conexión ve los bloques de las transacciones anteriores del lote
+                        comprobar_cabezas(operaciones, self.obtener_cabeza)
+                    except ConflictoConcurrencia as error:
+                        resultados.append(error)
+                        continue
+                    conexion.execute("SAVEPOINT transaccion")
+                    try:
+                        self._escribir_operaciones(conexion, operaciones)
+                    except sqlite3.IntegrityError as error:
+                        # Otro proceso anexó el mismo número de bloque o registró el mismo documento
+                        conexion.execute("ROLLBACK TO transaccion")
+                        resultados.append(ConflictoConcurrencia(str(error)))
+                    else:
+                        resultados.append([(op['hash'], op['bloque']) for op in operaciones if op['tipo'] == 'bloque'])
+                    conexion.execute("RELEASE transaccion")
+                if any(op['tipo'] == 'bitacora' for operaciones in lote for op in operaciones):
+                    self._sellar_bitacora(conexion, TRANSACCIONES_POR_PUNTO)
+            # Solo el hilo escritor cambia la versión de la copia en memoria
+            self._version += 1
+            anexados = False
+            for resultado in resultados:
+                if not isinstance(resultado, Exception):
+                    for hash_doc, bloque in resultado:
+                        despues_de_anexar(self, hash_doc, bloque, os.path.basename(self.ruta))
+                        anexados = True
+            if anexados:
+                # Un solo fsync del libro mayor por lote
+                libro_mayor.obtener_libro().sincronizar()
+        return resultados
+
+    def _escribir_operaciones(self, conexion, operaciones):
+        """Ejecuta las operaciones de una transacción en la conexión"""
+        for operacion in operaciones:
+            if operacion['tipo'] == 'alta':
+                conexion.execute(self.INSERTAR_DOCUMENTO, self._fila_documento(operacion['registro']))
+            elif operacion['tipo'] == 'registros':
+                conexion.execute("DELETE FROM documentos")
+                conexion.executemany(self.INSERTAR_DOCUMENTO, [self._fila_documento(r) for r in operacion['registros']])
+            elif operacion['tipo'] == 'registro':
+                cambios = {col: valor for col, valor in operacion['cambios'].items() if col in COLUMNAS_REGISTRO}
+                if cambios:
+                    conexion.execute(
+                        f"UPDATE documentos SET {', '.join(f'{col} = ?' for col in cambios)} WHERE HASH = ?",
+                        [self._texto(valor) for valor in cambios.values()] + [operacion['hash']]
+                    )
+            elif operacion['tipo'] in ('bloque', 'bloque_importado'):
+                conexion.execute(self.INSERTAR_BLOQUE, self._fila_bloque(operacion['hash'], operacion['bloque']))
+            elif operacion['tipo'] == 'bitacora':
+                fila = self._fila_evento(operacion['evento'])
+                anterior = self._cabeza_bitacora(conexion)
+                conexion.execute(self.INSERTAR_EVENTO, fila + [anterior, calcular_hash_evento(anterior, fila)])
+            elif operacion['tipo'] == 'vaciar_bitacora':
+                conexion.execute("DELETE FROM eventos")
+                conexion.execute("DELETE FROM sellos_bitacora")
+                conexion.execute("DELETE FROM verificacion_bitacora")
+            elif operacion['tipo'] == 'encadenar_eventos':
+                self._encadenar_eventos(conexion)
+            elif operacion['tipo'] == 'verificacion_bitacora':
+                verificacion = operacion['verificacion']
+                conexion.execute(
+                    f"INSERT OR REPLACE INTO verificacion_bitacora (id, {', '.join(self.COLUMNAS_VERIFICACION)}) "
+                    f"VALUES (1, {', '.join('?' for _ in self.COLUMNAS_VERIFICACION)})",
+                    [verificacion[col] for col in self.COLUMNAS_VERIFICACION]
+                )
+            elif operacion['tipo'] == 'punto_control':
+                conexion.execute(
+                    "INSERT OR REPLACE INTO puntos_control (hash_documento, numero_bloque, hash_bloque) VALUES (?, ?, ?)",
+                    (operacion['hash'], int(operacion['numero_bloque']), operacion['hash_bloque'])
+                )
+            elif operacion['tipo'] == 'instantanea':
+                instantanea = operacion['instantanea']
+                conexion.execute(
+                    "INSERT OR IGNORE INTO instantaneas "
+                    "(hash_documento, numero_bloque, hash_bloque, hash_acumulado, timestamp, estado) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (instantanea['hash_documento'], int(instantanea['numero_bloque']), instantanea['hash_bloque'],
+                     instantanea['hash_acumulado'], instantanea.get('timestamp', ''),
+                     json.dumps(instantanea['estado'], ensure_ascii=False))
+                )
+
+    def cargar_registros(self):
+        """Carga el registro de documentos en orden de inserción (copia en memoria compartida).
+
+        Se vuelve a consultar solo tras una escritura propia o si la base de datos o su
+        archivo -wal cambiaron (escrituras de otro proceso).
+        """
+        firma = (self._version, _firma_archivo(self.ruta), _firma_archivo(f"{self.ruta}-wal"))
+        with self._candado_cache:
+            if self._cache_registros is None or self._cache_registros[0] != firma:
+                df_registros = pd.read_sql_query(
+                    f"SELECT {', '.join(COLUMNAS_REGISTRO)} FROM documentos ORDER BY id", self._conexion()
+                )
+                self._cache_registros = (firma, df_registros)
+            return self._cache_registros[1].copy(deep=False)
+
+    def filtrar_registros(self, criterios):
+        """Documentos que cumplen los criterios {columna: valor o lista de valores} (índices de la tabla)"""
+        criterios = normalizar_criterios(criterios)
+        if not criterios:
+            return self.cargar_registros()
+        condiciones = [f"{col} IN ({', '.join('?' for _ in valores)})" for col, valores in criterios.items()]
+        parametros = [valor for valores in criterios.values() for valor in valores]
+        return pd.read_sql_query(
+            f"SELECT {', '.join(COLUMNAS_REGISTRO)} FROM documentos WHERE {' AND '.join(condiciones)} ORDER BY id",
+            self._conexion(), params=parametros
+        )
+
+    def buscar_documento(self, hash_doc):
+        """Devuelve como diccionario el registro de un documento (índice único de HASH) o None"""
+        fila = self._conexion().execute(
+            f"SELECT {', '.join(COLUMNAS_REGISTRO)} FROM documentos WHERE HASH = ? ORDER BY id LIMIT 1", (hash_doc,)
+        ).fetchone()
+        return dict(zip(COLUMNAS_REGISTRO, fila)) if fila else None
+
+    def existe_documento(self, hash_doc):
+        """Indica si el hash ya está registrado"""
+        return self.buscar_documento(hash_doc) is not None
+
+    def _fila_documento(self, registro):
+        """Valores de un documento en el orden de COLUMNAS_REGISTRO"""
+        return [self._texto(registro.get(col, '')) for col in COLUMNAS_REGISTRO]
+
+    def guardar_registro(self, registro):
+        """Agrega un documento nuevo al registro"""
+        with transaccion(self) as actual:
+            actual.guardar_registro(registro)
+        return self.cargar_registros()
+
+    def guardar_registros(self, df_registros):
+        """Reemplaza el registro completo de documentos en una sola transacción"""
+        self.confirmar_transaccion([{'tipo': 'registros', 'registros': df_registros.to_dict('records')}])
+
+    def cargar_blockchain(self, hash_doc):
+        """Carga la cadena completa de un documento ordenada por número de bloque"""
+        df_blockchain = pd.read_sql_query(
+            f"SELECT {', '.join(COLUMNAS_BLOQUE)} FROM bloques "
+            "WHERE hash_documento = ? ORDER BY numero_bloque",
+            self._conexion(), params=(hash_doc,)
+        )
+        return df_blockchain if not df_blockchain.empty else pd.DataFrame()
+
+    def cargar_bloques_desde(self, hash_doc, desde):
+        """Devuelve como diccionarios los bloques con número mayor o igual a 'desde'"""
+        return pd.read_sql_query(
+            f"SELECT {', '.join(COLUMNAS_BLOQUE)} FROM bloques "
+            "WHERE hash_documento = ? AND numero_bloque >= ? ORDER BY numero_bloque",
+            self._conexion(), params=(hash_doc, int(desde))
+        ).to_dict('records')
+
+    def iterar_historial(self, hash_doc, tamaño_pagina):
+        """Produce páginas de bloques del más reciente al más antiguo (paginación por clave)"""
+        limite = None
+        while True:
+            consulta = f"SELECT {', '.join(COLUMNAS_BLOQUE)} FROM bloques WHERE hash_documento = ?"
+            parametros = [hash_doc]
+            if limite is not None:
+                consulta += " AND numero_bloque < ?"
+                parametros.append(limite)
+            consulta += " ORDER BY numero_bloque DESC LIMIT ?"
+            parametros.append(int(tamaño_pagina))
+            filas = self._conexion().execute(consulta, parametros).fetchall()
+            if not filas:
+                return
+            yield [dict(zip(COLUMNAS_BLOQUE, fila)) for fila in filas]
+            limite = filas[-1][0]
+
+    def realizo_accion(self, hash_doc, accion, usuario):
+        """Indica si el usuario ya registró la acción en la cadena (índice de bloques por documento)"""
+        fila = self._conexion().execute(
+            "SELECT 1 FROM bloques WHERE hash_documento = ? AND accion = ? AND usuario_accion = ? LIMIT 1",
+            (hash_doc, accion, usuario)
+        ).fetchone()
+        return fila is not None
+
+    def obtener_punto_control(self, hash_doc):
+        """Devuelve el último punto de control de validación de una cadena"""
+        fila = self._conexion().execute(
+            "SELECT hash_documento, numero_bloque, hash_bloque FROM puntos_control WHERE hash_documento = ?",
+            (hash_doc,)
+        ).fetchone()
+        return dict(zip(COLUMNAS_PUNTO_CONTROL, fila)) if fila else None
+
+    def guardar_punto_control(self, hash_doc, numero_bloque, hash_bloque):
+        """Registra que la cadena está validada hasta el bloque indicado"""
+        self.confirmar_transaccion([{
+            'tipo': 'punto_control', 'hash': hash_doc, 'numero_bloque': int(numero_bloque), 'hash_bloque': hash_bloque
+        }])
+
+    def obtener_instantanea(self, hash_doc, hasta=None):
+        """Devuelve la instantánea más reciente con número de bloque menor o igual a 'hasta'"""
+        consulta = ("SELECT hash_documento, numero_bloque, hash_bloque, hash_acumulado, timestamp, estado "
+                    "FROM instantaneas WHERE hash_documento = ?")
+        parametros = [hash_doc]
+        if hasta is not None:
+            consulta += " AND numero_bloque <= ?"
+            parametros.append(int(hasta))
+        fila = self._conexion().execute(consulta + " ORDER BY numero_bloque DESC LIMIT 1", parametros).fetchone()
+        if fila is None:
+            return None
+        instantanea = dict(zip(['hash_documento', 'numero_bloque', 'hash_bloque', 'hash_acumulado', 'timestamp'], fila[:5]))
+        instantanea['estado'] = json.loads(fila[5])
+        return instantanea
+
+    def guardar_instantanea(self, instantanea):
+        """Guarda una instantánea de la cadena"""
+        operaciones = [{'tipo': 'instantanea', 'instantanea': instantanea}]
+        if self.escritor.en_hilo_escritor():
+            # Estructura derivada de un lote que el escritor está confirmando en este momento
+            with self._conexion() as conexion:
+                self._escribir_operaciones(conexion, operaciones)
+        else:
+            self.confirmar_transaccion(operaciones)
+
+    def obtener_cabeza(self, hash_doc):
+        """Devuelve el último bloque de la cadena usando la clave (hash_documento, numero_bloque)"""
+        fila = self._conexion().execute(
+            "SELECT hash_documento, numero_bloque, hash_bloque, accion, timestamp FROM bloques "
+            "WHERE hash_documento = ? ORDER BY numero_bloque DESC LIMIT 1",
+            (hash_doc,)
+        ).fetchone()
+        if fila is None:
+            return None
+        return dict(zip(['hash_documento', 'numero_bloque', 'hash_bloque', 'accion', 'timestamp'], fila))
+
+    def anexar_bloque(self, hash_doc, bloque):
+        """Anexa un bloque a la cadena del documento.
+
+        Pasa por el escritor único: bajo el candado del documento se comprueba que el
+        bloque continúe la cabeza actual (ConflictoConcurrencia si otra sesión anexó antes).
+        """
+        with transaccion(self) as actual:
+            cabeza = actual.anexar_bloque(hash_doc, bloque)
+        return cabeza
+
+    def _fila_bloque(self, hash_doc, bloque):
+        """Valores de un bloque en el orden de COLUMNAS_BLOQUE"""
+        valores = [int(bloque['numero_bloque'])] + [
+            self._texto(bloque.get(col, '')) for col in COLUMNAS_BLOQUE if col != 'numero_bloque'
+        ]
+        valores[COLUMNAS_BLOQUE.index('hash_documento')] = hash_doc
+        return valores
+
+    def _fila_evento(self, evento):
+        """Valores de un evento en el orden de COLUMNAS_BITACORA"""
+        return [self._texto(evento.get(col, '')) for col in COLUMNAS_BITACORA]
+
+    @staticmethod
+    def _cabeza_bitacora(conexion):
+        """Hash del último evento de la bitácora (el génesis si está vacía)"""
+        fila = conexion.execute("SELECT hash_evento FROM eventos ORDER BY id DESC LIMIT 1").fetchone()
+        return fila[0] if fila else HASH_GENESIS
+
+    def _encadenar_eventos(self, conexion):
+        """Agrega las columnas de encadenamiento a una tabla de eventos anterior y encadena sus filas"""
+        columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(eventos)")}
+        if 'hash_evento' in columnas:
+            return
+        for columna in COLUMNAS_ENCADENAMIENTO:
+            conexion.execute(f"ALTER TABLE eventos ADD COLUMN {columna} TEXT")
+        cabeza = HASH_GENESIS
+        filas = conexion.execute(f"SELECT id, {', '.join(COLUMNAS_BITACORA)} FROM eventos ORDER BY id").fetchall()
+        for id_evento, *fila in filas:
+            hash_evento = calcular_hash_evento(cabeza, fila)
+            conexion.execute("UPDATE eventos SET hash_anterior = ?, hash_evento = ? WHERE id = ?",
+                             (cabeza, hash_evento, id_evento))
+            cabeza = hash_evento
+
+    def _sellos_bitacora(self, conexion, desde=0):
+        """Sellos de la bitácora con número mayor o igual a 'desde', en orden"""
+        filas = conexion.execute(
+            f"SELECT {', '.join(self.COLUMNAS_SELLO)} FROM sellos_bitacora WHERE numero >= ? ORDER BY numero", (desde,)
+        ).fetchall()
+        return [dict(zip(self.COLUMNAS_SELLO, fila)) for fila in filas]
+
+    def _sellar_bitacora(self, conexion, minimo=1):
+        """Anexa un sello firmado si hay al menos 'minimo' eventos sin sellar; devuelve el sello o None"""
+        fila = conexion.execute(
+            f"SELECT {', '.join(self.COLUMNAS_SELLO)} FROM sellos_bitacora ORDER BY numero DESC LIMIT 1"
+        ).fetchone()
+        anterior = dict(zip(self.COLUMNAS_SELLO, fila)) if fila else None
+        nuevos, id_evento = conexion.execute(
+            "SELECT COUNT(*), MAX(id) FROM eventos WHERE id > ?", (anterior['id_evento'] if anterior else 0,)
+        ).fetchone()
+        if not nuevos or nuevos < minimo:
+            return None
+        hash_cabeza, = conexion.execute("SELECT hash_evento FROM eventos WHERE id = ?", (id_evento,)).fetchone()
+        sello = {
+            'numero': anterior['numero'] + 1 if anterior else 1,
+            'fecha_hora': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'id_evento': id_evento,
+            'eventos': (anterior['eventos'] if anterior else 0) + nuevos,
+            'hash_cabeza': hash_cabeza,
+            'anterior': anterior['firma'] if anterior else HASH_GENESIS
+        }
+        sello['firma'] = firmar_sello(sello)
+        conexion.execute(self.INSERTAR_SELLO, [sello[col] for col in self.COLUMNAS_SELLO])
+        return sello
+
+    def _leer_verificacion_bitacora(self, conexion):
+        """Último sello verificado y su último evento (se descarta si la firma no coincide)"""
+        fila = conexion.execute(
+            f"SELECT {', '.join(self.COLUMNAS_VERIFICACION)} FROM verificacion_bitacora WHERE id = 1"
+        ).fetchone()
+        if fila is None:
+            return {}
+        verificacion = dict(zip(self.COLUMNAS_VERIFICACION, fila))
+        if not hmac.compare_digest(str(verificacion['firma']), firmar_sello(verificacion)):
+            return {}
+        return verificacion
+
+    def registrar_bitacora(self, evento):
+        """Agrega un evento a la bitácora"""
+        with transaccion(self) as actual:
+            actual.registrar_bitacora(evento)
+        return True
+
+    def cargar_bitacora(self, filtro_hash=None, desde=None, hasta=None, ultimos=None, hashes=None,
+                        filtro_usuario=None):
+        """Carga la bitácora del evento más reciente al más antiguo (mismos filtros que el backend CSV)"""
+        condiciones = []
+        parametros = []
+        if filtro_hash:
+            condiciones.append("hash = ?")
+            parametros.append(filtro_hash)
+        if filtro_usuario:
+            condiciones.append("usuario = ?")
+            parametros.append(filtro_usuario)
+        if hashes is not None:
+            condiciones.append("hash IN (SELECT value FROM json_each(?))")
+            parametros.append(json.dumps(list(hashes)))
+        if desde is not None:
+            condiciones.append("fecha_hora >= ?")
+            parametros.append(desde)
+        if hasta is not None:
+            condiciones.append("fecha_hora <= ?")
+            parametros.append(hasta)
+        consulta = f"SELECT {', '.join(COLUMNAS_BITACORA)} FROM eventos"
+        if condiciones:
+            consulta += " WHERE " + " AND ".join(condiciones)
+        consulta += " ORDER BY fecha_hora DESC, id DESC"
+        if ultimos is not None:
+            consulta += " LIMIT ?"
+            parametros.append(int(ultimos))
+        return pd.read_sql_query(consulta, self._conexion(), params=parametros)
+
+    def resumen_bitacora(self):
+        """Total de eventos y fechas del primero y el último"""
+        eventos, desde, hasta = self._conexion().execute(
+            "SELECT COUNT(*), MIN(fecha_hora), MAX(fecha_hora) FROM eventos"
+        ).fetchone()
+        return {'eventos': eventos, 'desde': desde, 'hasta': hasta, 'particiones': None}
+
+    def verificar_bitacora(self, completa=False):
+        """Verifica las firmas de los sellos y el encadenamiento de los eventos.
+
+        Sin 'completa' parte del último sello ya verificado: comprueba que su último evento
+        siga igual y revisa solo los posteriores. Si todo está bien, el último sello queda
+        como verificado.
+        """
+        conexion = self._conexion()
+        previo = {} if completa else self._leer_verificacion_bitacora(conexion)
+        problemas = []
+
+        # Los sellos nuevos deben estar firmados y enlazados con el anterior
+        verificados = previo.get('sello', 0)
+        sellos = self._sellos_bitacora(conexion, verificados)
+        if verificados and (not sellos or sellos[0]['numero'] != verificados
+                            or sellos[0]['firma'] != previo['firma_sello']):
+            problemas.append("La tabla de sellos ya no contiene el último sello verificado")
+            verificados, previo = 0, {}
+            sellos = self._sellos_bitacora(conexion)
+        ultimo = sellos[-1] if sellos else None
+        nuevos = sellos[1:] if verificados else sellos
+        firma_anterior = sellos[0]['firma'] if verificados else HASH_GENESIS
+        for posicion, sello in enumerate(nuevos, start=verificados + 1):
+            if sello['numero'] != posicion or sello['anterior'] != firma_anterior:
+                problemas.append(f"El sello #{posicion} no enlaza con el anterior")
+            elif not hmac.compare_digest(str(sello['firma']), firmar_sello(sello)):
+                problemas.append(f"Firma inválida en el sello #{posicion}")
+            firma_anterior = sello['firma']
+
+        # Eventos posteriores al último verificado, que debe seguir igual y en su lugar
+        cabeza, desde, total = HASH_GENESIS, 0, 0
+        revisados = 0
+        sin_sellar = 0
+        punto_intacto = True
+        if previo:
+            fila = conexion.execute("SELECT hash_evento FROM eventos WHERE id = ?", (previo['id_evento'],)).fetchone()
+            if fila is None or fila[0] != previo['hash_evento']:
+                problemas.append(f"Cambió el evento {previo['id_evento']}, ya verificado")
+                punto_intacto = False
+            cabeza, desde, total = previo['hash_evento'], previo['id_evento'], previo['eventos']
+        por_evento = {sello['id_evento']: sello for sello in nuevos}
+        if punto_intacto:
+            filas = conexion.execute(
+                f"SELECT id, {', '.join(COLUMNAS_BITACORA + COLUMNAS_ENCADENAMIENTO)} FROM eventos "
+                "WHERE id > ? ORDER BY id", (desde,)
+            )
+            for id_evento, *fila in filas:
+                if fila[-2] != cabeza:
+                    problemas.append(f"Encadenamiento roto en el evento {id_evento}")
+                    break
+                cabeza = calcular_hash_evento(cabeza, fila[:len(COLUMNAS_BITACORA)])
+                if cabeza != fila[-1]:
+                    problemas.append(f"Evento {id_evento} alterado")
+                    break
+                total += 1
+                if ultimo is not None and id_evento <= ultimo['id_evento']:
+                    revisados += 1
+                else:
+                    sin_sellar += 1
+                sello = por_evento.pop(id_evento, None)
+                if sello is not None and (sello['hash_cabeza'] != cabeza or sello['eventos'] != total):
+                    problemas.append(f"El sello #{sello['numero']} no coincide con los eventos")
+                    break
+            else:
+                problemas.extend(f"El sello #{sello['numero']} apunta a un evento que ya no existe"
+                                 for sello in por_evento.values())
+
+        if not problemas and ultimo is not None:
+            verificacion = {
+                'sello': ultimo['numero'],
+                'firma_sello': ultimo['firma'],
+                'id_evento': ultimo['id_evento'],
+                'hash_evento': ultimo['hash_cabeza'],
+                'eventos': ultimo['eventos'],
+                'fecha_hora': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+            verificacion['firma'] = firmar_sello(verificacion)
+            self.confirmar_transaccion([{'tipo': 'verificacion_bitacora', 'verificacion': verificacion}])
+        return {
+            'valida': not problemas,
+            'problemas': problemas,
+            'sello': ultimo['numero'] if ultimo else None,
+            'fecha_sello': ultimo['fecha_hora'] if ultimo else None,
+            'revisados': revisados,
+            'sin_sellar': sin_sellar,
+            'completa': completa
+        }
+
+    def usuarios_bitacora(self):
+        """Usuarios con eventos en la bitácora (índice idx_eventos_usuario)"""
+        filas = self._conexion().execute("SELECT DISTINCT usuario FROM eventos ORDER BY usuario").fetchall()
+        return [usuario for usuario, in filas if usuario is not None]
+
+    def importar_desde_csv(self, backend_csv=None):
+        """Copia a la base de datos el registro, las cadenas y la bitácora del backend CSV.
+
+        Todo pasa por el escritor único: el registro en una transacción, cada cadena con
+        sus instantáneas en otra y la bitácora completa en la última.
+        """
+        backend_csv = backend_csv or BackendCSV()
+        df_registros = backend_csv.cargar_registros()
+        self.guardar_registros(df_registros)
+
+        for hash_doc in df_registros['HASH']:
+            if self.obtener_cabeza(hash_doc) is not None:
+                continue
+            bloques = backend_csv.cargar_blockchain(hash_doc).to_dict('records')
+            if not bloques:
+                continue
+            # Los árboles Merkle y el libro mayor ya incluyen estos bloques; solo faltan las instantáneas
+            operaciones = [{'tipo': 'bloque_importado', 'hash': hash_doc, 'bloque': bloque} for bloque in bloques]
+            operaciones += [
+                {'tipo': 'instantanea', 'instantanea': instantanea}
+                for instantanea in instantaneas_periodicas(hash_doc, bloques)
+            ]
+            self.confirmar_transaccion(operaciones)
+
+        # Del más antiguo al más reciente, en el orden en que se anexaron
+        eventos = backend_csv.cargar_bitacora().iloc[::-1].to_dict('records')
+        self.confirmar_transaccion(
+            [{'tipo': 'vaciar_bitacora'}] + [{'tipo': 'bitacora', 'evento': evento} for evento in eventos]
+        )
+
+
+_BACKENDS = {
+    'csv': BackendCSV,
+    'sqlite': BackendSQLite,
+}
+_backend_activo = {}
+
+def obtener_backend():
+    """Devuelve la instancia (única por proceso) del backend configurado"""
+    if BACKEND_ALMACENAMIENTO not in _backend_activo:
+        _backend_activo[BACKEND_ALMACENAMIENTO] = _BACKENDS[BACKEND_ALMACENAMIENTO]()
+    return _backend_activo[BACKEND_ALMACENAMIENTO]
@@ -0,0 +1,38 @@
+import os
+
+# ==========================================
+# ESCRITURA DURABLE DE ARCHIVOS
+# ==========================================
+# Utilidades compartidas por el almacenamiento, la bitácora y el libro mayor para
+# normalizar valores CSV y publicar archivos completos de forma atómica y durable.
+
+def valor_csv(valor):
+    """Normaliza un valor para escribirlo en CSV (NaN y None se guardan vacíos)"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor != valor:
+        return ''
+    return valor
+
+def sincronizar_directorio(ruta):
+    """Hace fsync del directorio que contiene la ruta (no disponible en Windows)"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(ruta)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def escribir_atomico(ruta, contenido):
+    """Escribe un archivo completo en un temporal sincronizado y lo publica con os.replace"""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+    sincronizar_directorio(ruta)
@@ -0,0 +1,849 @@
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from archivos import escribir_atomico, sincronizar_directorio, valor_csv
+from configuracion import DIRECTORIO_DATOS, ruta_datos
+
+# ==========================================
+# CONSTANTES DE LA BITÁCORA
+# ==========================================
+# La bitácora de auditoría se guarda en particiones de solo anexar por mes (o por día)
+# bajo DIRECTORIO_BITACORA: bitacora/eventos_2025-08.csv. Cada partición conserva el
+# orden en que se confirmaron sus eventos. El manifiesto guarda por partición su tamaño,
+# cantidad de eventos y primera/última fecha, así las consultas por rango y de los
+# últimos N eventos abren solo las particiones que necesitan.
+#
+# Junto a cada partición, indice_bitacora_AAAA-MM.csv guarda por evento su documento,
+# su usuario y su posición en bytes. En memoria queda un índice hash → posiciones y
+# usuario → posiciones por partición, así el historial de un documento o de un usuario
+# lee solo sus eventos. El archivo de índice se escribe sin fsync: si queda atrás (o
+# adelante, tras recortar la partición) se corrige desde la propia partición.
+#
+# Cada partición es además una cadena: cada evento lleva el hash del anterior y el suyo.
+# En cada punto de control se anexa a sellos_bitacora.jsonl un sello firmado (HMAC) con
+# el tamaño, los eventos y la cabeza de cada partición. El verificador parte del último
+# sello ya verificado y revisa solo los eventos posteriores.
+
+COLUMNAS_BITACORA = ['hash', 'fecha_hora', 'usuario', 'rol', 'accion', 'comentario_opcional']
+COLUMNAS_ENCADENAMIENTO = ['hash_anterior', 'hash_evento']
+COLUMNAS_PARTICION = COLUMNAS_BITACORA + COLUMNAS_ENCADENAMIENTO
+
+DIRECTORIO_BITACORA = ruta_datos("bitacora")
+CSV_BITACORA_HEREDADA = ruta_datos("bitacora.csv")
+PREFIJO_PARTICION = "eventos_"
+# Particiones sin encadenar de la versión anterior: se siguen consultando y se sellan
+# por su contenido completo, pero los eventos nuevos van a las particiones encadenadas
+PREFIJO_SIN_ENCADENAR = "bitacora_"
+PREFIJO_INDICE = "indice_"
+COLUMNAS_INDICE_BITACORA = ['hash', 'usuario', 'desplazamiento', 'largo']
+
+SELLOS_BITACORA = os.path.join(DIRECTORIO_BITACORA, "sellos_bitacora.jsonl")
+VERIFICACION_BITACORA = os.path.join(DIRECTORIO_BITACORA, "verificacion_bitacora.json")
+# La clave de firma se da por entorno (CLEIN_CLAVE_BITACORA) o en un archivo fuera del
+# directorio de datos: quien puede escribir los datos no debe poder volver a firmar sellos
+ARCHIVO_CLAVE_BITACORA = os.environ.get(
+    "CLEIN_ARCHIVO_CLAVE_BITACORA",
+    os.path.join(os.path.expanduser("~"), ".clein", "clave_bitacora.key")
+)
+# Ubicación anterior de la clave (dentro de los datos); ya no se usa ni se crea
+CLAVE_BITACORA_HEREDADA = ruta_datos("clave_bitacora.key")
+HASH_GENESIS = "0" * 64
+
+# Granularidad de las particiones: "mensual" o "diaria"
+PARTICION_BITACORA = os.environ.get("CLEIN_PARTICION_BITACORA", "mensual")
+# Caracteres de fecha_hora ('AAAA-MM-DD HH:MM:SS') que forman la clave de la partición
+ANCHO_CLAVE = {'mensual': 7, 'diaria': 10}
+
+def nombre_particion(fecha_hora):
+    """Archivo de la partición que corresponde a la fecha de un evento"""
+    clave = str(fecha_hora)[:ANCHO_CLAVE.get(PARTICION_BITACORA, 7)]
+    if len(clave) < 7 or not clave[:4].isdigit():
+        clave = "sin_fecha"
+    return f"{PREFIJO_PARTICION}{clave}.csv"
+
+def es_encadenada(archivo):
+    """Indica si la partición lleva el hash de cada evento"""
+    return archivo.startswith(PREFIJO_PARTICION)
+
+def _entrada_vacia(archivo):
+    """Entrada del manifiesto de una partición sin eventos"""
+    return {
+        'archivo': archivo, 'tamaño': 0, 'eventos': 0, 'desde': None, 'hasta': None,
+        'ultimo_hash': HASH_GENESIS if es_encadenada(archivo) else None
+    }
+
+def _anotar_fecha(entrada, fecha_hora):
+    """Amplía el rango de fechas de una entrada del manifiesto"""
+    if entrada['desde'] is None or fecha_hora < entrada['desde']:
+        entrada['desde'] = fecha_hora
+    if entrada['hasta'] is None or fecha_hora > entrada['hasta']:
+        entrada['hasta'] = fecha_hora
+
+def _filas_con_posicion(datos, base=0):
+    """Filas CSV completas de 'datos' con su desplazamiento (desde 'base') y largo en bytes.
+
+    Una fila termina en el primer salto de línea con un número par de comillas acumuladas
+    (los comentarios pueden llevar saltos de línea entre comillas); la cola incompleta se omite.
+    """
+    inicio = 0
+    comillas = 0
+    posicion = 0
+    while True:
+        fin = datos.find(b'\n', posicion)
+        if fin == -1:
+            return
+        comillas += datos.count(b'"', posicion, fin)
+        posicion = fin + 1
+        if comillas % 2 == 0:
+            fila = next(csv.reader(io.StringIO(datos[inicio:posicion].decode('utf-8'))), [])
+            yield base + inicio, posicion - inicio, fila
+            inicio = posicion
+            comillas = 0
+
+def calcular_hash_evento(hash_anterior, valores):
+    """Hash de un evento: el del anterior más sus valores (como texto) en orden de COLUMNAS_BITACORA"""
+    contenido = hash_anterior + json.dumps([str(valor) for valor in valores], ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+class ErrorClaveBitacora(Exception):
+    """La clave de firma de la bitácora no está fuera del directorio de datos"""
+
+
+def _dentro_de_datos(ruta):
+    """Indica si la ruta queda dentro del directorio de datos"""
+    datos = os.path.realpath(DIRECTORIO_DATOS)
+    try:
+        return os.path.commonpath([datos, os.path.realpath(ruta)]) == datos
+    except ValueError:
+        return False
+
+def _clave_firma():
+    """Clave HMAC de los sellos: CLEIN_CLAVE_BITACORA o la del archivo de clave (se crea una vez)"""
+    clave = os.environ.get("CLEIN_CLAVE_BITACORA")
+    if clave:
+        return clave.encode('utf-8')
+    if _dentro_de_datos(ARCHIVO_CLAVE_BITACORA):
+        raise ErrorClaveBitacora(
+            f"El archivo de clave de la bitácora ({ARCHIVO_CLAVE_BITACORA}) está dentro del directorio "
+            f"de datos: configura CLEIN_ARCHIVO_CLAVE_BITACORA fuera de él o da la clave en CLEIN_CLAVE_BITACORA"
+        )
+    if not os.path.exists(ARCHIVO_CLAVE_BITACORA) and os.path.exists(CLAVE_BITACORA_HEREDADA):
+        raise ErrorClaveBitacora(
+            f"La clave de la bitácora está en el directorio de datos ({CLAVE_BITACORA_HEREDADA}): "
+            f"muévela a {ARCHIVO_CLAVE_BITACORA} o da su valor en CLEIN_CLAVE_BITACORA"
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(ARCHIVO_CLAVE_BITACORA)), mode=0o700, exist_ok=True)
+    try:
+        fd = os.open(ARCHIVO_CLAVE_BITACORA, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(os.urandom(32).hex())
+            f.flush()
+            os.fsync(f.fileno())
+    with open(ARCHIVO_CLAVE_BITACORA, 'r', encoding='utf-8') as f:
+        return f.read().strip().encode('utf-8')
+
+def firmar_sello(sello):
+    """Firma HMAC-SHA256 de un sello (todos sus campos menos la firma)"""
+    contenido = json.dumps(
+        {campo: valor for campo, valor in sello.items() if campo != 'firma'}, sort_keys=True, ensure_ascii=False
+    )
+    return hmac.new(_clave_firma(), contenido.encode('utf-8'), hashlib.sha256).hexdigest()
+
+def leer_sellos(ruta=SELLOS_BITACORA):
+    """Sellos completos del archivo de sellos (una línea a medio escribir se ignora)"""
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    return [json.loads(linea) for linea in datos[:datos.rfind(b'\n') + 1].splitlines() if linea.strip()]
+
+def _hash_contenido(ruta, tamaño):
+    """SHA-256 de los primeros 'tamaño' bytes de un archivo (particiones sin encadenar)"""
+    suma = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        restante = tamaño
+        while restante > 0:
+            bloque = f.read(min(restante, 1024 * 1024))
+            if not bloque:
+                break
+            suma.update(bloque)
+            restante -= len(bloque)
+    return suma.hexdigest()
+
+def _indice_vacio():
+    """Índice en memoria de una partición: bytes cubiertos, posiciones por hash y por usuario"""
+    return {'cubierto': 0, 'hash': {}, 'usuario': {}, 'pendientes': []}
+
+def _anotar_posicion(indice, desplazamiento, largo, hash_doc, usuario):
+    """Agrega un evento al índice en memoria de su partición"""
+    posicion = (desplazamiento, largo)
+    indice['hash'].setdefault(hash_doc, []).append(posicion)
+    indice['usuario'].setdefault(usuario, []).append(posicion)
+    indice['cubierto'] = desplazamiento + largo
+
+# ==========================================
+# BITÁCORA PARTICIONADA
+# ==========================================
+
+class BitacoraParticionada:
+    """Particiones de solo anexar de la bitácora con su manifiesto"""
+
+    def __init__(self, directorio=DIRECTORIO_BITACORA):
+        self.directorio = directorio
+        self.ruta_manifiesto = os.path.join(directorio, "manifiesto.json")
+        self.candado = threading.RLock()
+        self.particiones = self._leer_manifiesto()
+        self._tocadas = set()
+        # Índices por partición, cargados desde su archivo la primera vez que se consultan
+        self._indices = {}
+        # Último sello anexado (el archivo de sellos se lee una sola vez)
+        self.ruta_sellos = os.path.join(directorio, os.path.basename(SELLOS_BITACORA))
+        self.ruta_verificacion = os.path.join(directorio, os.path.basename(VERIFICACION_BITACORA))
+        self._ultimo_sello = None
+        # Sin una clave fuera de los datos no se aceptan eventos: se falla al abrir la bitácora
+        _clave_firma()
+        self._refrescar()
+
+    def _ruta(self, archivo):
+        """Ruta de una partición"""
+        return os.path.join(self.directorio, archivo)
+
+    def _ruta_indice(self, archivo):
+        """Ruta del archivo de índice de una partición"""
+        return os.path.join(self.directorio, PREFIJO_INDICE + archivo)
+
+    def _leer_manifiesto(self):
+        """Lee el manifiesto guardado (las particiones que faltan se escanean después)"""
+        if not os.path.exists(self.ruta_manifiesto):
+            return {}
+        try:
+            with open(self.ruta_manifiesto, 'r', encoding='utf-8') as f:
+                particiones = {entrada['archivo']: entrada for entrada in json.load(f)['particiones']}
+        except (ValueError, KeyError):
+            return {}
+        for archivo, entrada in particiones.items():
+            entrada.setdefault('ultimo_hash', _entrada_vacia(archivo)['ultimo_hash'])
+        return particiones
+
+    def _guardar_manifiesto(self):
+        """Publica el manifiesto con un reemplazo atómico"""
+        os.makedirs(self.directorio, exist_ok=True)
+        contenido = {
+            'particion': PARTICION_BITACORA,
+            'particiones': sorted(self.particiones.values(), key=lambda entrada: entrada['archivo'])
+        }
+        escribir_atomico(self.ruta_manifiesto, json.dumps(contenido, ensure_ascii=False).encode('utf-8'))
+
+    def _escanear(self, entrada, tamaño):
+        """Cuenta los eventos agregados a una partición desde el tamaño que registra su entrada"""
+        with open(self._ruta(entrada['archivo']), 'rb') as f:
+            f.seek(entrada['tamaño'])
+            datos = f.read(tamaño - entrada['tamaño'])
+        filas = csv.reader(io.StringIO(datos.decode('utf-8')))
+        if entrada['tamaño'] == 0:
+            next(filas, None)
+        posicion = COLUMNAS_BITACORA.index('fecha_hora')
+        posicion_hash = COLUMNAS_PARTICION.index('hash_evento')
+        for fila in filas:
+            if not fila:
+                continue
+            entrada['eventos'] += 1
+            _anotar_fecha(entrada, fila[posicion] if len(fila) > posicion else '')
+            if es_encadenada(entrada['archivo']) and len(fila) > posicion_hash:
+                entrada['ultimo_hash'] = fila[posicion_hash]
+        entrada['tamaño'] = tamaño
+
+    def _refrescar(self):
+        """Pone las entradas al día con las particiones del disco (solo lee lo agregado)"""
+        if not os.path.isdir(self.directorio):
+            self.particiones = {}
+            return
+        en_disco = set()
+        for archivo in os.listdir(self.directorio):
+            if not (archivo.startswith((PREFIJO_PARTICION, PREFIJO_SIN_ENCADENAR)) and archivo.endswith('.csv')):
+                continue
+            en_disco.add(archivo)
+            tamaño = os.path.getsize(self._ruta(archivo))
+            entrada = self.particiones.get(archivo)
+            if entrada is not None and entrada['tamaño'] == tamaño:
+                continue
+            if entrada is None or entrada['tamaño'] > tamaño:
+                entrada = _entrada_vacia(archivo)
+            self._escanear(entrada, tamaño)
+            self.particiones[archivo] = entrada
+        for archivo in set(self.particiones) - en_disco:
+            del self.particiones[archivo]
+
+    def anexar(self, evento):
+        """Anexa un evento encadenado al final de su partición sin reescribirla"""
+        fila = [str(valor_csv(evento.get(col, ''))) for col in COLUMNAS_BITACORA]
+        fecha_hora = str(fila[COLUMNAS_BITACORA.index('fecha_hora')])
+        archivo = nombre_particion(fecha_hora)
+        with self.candado:
+            entrada = self.particiones.get(archivo)
+            if entrada is None:
+                self._refrescar()
+                entrada = self.particiones.get(archivo)
+            nueva = entrada is None
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer, lineterminator='\n')
+            if nueva:
+                os.makedirs(self.directorio, exist_ok=True)
+                entrada = _entrada_vacia(archivo)
+                escritor.writerow(COLUMNAS_PARTICION)
+                encabezado = len(buffer.getvalue().encode('utf-8'))
+                # Un índice que quedó de una partición eliminada no sirve para la nueva
+                if os.path.exists(self._ruta_indice(archivo)):
+                    os.remove(self._ruta_indice(archivo))
+                self._indices[archivo] = _indice_vacio()
+                self._indices[archivo]['cubierto'] = encabezado
+            hash_evento = calcular_hash_evento(entrada['ultimo_hash'], fila)
+            escritor.writerow(fila + [entrada['ultimo_hash'], hash_evento])
+            datos = buffer.getvalue().encode('utf-8')
+            with open(self._ruta(archivo), 'ab') as f:
+                f.write(datos)
+            entrada['ultimo_hash'] = hash_evento
+            largo = len(datos) - (encabezado if nueva else 0)
+            desplazamiento = entrada['tamaño'] + len(datos) - largo
+            entrada['tamaño'] += len(datos)
+            entrada['eventos'] += 1
+            _anotar_fecha(entrada, fecha_hora)
+            self._tocadas.add(archivo)
+            indice = self._indices.get(archivo)
+            if indice is not None and indice['cubierto'] == desplazamiento:
+                hash_doc, usuario = str(fila[0]), str(fila[COLUMNAS_BITACORA.index('usuario')])
+                _anotar_posicion(indice, desplazamiento, largo, hash_doc, usuario)
+                indice['pendientes'].append([hash_doc, usuario, desplazamiento, largo])
+            if nueva:
+                # Solo una partición nueva cambia la lista del manifiesto
+                self.particiones[archivo] = entrada
+                self._guardar_manifiesto()
+
+    def tamaños(self):
+        """Tamaño de cada partición (para el estado del registro de transacciones)"""
+        with self.candado:
+            return {archivo: entrada['tamaño'] for archivo, entrada in self.particiones.items()}
+
+    def truncar(self, tamaños):
+        """Devuelve las particiones a los tamaños dados y elimina las creadas después"""
+        with self.candado:
+            self._refrescar()
+            self._indices = {}
+            for archivo in list(self.particiones):
+                ruta = self._ruta(archivo)
+                if archivo not in tamaños:
+                    os.remove(ruta)
+                    if os.path.exists(self._ruta_indice(archivo)):
+                        os.remove(self._ruta_indice(archivo))
+                    continue
+                if os.path.getsize(ruta) > tamaños[archivo]:
+                    with open(ruta, 'rb+') as f:
+                        f.truncate(tamaños[archivo])
+                        f.flush()
+                        os.fsync(f.fileno())
+                # Las posiciones indexadas más allá del corte se descartan
+                self._leer_indice(archivo, tamaños[archivo])
+            self._refrescar()
+            self._guardar_manifiesto()
+
+    def sincronizar(self):
+        """Hace fsync de las particiones anexadas desde la última vez y guarda el manifiesto"""
+        with self.candado:
+            tocadas = self._tocadas
+            self._tocadas = set()
+            for archivo, indice in self._indices.items():
+                self._guardar_pendientes(archivo, indice)
+        for archivo in tocadas:
+            with open(self._ruta(archivo), 'rb') as f:
+                os.fsync(f.fileno())
+        with self.candado:
+            if tocadas:
+                self._guardar_manifiesto()
+            self.sellar()
+
+    # ==========================================
+    # ÍNDICE POR DOCUMENTO Y POR USUARIO
+    # ==========================================
+
+    def _leer_indice(self, archivo, tamaño):
+        """Posiciones guardadas en el archivo de índice que siguen dentro de los 'tamaño' bytes.
+
+        Descarta una cola a medio escribir y las posiciones posteriores a un recorte de la
+        partición, reescribiendo el archivo si hizo falta.
+        """
+        ruta = self._ruta_indice(archivo)
+        if not os.path.exists(ruta):
+            return []
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        fin = datos.rfind(b'\n') + 1
+        validas = []
+        cambio = fin < len(datos)
+        cubierto = None
+        for fila in csv.reader(io.StringIO(datos[:fin].decode('utf-8'))):
+            if fila == COLUMNAS_INDICE_BITACORA:
+                continue
+            try:
+                hash_doc, usuario, desplazamiento, largo = fila[0], fila[1], int(fila[2]), int(fila[3])
+            except (IndexError, ValueError):
+                cambio = True
+                break
+            # Las posiciones son contiguas y no pasan del tamaño de la partición
+            if (cubierto is not None and desplazamiento != cubierto) or desplazamiento + largo > tamaño:
+                cambio = True
+                break
+            validas.append([hash_doc, usuario, desplazamiento, largo])
+            cubierto = desplazamiento + largo
+        if cambio:
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer, lineterminator='\n')
+            escritor.writerow(COLUMNAS_INDICE_BITACORA)
+            escritor.writerows(validas)
+            escribir_atomico(ruta, buffer.getvalue().encode('utf-8'))
+        return validas
+
+    def _extender_indice(self, archivo, indice, tamaño):
+        """Indexa los eventos de la partición entre lo ya cubierto y 'tamaño'"""
+        inicio = indice['cubierto']
+        with open(self._ruta(archivo), 'rb') as f:
+            f.seek(inicio)
+            datos = f.read(tamaño - inicio)
+        filas = _filas_con_posicion(datos, inicio)
+        if inicio == 0:
+            # Encabezado de la partición
+            for desplazamiento, largo, _ in filas:
+                indice['cubierto'] = desplazamiento + largo
+                break
+        posicion_usuario = COLUMNAS_BITACORA.index('usuario')
+        for desplazamiento, largo, fila in filas:
+            if not fila:
+                indice['cubierto'] = desplazamiento + largo
+                continue
+            hash_doc = fila[0]
+            usuario = fila[posicion_usuario] if len(fila) > posicion_usuario else ''
+            _anotar_posicion(indice, desplazamiento, largo, hash_doc, usuario)
+            indice['pendientes'].append([hash_doc, usuario, desplazamiento, largo])
+
+    def _guardar_pendientes(self, archivo, indice):
+        """Anexa (sin fsync) al archivo de índice las posiciones que aún no tiene"""
+        if not indice['pendientes']:
+            return
+        ruta = self._ruta_indice(archivo)
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator='\n')
+        if not os.path.exists(ruta):
+            escritor.writerow(COLUMNAS_INDICE_BITACORA)
+        escritor.writerows(indice['pendientes'])
+        with open(ruta, 'ab') as f:
+            f.write(buffer.getvalue().encode('utf-8'))
+        indice['pendientes'] = []
+
+    def _indices_al_dia(self):
+        """Carga o extiende el índice de cada partición hasta su tamaño actual"""
+        self._refrescar()
+        for archivo in set(self._indices) - set(self.particiones):
+            del self._indices[archivo]
+        for archivo, entrada in self.particiones.items():
+            indice = self._indices.get(archivo)
+            if indice is not None and indice['cubierto'] == entrada['tamaño']:
+                continue
+            if indice is None or indice['cubierto'] > entrada['tamaño']:
+                indice = _indice_vacio()
+                for hash_doc, usuario, desplazamiento, largo in self._leer_indice(archivo, entrada['tamaño']):
+                    _anotar_posicion(indice, desplazamiento, largo, hash_doc, usuario)
+                self._indices[archivo] = indice
+            self._extender_indice(archivo, indice, entrada['tamaño'])
+            self._guardar_pendientes(archivo, indice)
+
+    def _posiciones(self, archivos, hashes=None, usuario=None):
+        """Posiciones (ordenadas) de los eventos de esos documentos y/o ese usuario por partición"""
+        resultado = {}
+        for archivo in archivos:
+            indice = self._indices.get(archivo)
+            if indice is None:
+                continue
+            seleccion = None
+            if hashes is not None:
+                seleccion = {posicion for hash_doc in hashes for posicion in indice['hash'].get(hash_doc, ())}
+            if usuario is not None:
+                del_usuario = indice['usuario'].get(usuario, ())
+                seleccion = set(del_usuario) if seleccion is None else seleccion.intersection(del_usuario)
+            if seleccion:
+                resultado[archivo] = sorted(seleccion)
+        return resultado
+
+    def _leer_eventos(self, archivo, posiciones):
+        """Lee de una partición solo los eventos en esas posiciones"""
+        with open(self._ruta(archivo), 'rb') as f:
+            partes = []
+            for desplazamiento, largo in posiciones:
+                f.seek(desplazamiento)
+                partes.append(f.read(largo))
+        filas = csv.reader(io.StringIO(b''.join(partes).decode('utf-8')))
+        return pd.DataFrame([fila[:len(COLUMNAS_BITACORA)] for fila in filas], columns=COLUMNAS_BITACORA)
+
+    def usuarios(self):
+        """Usuarios con eventos en la bitácora, según el índice"""
+        with self.candado:
+            self._indices_al_dia()
+            return sorted({
+                usuario for indice in self._indices.values() for usuario, posiciones in indice['usuario'].items()
+                if posiciones
+            })
+
+    def importar_heredada(self, ruta=CSV_BITACORA_HEREDADA, tamaño=None):
+        """Reparte en particiones la bitácora de un solo archivo y la elimina.
+
+        Si se da 'tamaño' solo se importa ese prefijo (el resto se rehace desde el
+        registro de transacciones).
+        """
+        with open(ruta, 'rb') as f:
+            datos = f.read() if tamaño is None else f.read(tamaño)
+        if datos.strip():
+            df_bitacora = pd.read_csv(io.BytesIO(datos), dtype=str, keep_default_na=False)
+        else:
+            df_bitacora = pd.DataFrame(columns=COLUMNAS_BITACORA)
+        df_bitacora = df_bitacora.reindex(columns=COLUMNAS_BITACORA, fill_value='')
+        df_bitacora = df_bitacora.sort_values('fecha_hora', kind='stable')
+
+        with self.candado:
+            os.makedirs(self.directorio, exist_ok=True)
+            # Se reescriben completas: repetir la migración tras un corte da el mismo resultado
+            archivos = df_bitacora['fecha_hora'].map(nombre_particion)
+            for archivo, grupo in df_bitacora.groupby(archivos, sort=True):
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer, lineterminator='\n')
+                escritor.writerow(COLUMNAS_PARTICION)
+                cabeza = HASH_GENESIS
+                for fila in grupo.values.tolist():
+                    hash_evento = calcular_hash_evento(cabeza, fila)
+                    escritor.writerow(fila + [cabeza, hash_evento])
+                    cabeza = hash_evento
+                escribir_atomico(self._ruta(archivo), buffer.getvalue().encode('utf-8'))
+                self.particiones.pop(archivo, None)
+                self._indices.pop(archivo, None)
+                if os.path.exists(self._ruta_indice(archivo)):
+                    os.remove(self._ruta_indice(archivo))
+            self._refrescar()
+            self._guardar_manifiesto()
+            self.sellar()
+        os.remove(ruta)
+        sincronizar_directorio(ruta)
+
+    def _leer_particion(self, entrada):
+        """Lee los eventos de una partición hasta el tamaño de su entrada"""
+        with open(self._ruta(entrada['archivo']), 'rb') as f:
+            datos = f.read(entrada['tamaño'])
+        df_particion = pd.read_csv(io.BytesIO(datos), dtype=str, keep_default_na=False)
+        return df_particion.reindex(columns=COLUMNAS_BITACORA, fill_value='')
+
+    def cargar(self, desde=None, hasta=None, ultimos=None, filtro_hash=None, hashes=None, filtro_usuario=None):
+        """Eventos del más reciente al más antiguo leyendo solo las particiones necesarias.
+
+        'desde' y 'hasta' acotan fecha_hora (inclusive, como texto 'AAAA-MM-DD HH:MM:SS'),
+        'ultimos' se queda con los N más recientes, 'filtro_hash'/'hashes' con los eventos
+        de ciertos documentos y 'filtro_usuario' con los de un usuario. Con filtro de
+        documento o usuario se leen solo las posiciones que da el índice.
+        """
+        if filtro_hash:
+            hashes = [filtro_hash]
+        if hashes is not None:
+            hashes = set(hashes)
+        usuario = filtro_usuario or None
+        posiciones = None
+        with self.candado:
+            self._refrescar()
+            candidatas = sorted(
+                (dict(entrada) for entrada in self.particiones.values()
+                 if entrada['eventos']
+                 and (desde is None or entrada['hasta'] >= desde)
+                 and (hasta is None or entrada['desde'] <= hasta)),
+                key=lambda entrada: (entrada['hasta'], entrada['desde']), reverse=True
+            )
+            if hashes is not None or usuario is not None:
+                self._indices_al_dia()
+                posiciones = self._posiciones([entrada['archivo'] for entrada in candidatas], hashes, usuario)
+                # Leer evento por evento solo conviene si el índice descarta la mayoría;
+                # con muchos documentos (un área completa) se leen las particiones enteras
+                if usuario is None and sum(map(len, posiciones.values())) * 10 > sum(
+                        entrada['eventos'] for entrada in candidatas):
+                    posiciones = None
+
+        partes = []
+        reunidos = 0
+        minimo = None
+        for entrada in candidatas:
+            # Las particiones van de la más reciente a la más antigua: con N eventos
+            # reunidos, una partición que termina antes que todos ellos ya no aporta
+            if ultimos is not None and reunidos >= ultimos and entrada['hasta'] < minimo:
+                break
+            if posiciones is not None:
+                if entrada['archivo'] not in posiciones:
+                    continue
+                df_particion = self._leer_eventos(entrada['archivo'], posiciones[entrada['archivo']])
+            else:
+                df_particion = self._leer_particion(entrada)
+            if desde is not None and entrada['desde'] < desde:
+                df_particion = df_particion[df_particion['fecha_hora'] >= desde]
+            if hasta is not None and entrada['hasta'] > hasta:
+                df_particion = df_particion[df_particion['fecha_hora'] <= hasta]
+            if hashes is not None:
+                df_particion = df_particion[df_particion['hash'].isin(hashes)]
+            if usuario is not None:
+                df_particion = df_particion[df_particion['usuario'] == usuario]
+            if df_particion.empty:
+                continue
+            partes.append(df_particion.iloc[::-1])
+            reunidos += len(df_particion)
+            menor = df_particion['fecha_hora'].min()
+            minimo = menor if minimo is None else min(minimo, menor)
+
+        if not partes:
+            return pd.DataFrame(columns=COLUMNAS_BITACORA)
+        df_bitacora = pd.concat(partes, ignore_index=True)
+        # Orden estable: a igual fecha, primero el último evento anexado
+        df_bitacora = df_bitacora.sort_values('fecha_hora', ascending=False, kind='stable')
+        if ultimos is not None:
+            df_bitacora = df_bitacora.head(ultimos)
+        return df_bitacora.reset_index(drop=True)
+
+    def resumen(self):
+        """Total de eventos, primera y última fecha y cantidad de particiones (sin leerlas)"""
+        with self.candado:
+            self._refrescar()
+            entradas = [entrada for entrada in self.particiones.values() if entrada['eventos']]
+        return {
+            'eventos': sum(entrada['eventos'] for entrada in entradas),
+            'desde': min((entrada['desde'] for entrada in entradas), default=None),
+            'hasta': max((entrada['hasta'] for entrada in entradas), default=None),
+            'particiones': len(entradas)
+        }
+
+    # ==========================================
+    # SELLOS FIRMADOS Y VERIFICACIÓN INCREMENTAL
+    # ==========================================
+
+    def _cargar_ultimo_sello(self):
+        """Último sello anexado (descarta una línea a medio escribir al final del archivo)"""
+        if self._ultimo_sello is None and os.path.exists(self.ruta_sellos):
+            with open(self.ruta_sellos, 'rb+') as f:
+                datos = f.read()
+                fin = datos.rfind(b'\n') + 1
+                if fin < len(datos):
+                    f.truncate(fin)
+            lineas = [linea for linea in datos[:fin].splitlines() if linea.strip()]
+            if lineas:
+                self._ultimo_sello = json.loads(lineas[-1])
+        return self._ultimo_sello
+
+    def sellar(self):
+        """Anexa un sello firmado con tamaño, eventos y cabeza de cada partición si cambiaron"""
+        with self.candado:
+            anterior = self._cargar_ultimo_sello()
+            sellados = anterior['particiones'] if anterior else {}
+            particiones = {}
+            for archivo, entrada in sorted(self.particiones.items()):
+                if not entrada['eventos']:
+                    continue
+                if es_encadenada(archivo):
+                    cabeza = entrada['ultimo_hash']
+                elif archivo in sellados and sellados[archivo]['tamaño'] == entrada['tamaño']:
+                    cabeza = sellados[archivo]['hash']
+                else:
+                    # Las particiones sin encadenar se sellan por el hash de su contenido
+                    cabeza = _hash_contenido(self._ruta(archivo), entrada['tamaño'])
+                particiones[archivo] = {'tamaño': entrada['tamaño'], 'eventos': entrada['eventos'], 'hash': cabeza}
+            if not particiones or particiones == sellados:
+                return anterior
+
+            sello = {
+                'numero': anterior['numero'] + 1 if anterior else 1,
+                'fecha_hora': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'particiones': particiones,
+                'anterior': anterior['firma'] if anterior else HASH_GENESIS
+            }
+            sello['firma'] = firmar_sello(sello)
+            os.makedirs(self.directorio, exist_ok=True)
+            with open(self.ruta_sellos, 'ab') as f:
+                f.write((json.dumps(sello, ensure_ascii=False) + "\n").encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            self._ultimo_sello = sello
+            return sello
+
+    def _leer_verificacion(self):
+        """Último sello verificado y, por partición, el evento donde terminó la verificación.
+
+        El registro va firmado como los sellos; si la firma no coincide se descarta y la
+        verificación vuelve a empezar desde el primer evento.
+        """
+        if not os.path.exists(self.ruta_verificacion):
+            return {}
+        try:
+            with open(self.ruta_verificacion, 'r', encoding='utf-8') as f:
+                verificacion = json.load(f)
+        except ValueError:
+            return {}
+        if not hmac.compare_digest(str(verificacion.get('firma', '')), firmar_sello(verificacion)):
+            return {}
+        return verificacion
+
+    def _verificar_particion(self, archivo, tamaño, sellado, punto):
+        """Revisa el encadenamiento de una partición desde el último evento verificado.
+
+        Devuelve (problemas, nuevo punto verificado, eventos revisados, eventos sin sellar).
+        """
+        inicio = punto['fila'] if punto else 0
+        with open(self._ruta(archivo), 'rb') as f:
+            f.seek(inicio)
+            datos = f.read(tamaño - inicio)
+        filas = _filas_con_posicion(datos, inicio)
+
+        primera = next(filas, None)
+        if punto:
+            # El último evento verificado debe seguir igual y en el mismo lugar
+            if (primera is None or primera[0] + primera[1] != punto['tamaño']
+                    or len(primera[2]) != len(COLUMNAS_PARTICION) or primera[2][-1] != punto['hash']):
+                return ["cambió un evento ya verificado"], None, 0, 0
+            cabeza = punto['hash']
+            nuevo = punto
+        else:
+            if primera is None or primera[2] != COLUMNAS_PARTICION:
+                return ["encabezado inválido"], None, 0, 0
+            cabeza = HASH_GENESIS
+            nuevo = None
+        fin = primera[0] + primera[1]
+
+        problemas = []
+        revisados = 0
+        sin_sellar = 0
+        for desplazamiento, largo, fila in filas:
+            if len(fila) != len(COLUMNAS_PARTICION):
+                problemas.append(f"evento mal formado en el byte {desplazamiento}")
+                break
+            if fila[-2] != cabeza:
+                problemas.append(f"encadenamiento roto en el byte {desplazamiento}")
+                break
+            cabeza = calcular_hash_evento(cabeza, fila[:len(COLUMNAS_BITACORA)])
+            if cabeza != fila[-1]:
+                problemas.append(f"evento alterado en el byte {desplazamiento}")
+                break
+            fin = desplazamiento + largo
+            if sellado is not None and fin <= sellado['tamaño']:
+                revisados += 1
+            else:
+                sin_sellar += 1
+            if sellado is not None and fin == sellado['tamaño']:
+                if cabeza != sellado['hash']:
+                    problemas.append("la cabeza no coincide con la del sello")
+                    break
+                nuevo = {'tamaño': fin, 'hash': cabeza, 'fila': desplazamiento}
+
+        if not problemas:
+            if fin != tamaño:
+                problemas.append(f"datos que no son eventos desde el byte {fin}")
+            elif sellado is not None and (nuevo is None or nuevo['tamaño'] != sellado['tamaño']):
+                problemas.append("el sello no coincide con el final de un evento")
+        return problemas, (None if problemas else nuevo), revisados, sin_sellar
+
+    def _verificar_sin_encadenar(self, archivo, tamaño, sellado, punto):
+        """Compara una partición sin encadenar con el hash de su contenido en el sello"""
+        if sellado is None:
+            return [], None, 0, 0
+        if tamaño != sellado['tamaño']:
+            return ["una partición sin encadenar cambió de tamaño"], None, 0, 0
+        sello_particion = {'tamaño': sellado['tamaño'], 'hash': sellado['hash']}
+        if punto == sello_particion:
+            return [], punto, 0, 0
+        if _hash_contenido(self._ruta(archivo), tamaño) != sellado['hash']:
+            return ["el contenido no coincide con el sello"], None, 0, 0
+        return [], sello_particion, sellado['eventos'], 0
+
+    def verificar(self, completa=False):
+        """Verifica las firmas de los sellos y el encadenamiento de los eventos.
+
+        Sin 'completa' parte del último sello ya verificado: comprueba que sus eventos
+        finales sigan en su lugar y revisa solo los posteriores. Si todo está bien, el
+        último sello queda como verificado.
+        """
+        sellos = leer_sellos(self.ruta_sellos)
+        with self.candado:
+            self._refrescar()
+            tamaños = {archivo: entrada['tamaño'] for archivo, entrada in self.particiones.items()}
+        previo = {} if completa else self._leer_verificacion()
+        problemas = []
+
+        # Los sellos nuevos deben estar firmados y enlazados con el anterior
+        verificados = previo.get('sello', 0)
+        if verificados and (verificados > len(sellos) or sellos[verificados - 1].get('firma') != previo.get('firma_sello')):
+            problemas.append("El archivo de sellos ya no contiene el último sello verificado")
+            verificados, previo = 0, {}
+        firma_anterior = sellos[verificados - 1]['firma'] if verificados else HASH_GENESIS
+        for posicion, sello in enumerate(sellos[verificados:], start=verificados + 1):
+            if sello.get('numero') != posicion or sello.get('anterior') != firma_anterior:
+                problemas.append(f"El sello #{posicion} no enlaza con el anterior")
+            elif not hmac.compare_digest(str(sello.get('firma', '')), firmar_sello(sello)):
+                problemas.append(f"Firma inválida en el sello #{posicion}")
+            firma_anterior = sello.get('firma')
+        ultimo = sellos[-1] if sellos else None
+        sellados = ultimo['particiones'] if ultimo else {}
+
+        puntos = {archivo: punto for archivo, punto in previo.get('particiones', {}).items() if archivo in tamaños}
+        revisados = 0
+        sin_sellar = 0
+        for archivo in sorted(set(sellados) | set(tamaños)):
+            sellado = sellados.get(archivo)
+            if archivo not in tamaños:
+                problemas.append(f"{archivo}: la partición sellada ya no existe")
+                continue
+            if sellado is not None and tamaños[archivo] < sellado['tamaño']:
+                problemas.append(f"{archivo}: la partición es más corta que en el sello")
+                continue
+            verificar_particion = self._verificar_particion if es_encadenada(archivo) else self._verificar_sin_encadenar
+            problemas_particion, punto, revisados_particion, sin_sellar_particion = verificar_particion(
+                archivo, tamaños[archivo], sellado, puntos.get(archivo)
+            )
+            problemas.extend(f"{archivo}: {problema}" for problema in problemas_particion)
+            revisados += revisados_particion
+            sin_sellar += sin_sellar_particion
+            if punto is not None:
+                puntos[archivo] = punto
+
+        if not problemas and ultimo is not None:
+            verificacion = {
+                'sello': len(sellos),
+                'firma_sello': ultimo['firma'],
+                'fecha_hora': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'particiones': puntos
+            }
+            verificacion['firma'] = firmar_sello(verificacion)
+            escribir_atomico(self.ruta_verificacion, json.dumps(verificacion, ensure_ascii=False).encode('utf-8'))
+        return {
+            'valida': not problemas,
+            'problemas': problemas,
+            'sello': ultimo['numero'] if ultimo else None,
+            'fecha_sello': ultimo['fecha_hora'] if ultimo else None,
+            'revisados': revisados,
+            'sin_sellar': sin_sellar,
+            'completa': completa
+        }
+
+
+_bitacora_activa = {}
+
+def obtener_bitacora():
+    """Devuelve la instancia (única por proceso) de la bitácora particionada"""
+    if 'bitacora' not in _bitacora_activa:
+        _bitacora_activa['bitacora'] = BitacoraParticionada()
+    return _bitacora_activa['bitacora']
@@ -3,11 +3,18 @@ import pandas as pd
 import hashlib
 import os
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 import io
 import yaml
 from pathlib import Path
 import glob
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from almacenamiento import (ruta_blockchain, obtener_backend, transaccion, ConflictoConcurrencia,
+                            iniciar_migracion_en_segundo_plano, importar_historial_libro, COLUMNAS_REGISTRO,
+                            COLUMNAS_BITACORA)
+from validacion import calcular_hash_bloque, validar_cadena, validar_cadena_en_cache, estado_sistema, verificar_sistema_paralelo, sellar_sistema
 # pip install streamlit-authenticator==0.2.2
 import streamlit_authenticator as stauth
 
@@ -23,6 +30,20 @@ except ImportError:
 # CONSTANTES DEL SISTEMA
 # ==========================================
 CSV_FILE = "registro_documentos.csv"
+BLOQUES_POR_PAGINA = 20
+DOCUMENTOS_POR_PAGINA = [10, 25, 50, 100]
+CAMPOS_ORDEN_REGISTROS = {
+    "Fecha de creación": 'FECHA_CREACION',
+    "Fecha de actualización": 'FECHA_ACTUALIZACION',
+    "Nombre": 'NOMBRE',
+    "Tipo": 'TIPO',
+    "Estatus": 'ESTATUS',
+    "Área": 'AREA',
+}
+MENSAJE_CONFLICTO = "Otro usuario modificó este documento al mismo tiempo; vuelve a intentarlo"
+ETIQUETAS_BACKEND = {'csv': "CSV", 'sqlite': "SQLite"}
+EXTENSIONES_DOCUMENTO = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.txt', '.jpg', '.png', '.ppt', '.pptx']
+HILOS_IMPORTACION = int(os.environ.get("CLEIN_HILOS_IMPORTACION", min(32, (os.cpu_count() or 1) + 4)))
 # ==========================================
 # CONFIGURACIÓN DE LA PÁGINA
 # ==========================================
@@ -61,25 +82,19 @@ def crear_bloque_genesis(hash_doc, datos_documento):
     }
     return bloque
 
-def calcular_hash_bloque(bloque):
-    """Calcula el hash SHA-256 de un bloque"""
-    bloque_string = f"{bloque['numero_bloque']}{bloque['hash_documento']}{bloque['timestamp']}{bloque['accion']}{bloque['hash_bloque_anterior']}"
-    return hashlib.sha256(bloque_string.encode()).hexdigest()
-
-def agregar_bloque_a_cadena(hash_doc, accion, datos_modificacion=None):
-    """Agrega un nuevo bloque a la cadena de un documento"""
-    blockchain_path = f"blockchain_{hash_doc[:16]}.csv"
+def agregar_bloque_a_cadena(hash_doc, accion, datos_modificacion=None, destino=None):
+    """Agrega un nuevo bloque a la cadena de un documento (en el backend o en una transacción abierta)"""
+    destino = destino or obtener_backend()
     
-    # Cargar cadena existente o crear nueva
-    if os.path.exists(blockchain_path):
-        try:
-            df_blockchain = pd.read_csv(blockchain_path)
-            ultimo_numero = df_blockchain['numero_bloque'].max()
-            ultimo_hash = df_blockchain[df_blockchain['numero_bloque'] == ultimo_numero]['hash_bloque'].iloc[0]
-        except:
-            return crear_nueva_cadena(hash_doc, datos_modificacion)
-    else:
-        return crear_nueva_cadena(hash_doc, datos_modificacion)
+    # Obtener la cabeza de la cadena desde el índice o crear una nueva; un error de lectura
+    # se propaga para no empezar una segunda cadena con otro génesis
+    cabeza = destino.obtener_cabeza(hash_doc)
+    
+    if cabeza is None:
+        return crear_nueva_cadena(hash_doc, datos_modificacion, destino)
+    
+    ultimo_numero = cabeza['numero_bloque']
+    ultimo_hash = cabeza['hash_bloque']
     
     # Crear nuevo bloque
     nuevo_numero = ultimo_numero + 1
@@ -110,62 +125,34 @@ def agregar_bloque_a_cadena(hash_doc, accion, datos_modificacion=None):
     # Calcular hash del nuevo bloque
     nuevo_bloque['hash_bloque'] = calcular_hash_bloque(nuevo_bloque)
     
-    # Agregar a la cadena
-    df_nuevo_bloque = pd.DataFrame([nuevo_bloque])
-    df_blockchain_actualizada = pd.concat([df_blockchain, df_nuevo_bloque], ignore_index=True)
-    
-    # Guardar cadena actualizada
-    df_blockchain_actualizada.to_csv(blockchain_path, index=False)
+    # Anexar solo el nuevo bloque (los anteriores no se reescriben) y mover la cabeza
+    destino.anexar_bloque(hash_doc, nuevo_bloque)
     return True
 
-def crear_nueva_cadena(hash_doc, datos_documento):
+def crear_nueva_cadena(hash_doc, datos_documento, destino=None):
     """Crea una nueva cadena blockchain para un documento"""
-    blockchain_path = f"blockchain_{hash_doc[:16]}.csv"
+    destino = destino or obtener_backend()
+    
+    # No sobrescribir una cadena que ya tiene bloques
+    if destino.obtener_cabeza(hash_doc) is not None:
+        return False
     
     # Crear bloque génesis
     bloque_genesis = crear_bloque_genesis(hash_doc, datos_documento)
     bloque_genesis['hash_bloque'] = calcular_hash_bloque(bloque_genesis)
     bloque_genesis['usuario_accion'] = datos_documento['CREADOR']
     
-    # Guardar como CSV
-    df_blockchain = pd.DataFrame([bloque_genesis])
-    df_blockchain.to_csv(blockchain_path, index=False)
+    # Escribir el bloque génesis con el mismo escritor de solo anexar
+    destino.anexar_bloque(hash_doc, bloque_genesis)
     return True
 
 def cargar_blockchain_documento(hash_doc):
     """Carga la cadena blockchain completa de un documento"""
-    blockchain_path = f"blockchain_{hash_doc[:16]}.csv"
-    
-    if not os.path.exists(blockchain_path):
-        return pd.DataFrame()
-    
-    try:
-        df_blockchain = pd.read_csv(blockchain_path)
-        return df_blockchain.sort_values('numero_bloque')
-    except:
-        return pd.DataFrame()
+    return obtener_backend().cargar_blockchain(hash_doc)
 
-def validar_integridad_cadena(hash_doc):
-    """Valida la integridad de una cadena blockchain"""
-    df_blockchain = cargar_blockchain_documento(hash_doc)
-    
-    if df_blockchain.empty:
-        return False, "Cadena no encontrada"
-    
-    for idx, bloque in df_blockchain.iterrows():
-        # Validar hash del bloque
-        hash_calculado = calcular_hash_bloque(bloque.to_dict())
-        if hash_calculado != bloque['hash_bloque']:
-            return False, f"Hash inválido en bloque {bloque['numero_bloque']}"
-        
-        # Validar enlace con bloque anterior (excepto génesis)
-        if bloque['numero_bloque'] > 0:
-            bloque_anterior = df_blockchain[df_blockchain['numero_bloque'] == bloque['numero_bloque'] - 1]
-            if not bloque_anterior.empty:
-                if bloque['hash_bloque_anterior'] != bloque_anterior.iloc[0]['hash_bloque']:
-                    return False, f"Enlace roto en bloque {bloque['numero_bloque']}"
-    
-    return True, "Cadena íntegra"
+def validar_integridad_cadena(hash_doc, completa=False):
+    """Valida la integridad de una cadena blockchain (incremental desde su punto de control)"""
+    return validar_cadena(hash_doc, completa=completa)
 
 # ==========================================
 # FUNCIONES UTILITARIAS
@@ -178,40 +165,24 @@ def calcular_hash(archivo_bytes):
     return sha256_hash.hexdigest()
 
 def cargar_registros():
-    """Carga los registros desde el CSV y asegura que las columnas requeridas existan"""
-    columnas = [
-        'HASH', 'NOMBRE', 'TIPO', 'FECHA_CREACION', 'FECHA_ACTUALIZACION', 
-        'VERSION', 'ESTATUS', 'MODIFICACION', 'CREADOR', 'AREA', 'REVISOR', 
-        'APROBADOR', 'NO_CONFORMIDAD', 'AUDITORIA'
-    ]
-    
-    csv_path = "registro_documentos.csv"
-    if os.path.exists(csv_path):
-        try:
-            df = pd.read_csv(csv_path)
-            for col in columnas:
-                if col not in df.columns:
-                    df[col] = ""
-            return df[columnas]  # Devolver con columnas ordenadas
-        except:
-            return pd.DataFrame(columns=columnas)
-    else:
-        return pd.DataFrame(columns=columnas)
+    """Carga los registros desde el backend y asegura que las columnas requeridas existan"""
+    return obtener_backend().cargar_registros()
+
+def cargar_documento(hash_doc):
+    """Devuelve el registro de un documento como diccionario (o None si no existe)"""
+    return obtener_backend().buscar_documento(hash_doc)
+
+def filtrar_registros(criterios):
+    """Carga los documentos que cumplen los criterios {columna: valor o lista de valores}"""
+    return obtener_backend().filtrar_registros(criterios)
 
 def crear_dataframe_vacio():
     """Crea un DataFrame vacío con las columnas necesarias"""
-    columnas = [
-        'HASH', 'NOMBRE', 'TIPO', 'FECHA_CREACION', 'FECHA_ACTUALIZACION', 
-        'VERSION', 'ESTATUS', 'MODIFICACION', 'CREADOR', 'AREA', 'REVISOR', 
-        'APROBADOR', 'NO_CONFORMIDAD', 'AUDITORIA'
-    ]
-    return pd.DataFrame(columns=columnas)
+    return pd.DataFrame(columns=COLUMNAS_REGISTRO)
 
-def hash_ya_existe(hash_valor, df):
-    """Verifica si el hash ya existe en el registro"""
-    if df.empty:
-        return False
-    return hash_valor in df['HASH'].values
+def hash_ya_existe(hash_valor):
+    """Verifica si el hash ya existe en el registro (búsqueda binaria en el índice de digestos)"""
+    return obtener_backend().existe_documento(hash_valor)
 
 def detectar_tipo_archivo(nombre_archivo):
     """Detecta el tipo de documento basado en el nombre"""
@@ -277,33 +248,117 @@ def limpiar_nombre_archivo(nombre_archivo):
     # Capitalizar palabras
     return ' '.join(word.capitalize() for word in nombre.split())
 
-def guardar_registro(nuevo_registro):
-    """Guarda un nuevo registro en el CSV y crea su blockchain"""
-    csv_path = "registro_documentos.csv"
-    df_existente = cargar_registros()
-    
-    # Convertir el nuevo registro a DataFrame
-    df_nuevo = pd.DataFrame([nuevo_registro])
-    
-    # Concatenar con los registros existentes
-    df_final = pd.concat([df_existente, df_nuevo], ignore_index=True)
+def guardar_registro(nuevo_registro, destino=None):
+    """Guarda un nuevo registro y crea su blockchain en una sola transacción"""
+    if destino is None:
+        with transaccion() as actual:
+            guardar_registro(nuevo_registro, actual)
+        return
     
-    # Guardar en CSV
-    df_final.to_csv(csv_path, index=False)
+    destino.guardar_registro(nuevo_registro)
     
     # Crear blockchain para el documento
-    crear_nueva_cadena(nuevo_registro['HASH'], nuevo_registro)
+    crear_nueva_cadena(nuevo_registro['HASH'], nuevo_registro, destino)
+
+# ==========================================
+# IMPORTACIÓN MASIVA DE CARPETAS
+# ==========================================
+
+def calcular_hash_archivo(ruta):
+    """Calcula el hash SHA-256 de un archivo leyéndolo por bloques (hashlib libera el GIL)"""
+    sha256_hash = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        while bloque := f.read(1024 * 1024):
+            sha256_hash.update(bloque)
+    return sha256_hash.hexdigest()
+
+def listar_archivos_importacion(ruta_carpeta):
+    """Archivos de documentos de una carpeta y sus subcarpetas, en orden de ruta"""
+    return sorted(
+        ruta for ruta in Path(ruta_carpeta).rglob('*')
+        if ruta.is_file() and ruta.suffix.lower() in EXTENSIONES_DOCUMENTO
+    )
+
+def importar_carpeta(ruta_carpeta, hilos=None, progreso=None):
+    """Registra todos los documentos nuevos de una carpeta en una sola transacción.
+
+    Los hashes se calculan en paralelo; los duplicados (ya registrados o repetidos en la
+    carpeta) se omiten con el índice de digestos. Nombre, tipo y versión se detectan del
+    nombre del archivo. 'progreso(hechos, total)' se llama desde el hilo que importa.
+    """
+    inicio = time.perf_counter()
+    archivos = listar_archivos_importacion(ruta_carpeta)
+    resultados = {}
+    errores = []
+    
+    with ThreadPoolExecutor(max_workers=hilos or HILOS_IMPORTACION) as grupo:
+        futuros = {grupo.submit(calcular_hash_archivo, ruta): ruta for ruta in archivos}
+        for hechos, futuro in enumerate(as_completed(futuros), start=1):
+            ruta = futuros[futuro]
+            try:
+                resultados[ruta] = (futuro.result(), ruta.stat().st_size)
+            except OSError as e:
+                errores.append((str(ruta), str(e)))
+            if progreso is not None:
+                progreso(hechos, len(archivos))
+    
+    usuario = st.session_state.get('name', '')
+    area = st.session_state.get('area', '')
+    fecha_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    registros = []
+    duplicados = []
+    vistos = set()
+    for ruta in archivos:
+        if ruta not in resultados:
+            continue
+        hash_archivo = resultados[ruta][0]
+        if hash_archivo in vistos or hash_ya_existe(hash_archivo):
+            duplicados.append(str(ruta))
+            continue
+        vistos.add(hash_archivo)
+        registros.append({
+            'HASH': hash_archivo,
+            'NOMBRE': limpiar_nombre_archivo(ruta.name),
+            'TIPO': detectar_tipo_archivo(ruta.name),
+            'FECHA_CREACION': fecha_actual,
+            'FECHA_ACTUALIZACION': fecha_actual,
+            'VERSION': detectar_version(ruta.name),
+            'ESTATUS': 'Publicado',
+            'MODIFICACION': f"Importado desde {os.path.relpath(ruta, ruta_carpeta)}",
+            'CREADOR': usuario,
+            'AREA': area,
+            'REVISOR': '',
+            'APROBADOR': '',
+            'NO_CONFORMIDAD': '',
+            'AUDITORIA': ''
+        })
     
-    return df_final
+    # Registros, bloques génesis y bitácora de toda la carpeta en un solo commit
+    if registros:
+        with transaccion() as actual:
+            for registro in registros:
+                guardar_registro(registro, actual)
+                registrar_bitacora(registro['HASH'], "Documento Subido", "Importado en lote como Publicado", actual)
+    
+    segundos = max(time.perf_counter() - inicio, 1e-9)
+    total_bytes = sum(tamaño for _, tamaño in resultados.values())
+    return {
+        'archivos': len(archivos),
+        'importados': registros,
+        'duplicados': duplicados,
+        'errores': errores,
+        'bytes': total_bytes,
+        'segundos': segundos,
+        'archivos_por_segundo': len(resultados) / segundos,
+        'mb_por_segundo': total_bytes / (1024 * 1024) / segundos
+    }
 
 # ==========================================
 # FUNCIONES DE BITÁCORA Y AUDITORÍA
 # ==========================================
 
-def registrar_bitacora(hash_doc, accion, comentario=""):
+def registrar_bitacora(hash_doc, accion, comentario="", destino=None):
     """Registra una acción en la bitácora del sistema"""
-    bitacora_path = "bitacora.csv"
-    
     # Obtener información del usuario actual
     usuario = st.session_state.get('name', '')
     rol = st.session_state.get('rol', '')
@@ -319,135 +374,154 @@ def registrar_bitacora(hash_doc, accion, comentario=""):
         'comentario_opcional': comentario
     }
     
-    # Cargar bitácora existente o crear nueva
-    if os.path.exists(bitacora_path):
-        try:
-            df_bitacora = pd.read_csv(bitacora_path)
-        except:
-            df_bitacora = pd.DataFrame(columns=['hash', 'fecha_hora', 'usuario', 'rol', 'accion', 'comentario_opcional'])
-    else:
-        df_bitacora = pd.DataFrame(columns=['hash', 'fecha_hora', 'usuario', 'rol', 'accion', 'comentario_opcional'])
+    # Guardar en el backend de almacenamiento (o en la transacción abierta)
+    return (destino or obtener_backend()).registrar_bitacora(nuevo_registro)
+
+def cargar_bitacora(filtro_area=None, filtro_hash=None, desde=None, hasta=None, ultimos=None, hashes=None,
+                    filtro_usuario=None):
+    """Carga la bitácora según permisos del usuario (solo las particiones del rango pedido)"""
+    try:
+        return obtener_backend().cargar_bitacora(
+            filtro_hash=filtro_hash, desde=desde, hasta=hasta, ultimos=ultimos, hashes=hashes,
+            filtro_usuario=filtro_usuario
+        )
+    except:
+        return pd.DataFrame(columns=COLUMNAS_BITACORA)
+
+def verificar_bitacora(completa=False):
+    """Estado de integridad de la bitácora (None si el backend no la encadena)"""
+    try:
+        return obtener_backend().verificar_bitacora(completa=completa)
+    except Exception as e:
+        return {'valida': False, 'problemas': [f"No se pudo verificar la bitácora: {str(e)}"],
+                'sello': None, 'fecha_sello': None, 'revisados': 0, 'sin_sellar': 0, 'completa': completa}
+
+def usuarios_bitacora():
+    """Usuarios con eventos en la bitácora, desde el índice por usuario"""
+    try:
+        return [usuario for usuario in obtener_backend().usuarios_bitacora() if usuario]
+    except:
+        return []
+
+def resumen_bitacora():
+    """Total de eventos de la bitácora y fechas del primero y el último"""
+    try:
+        return obtener_backend().resumen_bitacora()
+    except:
+        return {'eventos': 0, 'desde': None, 'hasta': None, 'particiones': None}
+
+# Días que abarca por defecto la vista de la bitácora y eventos que puede mostrar de una vez
+DIAS_VISTA_BITACORA = 30
+EVENTOS_POR_VISTA = [100, 250, 500, 1000]
+
+# Estatus resultante y mensaje de decisión repetida para cada acción de aprobación
+DECISIONES = {
+    'Aprobado': {'estatus': 'Vigente', 'repetida': "Ya has aprobado este documento anteriormente"},
+    'Rechazado': {'estatus': 'Rechazado', 'repetida': "Ya has rechazado este documento anteriormente"},
+}
+
+def preparar_decision(hash_doc, decision, comentario="", usuario_actual=None):
+    """Valida una aprobación o un rechazo y arma los cambios del registro y los datos del bloque.
+
+    Las comprobaciones usan el índice de digestos (registro) y el de acciones por usuario
+    (cadena), sin leer el registro ni la cadena completos. Devuelve (True, (cambios,
+    datos_bloque)) o (False, mensaje).
+    """
+    documento = cargar_documento(hash_doc)
+    if documento is None:
+        return False, "Documento no encontrado"
+    
+    # Verificar si ya está aprobado o rechazado
+    if documento['ESTATUS'] in ['Vigente', 'Rechazado']:
+        return False, f"El documento ya está {documento['ESTATUS'].lower()}"
+    
+    # Verificar si el usuario actual ya tomó esta decisión en la blockchain
+    if usuario_actual is None:
+        usuario_actual = st.session_state.get('name', '')
+    if obtener_backend().realizo_accion(hash_doc, decision, usuario_actual):
+        return False, DECISIONES[decision]['repetida']
     
-    # Agregar nuevo registro
-    df_nuevo = pd.DataFrame([nuevo_registro])
-    df_bitacora_final = pd.concat([df_bitacora, df_nuevo], ignore_index=True)
+    cambios = {
+        'ESTATUS': DECISIONES[decision]['estatus'],
+        'FECHA_ACTUALIZACION': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    if decision == 'Aprobado':
+        cambios['APROBADOR'] = usuario_actual
     
-    # Guardar bitácora
-    df_bitacora_final.to_csv(bitacora_path, index=False)
-    return True
-
-def cargar_bitacora(filtro_area=None, filtro_hash=None):
-    """Carga la bitácora según permisos del usuario"""
-    bitacora_path = "bitacora.csv"
+    # Agregar comentario si existe
+    if comentario:
+        modificacion_actual = documento['MODIFICACION']
+        cambios['MODIFICACION'] = f"{modificacion_actual} | {decision}: {comentario}" if modificacion_actual else f"{decision}: {comentario}"
     
-    if not os.path.exists(bitacora_path):
-        return pd.DataFrame(columns=['hash', 'fecha_hora', 'usuario', 'rol', 'accion', 'comentario_opcional'])
+    datos_bloque = {**documento, **cambios}
+    datos_bloque['MODIFICACION'] = f"{decision} por {usuario_actual}: {comentario}" if comentario else f"{decision} por {usuario_actual}"
+    return True, (cambios, datos_bloque)
+
+def anotar_decision(hash_doc, decision, comentario, cambios, datos_bloque, actual):
+    """Agrega a una transacción abierta el cambio del registro, el bloque y el evento de una decisión"""
+    actual.actualizar_registro(hash_doc, cambios)
+    agregar_bloque_a_cadena(hash_doc, decision, datos_bloque, actual)
+    registrar_bitacora(hash_doc, decision, comentario, actual)
+
+def decidir_documento(hash_doc, decision, comentario=""):
+    """Aprueba o rechaza un documento: registro, bloque y bitácora se confirman juntos"""
+    exito, resultado = preparar_decision(hash_doc, decision, comentario)
+    if not exito:
+        return False, resultado
+    try:
+        with transaccion() as actual:
+            anotar_decision(hash_doc, decision, comentario, *resultado, actual)
+    except ConflictoConcurrencia:
+        return False, MENSAJE_CONFLICTO
+    return True, None
+
+def decidir_documentos_en_lote(decisiones):
+    """Aprueba o rechaza varios documentos en una sola transacción (un solo commit).
+
+    'decisiones' es una lista de (hash_doc, 'Aprobado' o 'Rechazado', comentario). Los
+    documentos que no pasan las validaciones quedan fuera y se informan como errores; los
+    demás se confirman juntos. La confirmación es todo o nada: si otra sesión avanzó la
+    cadena de uno solo de ellos (ConflictoConcurrencia), no se aplica ninguna decisión del
+    lote y todos vuelven con MENSAJE_CONFLICTO para reintentarlos.
+    Devuelve (hashes confirmados, [(hash, mensaje)]).
+    """
+    usuario_actual = st.session_state.get('name', '')
+    preparadas = []
+    errores = []
+    vistos = set()
+    for hash_doc, decision, comentario in decisiones:
+        if hash_doc in vistos:
+            errores.append((hash_doc, "El documento aparece más de una vez en el lote"))
+            continue
+        vistos.add(hash_doc)
+        if decision == 'Rechazado' and not comentario.strip():
+            errores.append((hash_doc, "El rechazo requiere un comentario"))
+            continue
+        exito, resultado = preparar_decision(hash_doc, decision, comentario, usuario_actual)
+        if exito:
+            preparadas.append((hash_doc, decision, comentario, *resultado))
+        else:
+            errores.append((hash_doc, resultado))
     
+    if not preparadas:
+        return [], errores
     try:
-        df_bitacora = pd.read_csv(bitacora_path)
-        
-        # Aplicar filtros si se especifican
-        if filtro_hash:
-            df_bitacora = df_bitacora[df_bitacora['hash'] == filtro_hash]
-        
-        return df_bitacora.sort_values('fecha_hora', ascending=False)
-    except:
-        return pd.DataFrame(columns=['hash', 'fecha_hora', 'usuario', 'rol', 'accion', 'comentario_opcional'])
+        with transaccion() as actual:
+            for preparada in preparadas:
+                anotar_decision(*preparada, actual)
+    except ConflictoConcurrencia:
+        return [], errores + [(preparada[0], MENSAJE_CONFLICTO) for preparada in preparadas]
+    return [preparada[0] for preparada in preparadas], errores
 
 def aprobar_documento(hash_doc, comentario=""):
     """Aprueba un documento y actualiza su estatus"""
-    df_registros = cargar_registros()
-    
-    if hash_doc in df_registros['HASH'].values:
-        # Verificar si ya está aprobado o rechazado
-        documento = df_registros[df_registros['HASH'] == hash_doc].iloc[0]
-        
-        if documento['ESTATUS'] in ['Vigente', 'Rechazado']:
-            return False, f"El documento ya está {documento['ESTATUS'].lower()}"
-        
-        # Verificar si el usuario actual ya aprobó este documento en la blockchain
-        df_blockchain = cargar_blockchain_documento(hash_doc)
-        usuario_actual = st.session_state.get('name', '')
-        
-        aprobaciones_previas = df_blockchain[
-            (df_blockchain['accion'] == 'Aprobado') & 
-            (df_blockchain['usuario_accion'] == usuario_actual)
-        ]
-        
-        if not aprobaciones_previas.empty:
-            return False, "Ya has aprobado este documento anteriormente"
-        
-        # Actualizar estatus a Vigente
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'ESTATUS'] = 'Vigente'
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'APROBADOR'] = usuario_actual
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'FECHA_ACTUALIZACION'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Agregar comentario si existe
-        if comentario:
-            modificacion_actual = df_registros.loc[df_registros['HASH'] == hash_doc, 'MODIFICACION'].iloc[0]
-            nueva_modificacion = f"{modificacion_actual} | Aprobado: {comentario}" if modificacion_actual else f"Aprobado: {comentario}"
-            df_registros.loc[df_registros['HASH'] == hash_doc, 'MODIFICACION'] = nueva_modificacion
-        
-        # Guardar cambios
-        df_registros.to_csv("registro_documentos.csv", index=False)
-        
-        # Agregar bloque a la blockchain
-        datos_bloque = df_registros[df_registros['HASH'] == hash_doc].iloc[0].to_dict()
-        datos_bloque['MODIFICACION'] = f"Aprobado por {usuario_actual}: {comentario}" if comentario else f"Aprobado por {usuario_actual}"
-        agregar_bloque_a_cadena(hash_doc, "Aprobado", datos_bloque)
-        
-        # Registrar en bitácora tradicional
-        registrar_bitacora(hash_doc, "Aprobado", comentario)
-        return True, "Documento aprobado exitosamente"
-    
-    return False, "Documento no encontrado"
+    exito, mensaje = decidir_documento(hash_doc, 'Aprobado', comentario)
+    return exito, "Documento aprobado exitosamente" if exito else mensaje
 
 def rechazar_documento(hash_doc, comentario=""):
     """Rechaza un documento y actualiza su estatus"""
-    df_registros = cargar_registros()
-    
-    if hash_doc in df_registros['HASH'].values:
-        # Verificar si ya está aprobado o rechazado
-        documento = df_registros[df_registros['HASH'] == hash_doc].iloc[0]
-        
-        if documento['ESTATUS'] in ['Vigente', 'Rechazado']:
-            return False, f"El documento ya está {documento['ESTATUS'].lower()}"
-        
-        # Verificar blockchain para evitar rechazos duplicados del mismo usuario
-        df_blockchain = cargar_blockchain_documento(hash_doc)
-        usuario_actual = st.session_state.get('name', '')
-        
-        rechazos_previos = df_blockchain[
-            (df_blockchain['accion'] == 'Rechazado') & 
-            (df_blockchain['usuario_accion'] == usuario_actual)
-        ]
-        
-        if not rechazos_previos.empty:
-            return False, "Ya has rechazado este documento anteriormente"
-        
-        # Actualizar estatus a Rechazado
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'ESTATUS'] = 'Rechazado'
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'FECHA_ACTUALIZACION'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Agregar comentario si existe
-        if comentario:
-            modificacion_actual = df_registros.loc[df_registros['HASH'] == hash_doc, 'MODIFICACION'].iloc[0]
-            nueva_modificacion = f"{modificacion_actual} | Rechazado: {comentario}" if modificacion_actual else f"Rechazado: {comentario}"
-            df_registros.loc[df_registros['HASH'] == hash_doc, 'MODIFICACION'] = nueva_modificacion
-        
-        # Guardar cambios
-        df_registros.to_csv("registro_documentos.csv", index=False)
-        
-        # Agregar bloque a la blockchain
-        datos_bloque = df_registros[df_registros['HASH'] == hash_doc].iloc[0].to_dict()
-        datos_bloque['MODIFICACION'] = f"Rechazado por {usuario_actual}: {comentario}" if comentario else f"Rechazado por {usuario_actual}"
-        agregar_bloque_a_cadena(hash_doc, "Rechazado", datos_bloque)
-        
-        # Registrar en bitácora tradicional
-        registrar_bitacora(hash_doc, "Rechazado", comentario)
-        return True, "Documento rechazado"
-    
-    return False, "Documento no encontrado"
+    exito, mensaje = decidir_documento(hash_doc, 'Rechazado', comentario)
+    return exito, "Documento rechazado" if exito else mensaje
 
 # ==========================================
 # FUNCIONES DE AUTENTICACIÓN Y USUARIOS
@@ -523,28 +597,32 @@ def crear_nuevo_usuario(username, name, password, role, area):
 
 def revisar_documento(hash_doc, comentario=""):
     """Marca un documento como revisado"""
-    df_registros = cargar_registros()
+    documento = cargar_documento(hash_doc)
     
-    if hash_doc in df_registros['HASH'].values:
+    if documento is not None:
         usuario_actual = st.session_state.get('name', '')
         
         # Actualizar revisor
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'REVISOR'] = usuario_actual
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'FECHA_ACTUALIZACION'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cambios = {
+            'REVISOR': usuario_actual,
+            'FECHA_ACTUALIZACION': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
         
         # Agregar comentario si existe
         if comentario:
-            modificacion_actual = df_registros.loc[df_registros['HASH'] == hash_doc, 'MODIFICACION'].iloc[0]
-            nueva_modificacion = f"{modificacion_actual} | Revisado: {comentario}" if modificacion_actual else f"Revisado: {comentario}"
-            df_registros.loc[df_registros['HASH'] == hash_doc, 'MODIFICACION'] = nueva_modificacion
-        
-        # Guardar cambios
-        df_registros.to_csv("registro_documentos.csv", index=False)
+            modificacion_actual = documento['MODIFICACION']
+            cambios['MODIFICACION'] = f"{modificacion_actual} | Revisado: {comentario}" if modificacion_actual else f"Revisado: {comentario}"
         
-        # Agregar bloque a la blockchain
-        datos_bloque = df_registros[df_registros['HASH'] == hash_doc].iloc[0].to_dict()
+        datos_bloque = {**documento, **cambios}
         datos_bloque['MODIFICACION'] = f"Revisado por {usuario_actual}: {comentario}" if comentario else f"Revisado por {usuario_actual}"
-        agregar_bloque_a_cadena(hash_doc, "Revisado", datos_bloque)
+        
+        # Registro y bloque se confirman juntos
+        try:
+            with transaccion() as actual:
+                actual.actualizar_registro(hash_doc, cambios)
+                agregar_bloque_a_cadena(hash_doc, "Revisado", datos_bloque, actual)
+        except ConflictoConcurrencia:
+            return False, MENSAJE_CONFLICTO
         
         return True, "Documento revisado exitosamente"
     
@@ -552,10 +630,9 @@ def revisar_documento(hash_doc, comentario=""):
 
 def actualizar_documento(hash_doc, nuevos_datos, comentario="", archivo_nuevo=None):
     """Actualiza un documento existente (solo si está aprobado) con opción de nuevo archivo"""
-    df_registros = cargar_registros()
+    documento = cargar_documento(hash_doc)
     
-    if hash_doc in df_registros['HASH'].values:
-        documento = df_registros[df_registros['HASH'] == hash_doc].iloc[0]
+    if documento is not None:
         
         # Permitir actualizar documentos en cualquier estado (excepto rechazados)
         if documento['ESTATUS'] == 'Rechazado':
@@ -578,17 +655,11 @@ def actualizar_documento(hash_doc, nuevos_datos, comentario="", archivo_nuevo=No
             nuevo_hash = calcular_hash(archivo_bytes)
             
             # Verificar si el nuevo hash ya existe en otro documento
-            if nuevo_hash != hash_doc and hash_ya_existe(nuevo_hash, df_registros):
+            if nuevo_hash != hash_doc and hash_ya_existe(nuevo_hash):
                 return False, f"Ya existe un documento con este archivo (Hash: {nuevo_hash[:16]}...)"
         
         # Actualizar datos básicos
-        for campo, valor in nuevos_datos.items():
-            if campo in df_registros.columns:
-                df_registros.loc[df_registros['HASH'] == hash_doc, campo] = valor
-        
-        # Si hay nuevo hash, actualizar el hash en el registro
-        if nuevo_hash != hash_doc:
-            df_registros.loc[df_registros['HASH'] == hash_doc, 'HASH'] = nuevo_hash
+        cambios = {campo: valor for campo, valor in nuevos_datos.items() if campo in COLUMNAS_REGISTRO}
         
         # Incrementar versión
         version_actual = documento['VERSION']
@@ -604,36 +675,43 @@ def actualizar_documento(hash_doc, nuevos_datos, comentario="", archivo_nuevo=No
             nueva_version = "v1.1"
         
         # Actualizar campos del documento
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'VERSION'] = nueva_version
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'ESTATUS'] = 'Publicado'  # Vuelve a estado pendiente
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'FECHA_ACTUALIZACION'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cambios['VERSION'] = nueva_version
+        cambios['ESTATUS'] = 'Publicado'  # Vuelve a estado pendiente
+        cambios['FECHA_ACTUALIZACION'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         # Agregar comentario de actualización
-        modificacion_actual = df_registros.loc[df_registros['HASH'] == hash_doc, 'MODIFICACION'].iloc[0]
+        modificacion_actual = documento['MODIFICACION']
         info_archivo = " con nuevo archivo" if archivo_nuevo is not None else ""
-        nueva_modificacion = f"{modificacion_actual} | Actualizado{info_archivo}: {comentario}" if modificacion_actual else f"Actualizado{info_archivo}: {comentario}"
-        df_registros.loc[df_registros['HASH'] == hash_doc, 'MODIFICACION'] = nueva_modificacion
+        cambios['MODIFICACION'] = f"{modificacion_actual} | Actualizado{info_archivo}: {comentario}" if modificacion_actual else f"Actualizado{info_archivo}: {comentario}"
         
-        # Guardar cambios en CSV principal
-        df_registros.to_csv("registro_documentos.csv", index=False)
+        # Si hay nuevo hash, actualizar el hash en el registro
+        if nuevo_hash != hash_doc:
+            cambios['HASH'] = nuevo_hash
         
-        # Agregar bloque a la blockchain del documento
-        datos_bloque = df_registros[df_registros['HASH'] == nuevo_hash].iloc[0].to_dict()
+        # Datos del bloque de la blockchain del documento
+        datos_bloque = {**documento, **cambios}
         datos_bloque['MODIFICACION'] = f"Actualizado por {usuario_actual}{info_archivo}: {comentario}"
         if archivo_nuevo is not None:
             datos_bloque['HASH_ANTERIOR'] = hash_doc
             datos_bloque['HASH_NUEVO'] = nuevo_hash
         
-        # Usar el hash original para la blockchain (mantener la cadena del documento)
-        agregar_bloque_a_cadena(hash_doc, "Actualizado", datos_bloque)
-        
-        # Si hay nuevo hash, crear una nueva entrada en la blockchain con el nuevo hash también
-        if nuevo_hash != hash_doc:
-            # Agregar bloque inicial para el nuevo hash
-            agregar_bloque_a_cadena(nuevo_hash, "Actualización con nuevo archivo", datos_bloque)
-        
-        # Registrar en bitácora tradicional
-        registrar_bitacora(nuevo_hash, "Actualizado", comentario + info_archivo)
+        # Registro, bloques y bitácora se confirman juntos
+        try:
+            with transaccion() as actual:
+                actual.actualizar_registro(hash_doc, cambios)
+                
+                # Usar el hash original para la blockchain (mantener la cadena del documento)
+                agregar_bloque_a_cadena(hash_doc, "Actualizado", datos_bloque, actual)
+                
+                # Si hay nuevo hash, crear una nueva entrada en la blockchain con el nuevo hash también
+                if nuevo_hash != hash_doc:
+                    # Agregar bloque inicial para el nuevo hash
+                    agregar_bloque_a_cadena(nuevo_hash, "Actualización con nuevo archivo", datos_bloque, actual)
+                
+                # Registrar en bitácora tradicional
+                registrar_bitacora(nuevo_hash, "Actualizado", comentario + info_archivo, actual)
+        except ConflictoConcurrencia:
+            return False, MENSAJE_CONFLICTO
         
         return True, f"Documento actualizado exitosamente a versión {nueva_version}{info_archivo}"
     
@@ -662,26 +740,49 @@ def puede_editar_auditoria(rol_usuario):
     """Verifica si el usuario puede editar campos de auditoría y no conformidad"""
     return rol_usuario in ['ADMIN', 'APROBADOR']
 
-def mostrar_historial_documento(hash_doc):
-    """Muestra el historial blockchain completo de un documento específico"""
-    df_blockchain = cargar_blockchain_documento(hash_doc)
+def mostrar_historial_documento(hash_doc, clave=''):
+    """Muestra el historial blockchain de un documento, del bloque más reciente al más antiguo y por páginas"""
+    cabeza = obtener_backend().obtener_cabeza(hash_doc)
     
-    if df_blockchain.empty:
+    if cabeza is None:
         st.info("No hay historial blockchain disponible para este documento.")
         return
     
-    # Validar integridad de la cadena
-    integridad_ok, mensaje_integridad = validar_integridad_cadena(hash_doc)
+    total_bloques = int(cabeza['numero_bloque']) + 1
+    
+    # Validar integridad de la cadena (resultado en caché mientras la cabeza no cambie)
+    integridad_ok, mensaje_integridad = validar_cadena_en_cache(hash_doc)
     
     if integridad_ok:
-        st.success(f" **Blockchain Íntegra** - {len(df_blockchain)} bloques")
+        st.success(f" **Blockchain Íntegra** - {total_bloques} bloques")
     else:
         st.error(f" **Blockchain Comprometida**: {mensaje_integridad}")
     
     st.markdown("** Historial Blockchain del Documento:**")
     
+    # Paginación: solo se leen los bloques de la página actual
+    total_paginas = max(1, -(-total_bloques // BLOQUES_POR_PAGINA))
+    key_pagina = f"pagina_historial_{clave}_{hash_doc}"
+    pagina = min(st.session_state.get(key_pagina, 0), total_paginas - 1)
+    
+    col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+    with col_anterior:
+        if st.button("⬅️ Más recientes", key=f"hist_ant_{clave}_{hash_doc[:8]}", disabled=pagina == 0):
+            st.session_state[key_pagina] = pagina - 1
+            st.rerun()
+    with col_pagina:
+        st.caption(f"Página {pagina + 1} de {total_paginas}")
+    with col_siguiente:
+        if st.button("Más antiguos ➡️", key=f"hist_sig_{clave}_{hash_doc[:8]}", disabled=pagina >= total_paginas - 1):
+            st.session_state[key_pagina] = pagina + 1
+            st.rerun()
+    
+    paginas = obtener_backend().iterar_historial(hash_doc, BLOQUES_POR_PAGINA)
+    bloques_pagina = next(itertools.islice(paginas, pagina, None), [])
+    paginas.close()
+    
     # Mostrar cada bloque
-    for idx, bloque in df_blockchain.iterrows():
+    for idx, bloque in enumerate(bloques_pagina):
         # Definir color según la acción
         accion = bloque['accion']
         if accion == "Aprobado":
@@ -703,13 +804,13 @@ def mostrar_historial_documento(hash_doc):
             color = "gray"
             icono = "📝"
         
-        with st.expander(f"Bloque #{bloque['numero_bloque']} - :{color}[{icono} {accion}]", expanded=(idx == 0)):
+        with st.expander(f"Bloque #{bloque['numero_bloque']} - :{color}[{icono} {accion}]", expanded=(pagina == 0 and idx == 0)):
             col1, col2 = st.columns(2)
             
             with col1:
                 st.markdown("** Información del Bloque:**")
                 st.write(f"**Hash del Bloque:** {bloque['hash_bloque'][:32]}...")
-                st.write(f"**Hash Anterior:** {bloque['hash_bloque_anterior'][:32] if bloque['hash_bloque_anterior'] != '0' else 'GÉNESIS'}...")
+                st.write(f"**Hash Anterior:** {bloque['hash_bloque_anterior'][:32] if str(bloque['hash_bloque_anterior']) != '0' else 'GÉNESIS'}...")
                 st.write(f"**Timestamp:** {bloque['timestamp']}")
                 st.write(f"**Usuario:** {bloque.get('usuario_accion', 'Sistema')}")
                 
@@ -743,7 +844,7 @@ def mostrar_historial_documento(hash_doc):
     col_tech1, col_tech2, col_tech3 = st.columns(3)
     
     with col_tech1:
-        st.metric("Total de Bloques", len(df_blockchain))
+        st.metric("Total de Bloques", total_bloques)
     
     with col_tech2:
         st.metric("Algoritmo Hash", "SHA-256")
@@ -814,6 +915,15 @@ def main():
     # Inicializar sistema de usuarios
     crear_usuario_admin_inicial()
     
+    # Rehacer las transacciones que quedaron sin punto de control tras un corte
+    obtener_backend().recuperar()
+    
+    # Cargar en el libro mayor (una sola vez) las cadenas anteriores a él
+    importar_historial_libro(obtener_backend())
+    
+    # Migrar en segundo plano las cadenas que aún estén en la disposición plana
+    iniciar_migracion_en_segundo_plano()
+    
     # Cargar configuración de usuarios
     config = cargar_usuarios()
     
@@ -899,7 +1009,6 @@ def main():
 def escanear_archivos_carpeta(ruta_carpeta, limite_archivos=100, limite_tamaño_mb=50):
     """Escanea recursivamente una carpeta y calcula el hash SHA-256 de todos los archivos (optimizado)"""
     archivos_encontrados = []
-    extensiones_validas = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.txt', '.jpg', '.png', '.ppt', '.pptx']
     limite_tamaño_bytes = limite_tamaño_mb * 1024 * 1024
     
     try:
@@ -916,7 +1025,7 @@ def escanear_archivos_carpeta(ruta_carpeta, limite_archivos=100, limite_tamaño_
         archivos_omitidos = 0
         
         for archivo_path in ruta_path.rglob('*'):
-            if archivo_path.is_file() and archivo_path.suffix.lower() in extensiones_validas:
+            if archivo_path.is_file() and archivo_path.suffix.lower() in EXTENSIONES_DOCUMENTO:
                 try:
                     tamaño = archivo_path.stat().st_size
                     if tamaño <= limite_tamaño_bytes:
@@ -1012,21 +1121,15 @@ def buscar_documento_por_nombre(nombre_archivo, df_registros):
 
 def obtener_ultimo_hash_blockchain(hash_documento):
     """Obtiene el último hash de la blockchain de un documento"""
-    blockchain_path = f"blockchain_{hash_documento[:16]}.csv"
-    
-    if not os.path.exists(blockchain_path):
-        return None
-    
     try:
-        df_blockchain = pd.read_csv(blockchain_path)
-        if df_blockchain.empty:
+        # La cabeza de la cadena se lee del índice, sin abrir el archivo de la cadena
+        ultimo_bloque = obtener_backend().obtener_cabeza(hash_documento)
+        if ultimo_bloque is None:
             return None
         
-        # Obtener el último bloque
-        ultimo_bloque = df_blockchain.sort_values('numero_bloque').iloc[-1]
         return ultimo_bloque['hash_documento']
     except Exception as e:
-        st.warning(f"Error al leer blockchain {blockchain_path}: {str(e)}")
+        st.warning(f"Error al leer blockchain {ruta_blockchain(hash_documento)}: {str(e)}")
         return None
 
 def comparar_integridad_archivos(archivos_fisicos, df_registros):
@@ -1436,11 +1539,7 @@ def mostrar_dashboard_blockchain():
     st.markdown("---")
     
     # Verificar si hay documentos
-    if not os.path.exists(CSV_FILE):
-        st.warning("No hay documentos registrados en el sistema.")
-        return
-    
-    df = pd.read_csv(CSV_FILE)
+    df = cargar_registros()
     
     # Asegúrate que exista la columna 'Hash_SHA256' para compatibilidad con el dashboard
     if 'HASH' in df.columns:
@@ -1454,8 +1553,10 @@ def mostrar_dashboard_blockchain():
     col1, col2, col3, col4 = st.columns(4)
     
     total_docs = len(df)
-    total_blockchains = sum(1 for _, row in df.iterrows() 
-                           if os.path.exists(f"blockchain_{row['Hash_SHA256'][:16]}.csv"))
+    
+    # Cabeza de cada cadena desde el índice (número y hash del último bloque)
+    cabezas = {hash_doc: obtener_backend().obtener_cabeza(hash_doc) for hash_doc in df['Hash_SHA256']}
+    total_blockchains = sum(1 for cabeza in cabezas.values() if cabeza is not None)
     
     with col1:
         st.metric(" Total Documentos", total_docs)
@@ -1464,25 +1565,19 @@ def mostrar_dashboard_blockchain():
         st.metric(" Blockchains Activas", total_blockchains)
     
     with col3:
-        total_blocks = 0
-        for _, row in df.iterrows():
-            blockchain_file = f"blockchain_{row['Hash_SHA256'][:16]}.csv"
-            if os.path.exists(blockchain_file):
-                blockchain_df = pd.read_csv(blockchain_file)
-                total_blocks += len(blockchain_df)
+        total_blocks = sum(cabeza['numero_bloque'] + 1 for cabeza in cabezas.values() if cabeza is not None)
         st.metric(" Total Bloques", total_blocks)
     
     with col4:
-        # Verificar integridad del sistema
-        docs_con_problemas = 0
-        for _, row in df.iterrows():
-            if not validar_integridad_cadena(row['Hash_SHA256']):
-                docs_con_problemas += 1
+        # Raíz Merkle global sellada y cabeza de cada cadena recalculada contra su árbol
+        problemas_sistema, raiz_sistema = estado_sistema(df['Hash_SHA256'].tolist())
+        docs_con_problemas = len(problemas_sistema)
         
         if docs_con_problemas == 0:
             st.metric(" Estado del Sistema", "ÍNTEGRO", delta="Sin problemas")
         else:
             st.metric(" Estado del Sistema", f"{docs_con_problemas} Problemas", delta="Requiere atención")
+        st.caption(f"Raíz Merkle: {raiz_sistema[:16]}...")
     
     st.markdown("---")
     
@@ -1514,15 +1609,13 @@ def mostrar_dashboard_blockchain():
     # Crear tabla de estado
     blockchain_status = []
     for _, row in df.iterrows():
-        blockchain_file = f"blockchain_{row['Hash_SHA256'][:16]}.csv"
+        ultimo_bloque = cabezas.get(row['Hash_SHA256'])
         
-        if os.path.exists(blockchain_file):
-            blockchain_df = pd.read_csv(blockchain_file)
-            num_bloques = len(blockchain_df)
-            ultimo_bloque = blockchain_df.iloc[-1] if not blockchain_df.empty else None
+        if ultimo_bloque is not None:
+            num_bloques = ultimo_bloque['numero_bloque'] + 1
             
             # Verificar integridad
-            es_integro = validar_integridad_cadena(row['Hash_SHA256'])
+            es_integro, _ = validar_integridad_cadena(row['Hash_SHA256'])
             
             status = {
                 'Documento': row['NOMBRE'][:30] + ('...' if len(row['NOMBRE']) > 30 else ''),
@@ -1530,8 +1623,8 @@ def mostrar_dashboard_blockchain():
                 'ESTATUS': row['ESTATUS'],
                 'Hash (Inicio)': row['Hash_SHA256'][:16] + '...',
                 'Bloques': num_bloques,
-                'Última Acción': ultimo_bloque['accion'] if ultimo_bloque is not None else 'Genesis',
-                'Última Fecha': ultimo_bloque['timestamp'] if ultimo_bloque is not None else row['FECHA_CREACION'],
+                'Última Acción': ultimo_bloque['accion'],
+                'Última Fecha': ultimo_bloque['timestamp'],
                 'Integridad': '✅ ÍNTEGRO' if es_integro else '❌ COMPROMETIDO'
             }
         else:
@@ -1563,18 +1656,29 @@ def mostrar_dashboard_blockchain():
         st.markdown("### Verificación de Integridad Global")
         if st.button("🔍 Verificar Integridad de Todo el Sistema", type="primary"):
             with st.spinner("Verificando integridad de todas las blockchains..."):
+                # Validación completa en el grupo de procesos; si todo está íntegro se sella la raíz
+                hashes_docs = df['Hash_SHA256'].tolist()
+                nombres = dict(zip(df['Hash_SHA256'], df['NOMBRE']))
                 problemas_encontrados = []
+                barra_progreso = st.progress(0.0)
+                texto_progreso = st.empty()
                 
-                for _, row in df.iterrows():
-                    documento = row['NOMBRE']
-                    hash_doc = row['Hash_SHA256']
-                    
-                    if not validar_integridad_cadena(hash_doc):
+                for resultado, metricas in verificar_sistema_paralelo(hashes_docs, completa=True):
+                    if not resultado['es_valida'] and not resultado['sin_cadena']:
                         problemas_encontrados.append({
-                            'Documento': documento,
-                            'Hash': hash_doc,
-                            'Problema': 'Integridad comprometida'
+                            'Documento': nombres[resultado['hash_documento']],
+                            'Hash': resultado['hash_documento'],
+                            'Problema': resultado['mensaje']
                         })
+                    barra_progreso.progress(metricas['cadenas'] / len(hashes_docs))
+                    texto_progreso.caption(
+                        f"{metricas['cadenas']}/{len(hashes_docs)} cadenas · "
+                        f"{metricas['cadenas_por_segundo']:.0f} cadenas/s · "
+                        f"{metricas['bloques_por_segundo']:.0f} bloques/s"
+                    )
+                
+                if not problemas_encontrados:
+                    sellar_sistema(hashes_docs)
                 
                 if problemas_encontrados:
                     st.error(f"⚠️ Se encontraron {len(problemas_encontrados)} problemas de integridad:")
@@ -1588,9 +1692,8 @@ def mostrar_dashboard_blockchain():
         # Actividad por mes
         activity_data = []
         for _, row in df.iterrows():
-            blockchain_file = f"blockchain_{row['Hash_SHA256'][:16]}.csv"
-            if os.path.exists(blockchain_file):
-                blockchain_df = pd.read_csv(blockchain_file)
+            blockchain_df = cargar_blockchain_documento(row['Hash_SHA256'])
+            if not blockchain_df.empty:
                 for _, block_row in blockchain_df.iterrows():
                     activity_data.append({
                         'Fecha': block_row['timestamp'],
@@ -1641,6 +1744,82 @@ def mostrar_dashboard_blockchain():
         - **Archivado**: Documento finalizado y archivado
         """)
 
+def mostrar_importacion_masiva():
+    """Importa en lote todos los documentos nuevos de una carpeta del servidor"""
+    st.header("Importación Masiva de Carpeta")
+    st.info("Se registrarán como 'Publicado' todos los archivos de la carpeta y sus subcarpetas que aún no estén en el sistema. Nombre, tipo y versión se detectan del nombre de cada archivo.")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        ruta_carpeta = st.text_input(
+            "Ruta de la carpeta a importar:",
+            placeholder="Ejemplo: C:\\Users\\Usuario\\Documentos\\Procedimientos",
+            key="ruta_importacion"
+        )
+    with col2:
+        hilos = st.number_input("Hilos de cálculo", min_value=1, max_value=64, value=HILOS_IMPORTACION, help="Archivos cuyo hash se calcula en paralelo")
+    
+    if not st.button("Importar carpeta", type="primary", disabled=not ruta_carpeta):
+        return
+    
+    if not os.path.isdir(ruta_carpeta):
+        st.error(f"La ruta {ruta_carpeta} no es una carpeta válida")
+        return
+    
+    barra_progreso = st.progress(0)
+    texto_estado = st.empty()
+    
+    def progreso(hechos, total):
+        barra_progreso.progress(hechos / total)
+        texto_estado.text(f"Calculando hashes: {hechos}/{total}")
+    
+    try:
+        resumen = importar_carpeta(ruta_carpeta, int(hilos), progreso)
+    except ConflictoConcurrencia:
+        st.error(f"❌ {MENSAJE_CONFLICTO}")
+        return
+    
+    texto_estado.empty()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Archivos", resumen['archivos'])
+    with col2:
+        st.metric("Importados", len(resumen['importados']))
+    with col3:
+        st.metric("Duplicados omitidos", len(resumen['duplicados']))
+    with col4:
+        st.metric("Errores de lectura", len(resumen['errores']))
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Archivos/s", f"{resumen['archivos_por_segundo']:.1f}")
+    with col2:
+        st.metric("MB/s", f"{resumen['mb_por_segundo']:.1f}")
+    with col3:
+        st.metric("Tiempo total", f"{resumen['segundos']:.2f} s")
+    
+    if resumen['importados']:
+        st.success(f"✅ {len(resumen['importados'])} documentos registrados en una sola transacción")
+        st.dataframe(
+            pd.DataFrame(resumen['importados'])[['NOMBRE', 'TIPO', 'VERSION', 'MODIFICACION', 'HASH']],
+            use_container_width=True, hide_index=True
+        )
+    elif resumen['archivos']:
+        st.info("No había documentos nuevos en la carpeta.")
+    else:
+        st.warning("No se encontraron archivos válidos en la carpeta")
+    
+    if resumen['duplicados']:
+        with st.expander(f"Duplicados omitidos ({len(resumen['duplicados'])})"):
+            for ruta in resumen['duplicados']:
+                st.write(f"• {ruta}")
+    
+    if resumen['errores']:
+        with st.expander(f"Errores de lectura ({len(resumen['errores'])})"):
+            for ruta, error in resumen['errores']:
+                st.write(f"• {ruta}: {error}")
+
 def mostrar_gestion_documentos():
     """Muestra la interfaz de gestión de documentos"""
     # Título principal
@@ -1655,10 +1834,16 @@ def mostrar_gestion_documentos():
     - **Verificación de duplicados** basada en hash
     - **Registro completo** con todos los metadatos
     - **Visualización** de todos los documentos registrados
+    - **Importación masiva** de carpetas completas
     """)
     
     st.markdown("---")
     
+    modo_registro = st.radio("Modo de registro", ["Archivo individual", "Importación masiva de carpeta"], horizontal=True)
+    if modo_registro == "Importación masiva de carpeta":
+        mostrar_importacion_masiva()
+        return
+    
     # ==========================================
     # SECCIÓN: UPLOAD DE ARCHIVO
     # ==========================================
@@ -1721,13 +1906,11 @@ def mostrar_gestion_documentos():
         
         st.code(hash_calculado, language="text")
         
-        # Verificar si ya existe
-        df_registros = cargar_registros()
-        ya_existe = hash_ya_existe(hash_calculado, df_registros)
+        # Verificar si ya existe (una sola búsqueda en el índice devuelve también el registro)
+        registro_existente = obtener_backend().buscar_documento(hash_calculado)
+        ya_existe = registro_existente is not None
         
-        if ya_existe:
-            registro_existente = df_registros[df_registros['HASH'] == hash_calculado].iloc[0]
-            
+        if ya_existe:            
             st.error(" **ARCHIVO DUPLICADO DETECTADO**")
             
             # Mostrar información del documento existente
@@ -1908,11 +2091,14 @@ def mostrar_gestion_documentos():
                         'AUDITORIA': auditoria_doc
                     }
                     
-                    # Guardar el registro
-                    df_actualizado = guardar_registro(nuevo_registro)
-                    
-                    # Registrar en bitácora la subida del documento
-                    registrar_bitacora(hash_calculado, "Documento Subido", f"Subido como {estatus_final}")
+                    # Guardar el registro, su bloque génesis y la subida en la bitácora en una sola transacción
+                    try:
+                        with transaccion() as actual:
+                            guardar_registro(nuevo_registro, actual)
+                            registrar_bitacora(hash_calculado, "Documento Subido", f"Subido como {estatus_final}", actual)
+                    except ConflictoConcurrencia:
+                        st.error(f"❌ {MENSAJE_CONFLICTO}")
+                        st.stop()
                     
                     st.success(f"✅ **Documento registrado exitosamente** como '{estatus_final}'")
                     st.balloons()
@@ -1943,174 +2129,160 @@ def mostrar_gestion_documentos():
                 else:
                     st.error("Por favor completa los campos obligatorios: Nombre, Tipo y Creador")
 
-def mostrar_registros(rol_usuario, area_usuario):
-    """Muestra los registros según los permisos del usuario"""
-    st.title("Registros de Documentos")
-    st.markdown("---")
-    
-    df_registros = cargar_registros()
-    
-    if df_registros.empty:
-        st.info("No hay documentos registrados aún.")
-        return
-    
-    # Filtrar según rol y área
-    if rol_usuario == 'COLABORADOR':
-        # Colaboradores solo ven sus propios documentos
-        df_filtrado = df_registros[df_registros['AREA'] == area_usuario]
-        st.subheader(f"Mis Documentos - Área: {area_usuario}")
-    elif rol_usuario == 'SUPERVISOR':
-        # Supervisores ven todos los documentos de su área
-        df_filtrado = df_registros[df_registros['AREA'] == area_usuario]
-        st.subheader(f"Documentos del Área: {area_usuario}")
-    else:  # ADMIN o APROBADOR
-        # Admin y Aprobador ven todos los documentos
-        df_filtrado = df_registros
-        st.subheader("Todos los Documentos del Sistema")
-    
-    if df_filtrado.empty:
-        st.info("No hay documentos para mostrar según tus permisos.")
-        return
-    
-    st.write(f"**Total de documentos:** {len(df_filtrado)}")
-    
-    # Filtros adicionales
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        filtro_tipo = st.selectbox("Filtrar por Tipo", ["Todos"] + df_filtrado['TIPO'].unique().tolist())
+def ordenar_registros(df_registros, columna, descendente):
+    """Ordena los registros por una columna (los vacíos al final) conservando el orden de llegada en empates"""
+    return df_registros.sort_values(columna, ascending=not descendente, kind='stable', na_position='last')
+
+def reiniciar_pagina(clave):
+    """Vuelve a la primera página cuando cambian los filtros, el orden o el tamaño de página"""
+    st.session_state[clave] = 0
+
+def tabla_compacta_registros(df_pagina):
+    """Tabla resumida de una página de registros para la lista colapsada"""
+    return pd.DataFrame({
+        'Nombre': df_pagina['NOMBRE'],
+        'Tipo': df_pagina['TIPO'],
+        'Versión': df_pagina['VERSION'],
+        'Estado': df_pagina['ESTATUS'],
+        'Área': df_pagina['AREA'],
+        'Creador': df_pagina['CREADOR'],
+        'Fecha': df_pagina['FECHA_CREACION'].astype(str).str[:10],
+        'Hash': df_pagina['HASH'].astype(str).str[:16] + "...",
+    })
+
+def mostrar_documento_registro(idx, row, rol_usuario):
+    """Muestra un documento de la lista con sus botones, acciones, historial y formulario de actualización"""
+    col_accion, col_info = st.columns([1, 10])
     
-    with col2:
-        filtro_estatus = st.selectbox("Filtrar por Estatus", ["Todos"] + df_filtrado['ESTATUS'].unique().tolist())
+    # Estado del documento para determinar qué mostrar
+    estatus = row['ESTATUS']
+    aprobador = row['APROBADOR']
+    usuario_actual = st.session_state.get('name', '')
     
-    with col3:
-        if rol_usuario in ['ADMIN', 'APROBADOR']:
-            if "AREA" in df_filtrado.columns:
-                filtro_area = st.selectbox("Filtrar por Área", ["Todos"] + df_filtrado['AREA'].unique().tolist())
-            else:
-                filtro_area = "Todos"
+    with col_accion:
+        # Mostrar estado del documento o botón de acciones
+        if estatus == 'Vigente':
+            st.success("✅")
+            st.caption("Aprobado")
+        elif estatus == 'Rechazado':
+            st.error("❌")
+            st.caption("Rechazado")
+        elif puede_aprobar_documentos(rol_usuario) and estatus not in ['Vigente', 'Rechazado']:
+            # Solo mostrar botón de menú si puede aprobar y no está ya procesado
+            if st.button("⋮", key=f"menu_{idx}", help="Acciones"):
+                # Toggle del estado de mostrar acciones
+                key_actions = f'show_actions_{row["HASH"]}'
+                st.session_state[key_actions] = not st.session_state.get(key_actions, False)
         else:
-            filtro_area = "Todos"
-    
-    # Aplicar filtros adicionales
-    df_final = df_filtrado.copy()
-    
-    if filtro_tipo != "Todos":
-        df_final = df_final[df_final['TIPO'] == filtro_tipo]
-    
-    if filtro_estatus != "Todos":
-        df_final = df_final[df_final['ESTATUS'] == filtro_estatus]
+            st.write("—")
     
-    if filtro_area != "Todos" and rol_usuario in ['ADMIN', 'APROBADOR']:
-        if "AREA" in df_final.columns:
-            df_final = df_final[df_final['AREA'] == filtro_area]
-    
-    # Mostrar tabla con acciones
-    st.markdown("---")
-    
-    # Mostrar documentos con acciones de aprobar/rechazar
-    for idx, row in df_final.iterrows():
-        col_accion, col_info = st.columns([1, 10])
+    with col_info:
+        # Información del documento
+        col_doc1, col_doc2, col_doc3, col_doc4 = st.columns([3, 2, 2, 2])
         
-        # Estado del documento para determinar qué mostrar
-        estatus = row['ESTATUS']
-        aprobador = row['APROBADOR']
-        usuario_actual = st.session_state.get('name', '')
+        with col_doc1:
+            st.write(f"**{row['NOMBRE']}**")
+            st.caption(f"Hash: {row['HASH'][:16]}...")
+        
+        with col_doc2:
+            st.write(f"Tipo: {row['TIPO']}")
+            st.write(f"Versión: {row['VERSION']}")
         
-        with col_accion:
-            # Mostrar estado del documento o botón de acciones
+        with col_doc3:
+            # Mostrar estado con colores y información adicional
             if estatus == 'Vigente':
-                st.success("✅")
-                st.caption("Aprobado")
+                st.markdown(f"Estado: :green[{estatus}]")
+                if aprobador:
+                    st.caption(f"Aprobado por: {aprobador}")
             elif estatus == 'Rechazado':
-                st.error("❌")
-                st.caption("Rechazado")
-            elif puede_aprobar_documentos(rol_usuario) and estatus not in ['Vigente', 'Rechazado']:
-                # Solo mostrar botón de menú si puede aprobar y no está ya procesado
-                if st.button("⋮", key=f"menu_{idx}", help="Acciones"):
-                    # Toggle del estado de mostrar acciones
-                    key_actions = f'show_actions_{row["HASH"]}'
-                    st.session_state[key_actions] = not st.session_state.get(key_actions, False)
+                st.markdown(f"Estado: :red[{estatus}]")
+                # Buscar quien rechazó en la bitácora
+                df_bitacora = cargar_bitacora(filtro_hash=row['HASH'])
+                rechazos = df_bitacora[df_bitacora['accion'] == 'Rechazado']
+                if not rechazos.empty:
+                    st.caption(f"Rechazado por: {rechazos.iloc[-1]['usuario']}")
+            elif estatus == 'Publicado':
+                st.markdown(f"Estado: :orange[{estatus}]")
             else:
-                st.write("—")
-        
-        with col_info:
-            # Información del documento
-            col_doc1, col_doc2, col_doc3, col_doc4 = st.columns([3, 2, 2, 2])
-            
-            with col_doc1:
-                st.write(f"**{row['NOMBRE']}**")
-                st.caption(f"Hash: {row['HASH'][:16]}...")
+                st.markdown(f"Estado: :blue[{estatus}]")
             
-            with col_doc2:
-                st.write(f"Tipo: {row['TIPO']}")
-                st.write(f"Versión: {row['VERSION']}")
+            st.write(f"Área: {row['AREA']}")
+        
+        with col_doc4:
+            st.write(f"Creador: {row['CREADOR']}")
+            st.write(f"Fecha: {row['FECHA_CREACION'][:10]}")
             
-            with col_doc3:
-                # Mostrar estado con colores y información adicional
-                if estatus == 'Vigente':
-                    st.markdown(f"Estado: :green[{estatus}]")
-                    if aprobador:
-                        st.caption(f"Aprobado por: {aprobador}")
-                elif estatus == 'Rechazado':
-                    st.markdown(f"Estado: :red[{estatus}]")
-                    # Buscar quien rechazó en la bitácora
-                    df_bitacora = cargar_bitacora(filtro_hash=row['HASH'])
-                    rechazos = df_bitacora[df_bitacora['accion'] == 'Rechazado']
-                    if not rechazos.empty:
-                        st.caption(f"Rechazado por: {rechazos.iloc[-1]['usuario']}")
-                elif estatus == 'Publicado':
-                    st.markdown(f"Estado: :orange[{estatus}]")
-                else:
-                    st.markdown(f"Estado: :blue[{estatus}]")
-                
-                st.write(f"Área: {row['AREA']}")
+            # Botón para actualizar documento (disponible para todos)
+            if row['ESTATUS'] != 'Rechazado':
+                if st.button(" Actualizar", key=f"actualizar_directo_{row['HASH'][:8]}", help="Actualizar documento"):
+                    key_update = f'show_update_{row["HASH"]}'
+                    st.session_state[key_update] = True
+                    st.rerun()
             
-            with col_doc4:
-                st.write(f"Creador: {row['CREADOR']}")
-                st.write(f"Fecha: {row['FECHA_CREACION'][:10]}")
-                
-                # Botón para actualizar documento (disponible para todos)
-                if row['ESTATUS'] != 'Rechazado':
-                    if st.button(" Actualizar", key=f"actualizar_directo_{row['HASH'][:8]}", help="Actualizar documento"):
-                        key_update = f'show_update_{row["HASH"]}'
-                        st.session_state[key_update] = True
-                        st.rerun()
-                
-                # Botón para ver historial
-                if st.button(" Historial", key=f"historial_{row['HASH'][:8]}", help="Ver historial de acciones"):
-                    key_historial = f'show_historial_{row["HASH"]}'
-                    st.session_state[key_historial] = not st.session_state.get(key_historial, False)
-        
-        # Mostrar historial si está activado
-        key_historial = f'show_historial_{row["HASH"]}'
-        if st.session_state.get(key_historial, False):
-            with st.expander(" Historial de Acciones", expanded=True):
-                mostrar_historial_documento(row['HASH'])
-                if st.button("Cerrar Historial", key=f"cerrar_hist_{row['HASH'][:8]}"):
-                    st.session_state[key_historial] = False
+            # Botón para ver historial
+            if st.button(" Historial", key=f"historial_{row['HASH'][:8]}", help="Ver historial de acciones"):
+                key_historial = f'show_historial_{row["HASH"]}'
+                st.session_state[key_historial] = not st.session_state.get(key_historial, False)
+    
+    # Mostrar historial si está activado
+    key_historial = f'show_historial_{row["HASH"]}'
+    if st.session_state.get(key_historial, False):
+        with st.expander(" Historial de Acciones", expanded=True):
+            mostrar_historial_documento(row['HASH'], clave='historial')
+            if st.button("Cerrar Historial", key=f"cerrar_hist_{row['HASH'][:8]}"):
+                st.session_state[key_historial] = False
+                st.rerun()
+    
+    # Mostrar acciones si están activadas y el documento puede ser procesado
+    key_actions = f'show_actions_{row["HASH"]}'
+    if (st.session_state.get(key_actions, False) and 
+        puede_aprobar_documentos(rol_usuario)):
+        
+        st.markdown("** Acciones Disponibles:**")
+        
+        # Primera fila de acciones - Revisar y Ver Blockchain
+        col_actions_1 = st.columns([1, 2, 2, 2, 5])
+        
+        with col_actions_1[1]:
+            if st.button(" Ver Blockchain", key=f"blockchain_{row['HASH']}", use_container_width=True):
+                key_blockchain = f'show_blockchain_{row["HASH"]}'
+                st.session_state[key_blockchain] = True
+                st.rerun()
+        
+        with col_actions_1[2]:
+            if st.button(" Revisar", key=f"revisar_{row['HASH']}", use_container_width=True):
+                comentario_rev = st.session_state.get(f"comentario_{row['HASH']}", "")
+                exito, mensaje = revisar_documento(row['HASH'], comentario_rev)
+                if exito:
+                    st.success(mensaje)
+                    if key_actions in st.session_state:
+                        del st.session_state[key_actions]
                     st.rerun()
+                else:
+                    st.error(mensaje)
         
-        # Mostrar acciones si están activadas y el documento puede ser procesado
-        key_actions = f'show_actions_{row["HASH"]}'
-        if (st.session_state.get(key_actions, False) and 
-            puede_aprobar_documentos(rol_usuario)):
-            
-            st.markdown("** Acciones Disponibles:**")
-            
-            # Primera fila de acciones - Revisar y Ver Blockchain
-            col_actions_1 = st.columns([1, 2, 2, 2, 5])
-            
-            with col_actions_1[1]:
-                if st.button(" Ver Blockchain", key=f"blockchain_{row['HASH']}", use_container_width=True):
-                    key_blockchain = f'show_blockchain_{row["HASH"]}'
-                    st.session_state[key_blockchain] = True
+        with col_actions_1[3]:
+            # Permitir actualizar cualquier documento (excepto rechazados)
+            if (row['ESTATUS'] != 'Rechazado' and 
+                verificar_permisos(rol_usuario, st.session_state.get('area', ''), row['AREA'], "actualizar")):
+                if st.button(" Actualizar", key=f"actualizar_{row['HASH']}", use_container_width=True):
+                    key_update = f'show_update_{row["HASH"]}'
+                    st.session_state[key_update] = True
                     st.rerun()
+        
+        # Segunda fila - Comentario
+        col_actions_2 = st.columns([1, 8, 3])
+        with col_actions_2[1]:
+            comentario_key = f"comentario_{row['HASH']}"
+            comentario = st.text_input(" Comentario para la acción", key=comentario_key, placeholder="Razón de la decisión...")
+        
+        # Tercera fila - Aprobar/Rechazar (solo si no está procesado)
+        if estatus not in ['Vigente', 'Rechazado']:
+            col_actions_3 = st.columns([1, 2, 2, 2, 5])
             
-            with col_actions_1[2]:
-                if st.button(" Revisar", key=f"revisar_{row['HASH']}", use_container_width=True):
-                    comentario_rev = st.session_state.get(f"comentario_{row['HASH']}", "")
-                    exito, mensaje = revisar_documento(row['HASH'], comentario_rev)
+            with col_actions_3[1]:
+                if st.button(" Aprobar", key=f"aprobar_{row['HASH']}", use_container_width=True):
+                    exito, mensaje = aprobar_documento(row['HASH'], comentario)
                     if exito:
                         st.success(mensaje)
                         if key_actions in st.session_state:
@@ -2119,196 +2291,283 @@ def mostrar_registros(rol_usuario, area_usuario):
                     else:
                         st.error(mensaje)
             
-            with col_actions_1[3]:
-                # Permitir actualizar cualquier documento (excepto rechazados)
-                if (row['ESTATUS'] != 'Rechazado' and 
-                    verificar_permisos(rol_usuario, st.session_state.get('area', ''), row['AREA'], "actualizar")):
-                    if st.button(" Actualizar", key=f"actualizar_{row['HASH']}", use_container_width=True):
-                        key_update = f'show_update_{row["HASH"]}'
-                        st.session_state[key_update] = True
-                        st.rerun()
-            
-            # Segunda fila - Comentario
-            col_actions_2 = st.columns([1, 8, 3])
-            with col_actions_2[1]:
-                comentario_key = f"comentario_{row['HASH']}"
-                comentario = st.text_input(" Comentario para la acción", key=comentario_key, placeholder="Razón de la decisión...")
-            
-            # Tercera fila - Aprobar/Rechazar (solo si no está procesado)
-            if estatus not in ['Vigente', 'Rechazado']:
-                col_actions_3 = st.columns([1, 2, 2, 2, 5])
-                
-                with col_actions_3[1]:
-                    if st.button(" Aprobar", key=f"aprobar_{row['HASH']}", use_container_width=True):
-                        exito, mensaje = aprobar_documento(row['HASH'], comentario)
+            with col_actions_3[2]:
+                if st.button(" Rechazar", key=f"rechazar_{row['HASH']}", use_container_width=True):
+                    if not comentario.strip():
+                        st.warning("Por favor proporciona un comentario para el rechazo.")
+                    else:
+                        exito, mensaje = rechazar_documento(row['HASH'], comentario)
                         if exito:
-                            st.success(mensaje)
+                            st.error(mensaje)
                             if key_actions in st.session_state:
                                 del st.session_state[key_actions]
                             st.rerun()
                         else:
                             st.error(mensaje)
+            
+            with col_actions_3[3]:
+                if st.button(" Cancelar", key=f"cancelar_{row['HASH']}"):
+                    if key_actions in st.session_state:
+                        del st.session_state[key_actions]
+                    st.rerun()
+    
+    # Mostrar blockchain si está activado
+    key_blockchain = f'show_blockchain_{row["HASH"]}'
+    if st.session_state.get(key_blockchain, False):
+        with st.container():
+            st.markdown("---")
+            st.markdown(f"##  Blockchain del Documento: {row['NOMBRE']}")
+            mostrar_historial_documento(row['HASH'], clave='blockchain')
+            if st.button(" Cerrar Blockchain", key=f"cerrar_blockchain_{row['HASH'][:8]}"):
+                st.session_state[key_blockchain] = False
+                st.rerun()
+    
+    # Mostrar formulario de actualización si está activado
+    key_update = f'show_update_{row["HASH"]}'
+    if st.session_state.get(key_update, False):
+        with st.container():
+            st.markdown("---")
+            st.markdown(f"##  Actualizar Documento: {row['NOMBRE']}")
+            
+            # Información importante sobre la actualización
+            st.info(" **Importante:** Al actualizar el documento puedes subir un nuevo archivo. Esto recalculará el hash y creará un nuevo bloque en la blockchain.")
+            
+            with st.form(f"form_actualizar_{row['HASH']}"):
+                # Sección de archivo
+                st.markdown("###  Archivo del Documento")
+                archivo_nuevo = st.file_uploader(
+                    "Seleccionar nuevo archivo (opcional):",
+                    type=['pdf', 'doc', 'docx', 'xls', 'xlsx', 'txt', 'jpg', 'png'],
+                    help="Si no seleccionas un archivo, se mantendrá el documento actual",
+                    key=f"file_uploader_{row['HASH']}"
+                )
                 
-                with col_actions_3[2]:
-                    if st.button(" Rechazar", key=f"rechazar_{row['HASH']}", use_container_width=True):
-                        if not comentario.strip():
-                            st.warning("Por favor proporciona un comentario para el rechazo.")
-                        else:
-                            exito, mensaje = rechazar_documento(row['HASH'], comentario)
-                            if exito:
-                                st.error(mensaje)
-                                if key_actions in st.session_state:
-                                    del st.session_state[key_actions]
-                                st.rerun()
-                            else:
-                                st.error(mensaje)
+                # Mostrar información del archivo actual
+                col_file_info = st.columns([1, 3])
+                with col_file_info[0]:
+                    st.write("**Archivo actual:**")
+                with col_file_info[1]:
+                    st.code(f"Hash: {row['HASH'][:32]}...", language="text")
+                
+                # Si hay un archivo nuevo, mostrar su información
+                if archivo_nuevo is not None:
+                    st.markdown("** Información del nuevo archivo:**")
+                    col_new_file = st.columns(3)
+                    with col_new_file[0]:
+                        st.metric("Nombre", archivo_nuevo.name)
+                    with col_new_file[1]:
+                        st.metric("Tamaño", f"{archivo_nuevo.size:,} bytes")
+                    with col_new_file[2]:
+                        st.metric("Tipo", archivo_nuevo.type)
+                    
+                    # Calcular hash del nuevo archivo para mostrar (sin afectar el proceso)
+                    archivo_bytes_preview = archivo_nuevo.read()
+                    nuevo_hash_preview = calcular_hash(archivo_bytes_preview)
+                    st.code(f"Nuevo Hash: {nuevo_hash_preview[:32]}...", language="text")
+                    # Resetear el puntero del archivo
+                    archivo_nuevo.seek(0)
+                    
+                    if nuevo_hash_preview == row['HASH']:
+                        st.warning(" El archivo seleccionado es idéntico al actual (mismo hash)")
                 
-                with col_actions_3[3]:
-                    if st.button(" Cancelar", key=f"cancelar_{row['HASH']}"):
-                        if key_actions in st.session_state:
-                            del st.session_state[key_actions]
-                        st.rerun()
-        
-        # Mostrar blockchain si está activado
-        key_blockchain = f'show_blockchain_{row["HASH"]}'
-        if st.session_state.get(key_blockchain, False):
-            with st.container():
-                st.markdown("---")
-                st.markdown(f"##  Blockchain del Documento: {row['NOMBRE']}")
-                mostrar_historial_documento(row['HASH'])
-                if st.button(" Cerrar Blockchain", key=f"cerrar_blockchain_{row['HASH'][:8]}"):
-                    st.session_state[key_blockchain] = False
-                    st.rerun()
-        
-        # Mostrar formulario de actualización si está activado
-        key_update = f'show_update_{row["HASH"]}'
-        if st.session_state.get(key_update, False):
-            with st.container():
                 st.markdown("---")
-                st.markdown(f"##  Actualizar Documento: {row['NOMBRE']}")
+                st.markdown("###  Información del Documento")
                 
-                # Información importante sobre la actualización
-                st.info(" **Importante:** Al actualizar el documento puedes subir un nuevo archivo. Esto recalculará el hash y creará un nuevo bloque en la blockchain.")
+                col_upd1, col_upd2 = st.columns(2)
                 
-                with st.form(f"form_actualizar_{row['HASH']}"):
-                    # Sección de archivo
-                    st.markdown("###  Archivo del Documento")
-                    archivo_nuevo = st.file_uploader(
-                        "Seleccionar nuevo archivo (opcional):",
-                        type=['pdf', 'doc', 'docx', 'xls', 'xlsx', 'txt', 'jpg', 'png'],
-                        help="Si no seleccionas un archivo, se mantendrá el documento actual",
-                        key=f"file_uploader_{row['HASH']}"
-                    )
+                with col_upd1:
+                    nuevo_nombre = st.text_input("Nombre del Documento", value=row['NOMBRE'])
                     
-                    # Mostrar información del archivo actual
-                    col_file_info = st.columns([1, 3])
-                    with col_file_info[0]:
-                        st.write("**Archivo actual:**")
-                    with col_file_info[1]:
-                        st.code(f"Hash: {row['HASH'][:32]}...", language="text")
+                    # Opciones de tipo con el tipo actual seleccionado
+                    tipos_disponibles = ["Manual", "Contrato", "Política", "Procedimiento", "Reporte", "Formato", "Especificación", "Plan", "Acta", "Presupuesto", "Documento"]
+                    try:
+                        index_tipo_actual = tipos_disponibles.index(row['TIPO'])
+                    except ValueError:
+                        index_tipo_actual = 0
                     
-                    # Si hay un archivo nuevo, mostrar su información
-                    if archivo_nuevo is not None:
-                        st.markdown("** Información del nuevo archivo:**")
-                        col_new_file = st.columns(3)
-                        with col_new_file[0]:
-                            st.metric("Nombre", archivo_nuevo.name)
-                        with col_new_file[1]:
-                            st.metric("Tamaño", f"{archivo_nuevo.size:,} bytes")
-                        with col_new_file[2]:
-                            st.metric("Tipo", archivo_nuevo.type)
-                        
-                        # Calcular hash del nuevo archivo para mostrar (sin afectar el proceso)
-                        archivo_bytes_preview = archivo_nuevo.read()
-                        nuevo_hash_preview = calcular_hash(archivo_bytes_preview)
-                        st.code(f"Nuevo Hash: {nuevo_hash_preview[:32]}...", language="text")
-                        # Resetear el puntero del archivo
-                        archivo_nuevo.seek(0)
-                        
-                        if nuevo_hash_preview == row['HASH']:
-                            st.warning(" El archivo seleccionado es idéntico al actual (mismo hash)")
+                    nuevo_tipo = st.selectbox("Tipo", tipos_disponibles, index=index_tipo_actual)
+                    nueva_modificacion = st.text_area("Descripción de Cambios", placeholder="Describe qué cambios estás realizando...")
                     
-                    st.markdown("---")
-                    st.markdown("###  Información del Documento")
-                    
-                    col_upd1, col_upd2 = st.columns(2)
+                    # Mostrar versión actual e información de incremento
+                    st.info(f"**Versión actual:** {row['VERSION']}")
+                    st.caption("La versión se incrementará automáticamente (ej: v1.0 → v1.1)")
+                
+                with col_upd2:
+                    # Campos de auditoría solo para ADMIN y APROBADOR
+                    if rol_usuario in ['ADMIN', 'APROBADOR']:
+                        nueva_no_conformidad = st.text_area("No Conformidad", value=row['NO_CONFORMIDAD'], help="Campo exclusivo para ADMIN y APROBADOR")
+                        nueva_auditoria = st.text_area("Auditoría", value=row['AUDITORIA'], help="Campo exclusivo para ADMIN y APROBADOR")
+                    else:
+                        nueva_no_conformidad = st.text_area("No Conformidad", value=row['NO_CONFORMIDAD'], disabled=True, help="Solo ADMIN y APROBADOR pueden editar este campo")
+                        nueva_auditoria = st.text_area("Auditoría", value=row['AUDITORIA'], disabled=True, help="Solo ADMIN y APROBADOR pueden editar este campo")
                     
-                    with col_upd1:
-                        nuevo_nombre = st.text_input("Nombre del Documento", value=row['NOMBRE'])
-                        
-                        # Opciones de tipo con el tipo actual seleccionado
-                        tipos_disponibles = ["Manual", "Contrato", "Política", "Procedimiento", "Reporte", "Formato", "Especificación", "Plan", "Acta", "Presupuesto", "Documento"]
-                        try:
-                            index_tipo_actual = tipos_disponibles.index(row['TIPO'])
-                        except ValueError:
-                            index_tipo_actual = 0
-                        
-                        nuevo_tipo = st.selectbox("Tipo", tipos_disponibles, index=index_tipo_actual)
-                        nueva_modificacion = st.text_area("Descripción de Cambios", placeholder="Describe qué cambios estás realizando...")
+                    # Información adicional
+                    st.markdown("** Información del proceso:**")
+                    st.write("• El estado cambiará a 'Publicado'")
+                    st.write("• Se creará un bloque en blockchain")
+                    st.write("• Se registrará en bitácora")
+                    if archivo_nuevo:
+                        st.write("• Se recalculará el hash del documento")
+                
+                st.markdown("---")
+                
+                # Botones de acción
+                col_btn_upd = st.columns([1, 2, 2, 7])
+                
+                with col_btn_upd[1]:
+                    submitted_update = st.form_submit_button(" Guardar Cambios", type="primary")
+                
+                with col_btn_upd[2]:
+                    if st.form_submit_button(" Cancelar"):
+                        st.session_state[key_update] = False
+                        st.rerun()
+                
+                # Procesar la actualización
+                if submitted_update:
+                    if not nueva_modificacion.strip():
+                        st.error("Por favor describe los cambios que estás realizando.")
+                    else:
+                        # Preparar datos de actualización
+                        nuevos_datos = {
+                            'NOMBRE': nuevo_nombre,
+                            'TIPO': nuevo_tipo,
+                            'MODIFICACION': nueva_modificacion
+                        }
                         
-                        # Mostrar versión actual e información de incremento
-                        st.info(f"**Versión actual:** {row['VERSION']}")
-                        st.caption("La versión se incrementará automáticamente (ej: v1.0 → v1.1)")
-                    
-                    with col_upd2:
-                        # Campos de auditoría solo para ADMIN y APROBADOR
+                        # Solo agregar campos de auditoría si el usuario tiene permisos
                         if rol_usuario in ['ADMIN', 'APROBADOR']:
-                            nueva_no_conformidad = st.text_area("No Conformidad", value=row['NO_CONFORMIDAD'], help="Campo exclusivo para ADMIN y APROBADOR")
-                            nueva_auditoria = st.text_area("Auditoría", value=row['AUDITORIA'], help="Campo exclusivo para ADMIN y APROBADOR")
-                        else:
-                            nueva_no_conformidad = st.text_area("No Conformidad", value=row['NO_CONFORMIDAD'], disabled=True, help="Solo ADMIN y APROBADOR pueden editar este campo")
-                            nueva_auditoria = st.text_area("Auditoría", value=row['AUDITORIA'], disabled=True, help="Solo ADMIN y APROBADOR pueden editar este campo")
+                            nuevos_datos['NO_CONFORMIDAD'] = nueva_no_conformidad
+                            nuevos_datos['AUDITORIA'] = nueva_auditoria
                         
-                        # Información adicional
-                        st.markdown("** Información del proceso:**")
-                        st.write("• El estado cambiará a 'Publicado'")
-                        st.write("• Se creará un bloque en blockchain")
-                        st.write("• Se registrará en bitácora")
-                        if archivo_nuevo:
-                            st.write("• Se recalculará el hash del documento")
-                    
-                    st.markdown("---")
-                    
-                    # Botones de acción
-                    col_btn_upd = st.columns([1, 2, 2, 7])
-                    
-                    with col_btn_upd[1]:
-                        submitted_update = st.form_submit_button(" Guardar Cambios", type="primary")
-                    
-                    with col_btn_upd[2]:
-                        if st.form_submit_button(" Cancelar"):
+                        # Ejecutar actualización
+                        exito, mensaje = actualizar_documento(row['HASH'], nuevos_datos, nueva_modificacion, archivo_nuevo)
+                        
+                        if exito:
+                            st.success(mensaje)
+                            st.balloons()
                             st.session_state[key_update] = False
                             st.rerun()
-                    
-                    # Procesar la actualización
-                    if submitted_update:
-                        if not nueva_modificacion.strip():
-                            st.error("Por favor describe los cambios que estás realizando.")
                         else:
-                            # Preparar datos de actualización
-                            nuevos_datos = {
-                                'NOMBRE': nuevo_nombre,
-                                'TIPO': nuevo_tipo,
-                                'MODIFICACION': nueva_modificacion
-                            }
-                            
-                            # Solo agregar campos de auditoría si el usuario tiene permisos
-                            if rol_usuario in ['ADMIN', 'APROBADOR']:
-                                nuevos_datos['NO_CONFORMIDAD'] = nueva_no_conformidad
-                                nuevos_datos['AUDITORIA'] = nueva_auditoria
-                            
-                            # Ejecutar actualización
-                            exito, mensaje = actualizar_documento(row['HASH'], nuevos_datos, nueva_modificacion, archivo_nuevo)
-                            
-                            if exito:
-                                st.success(mensaje)
-                                st.balloons()
-                                st.session_state[key_update] = False
-                                st.rerun()
-                            else:
-                                st.error(mensaje)
-        
+                            st.error(mensaje)
+
+
+def mostrar_registros(rol_usuario, area_usuario):
+    """Muestra los registros según los permisos del usuario"""
+    st.title("Registros de Documentos")
+    st.markdown("---")
+    
+    # Filtrar según rol y área (índices secundarios del registro)
+    if rol_usuario == 'COLABORADOR':
+        # Colaboradores solo ven sus propios documentos
+        criterios_rol = {'AREA': area_usuario}
+        titulo = f"Mis Documentos - Área: {area_usuario}"
+    elif rol_usuario == 'SUPERVISOR':
+        # Supervisores ven todos los documentos de su área
+        criterios_rol = {'AREA': area_usuario}
+        titulo = f"Documentos del Área: {area_usuario}"
+    else:  # ADMIN o APROBADOR
+        # Admin y Aprobador ven todos los documentos
+        criterios_rol = {}
+        titulo = "Todos los Documentos del Sistema"
+    
+    df_filtrado = filtrar_registros(criterios_rol)
+    
+    if df_filtrado.empty:
+        if criterios_rol:
+            st.subheader(titulo)
+            st.info("No hay documentos para mostrar según tus permisos.")
+        else:
+            st.info("No hay documentos registrados aún.")
+        return
+    
+    st.subheader(titulo)
+    
+    st.write(f"**Total de documentos:** {len(df_filtrado)}")
+    
+    # Filtros adicionales
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        filtro_tipo = st.selectbox("Filtrar por Tipo", ["Todos"] + df_filtrado['TIPO'].unique().tolist(),
+                                   on_change=reiniciar_pagina, args=('pagina_registros',))
+    
+    with col2:
+        filtro_estatus = st.selectbox("Filtrar por Estatus", ["Todos"] + df_filtrado['ESTATUS'].unique().tolist(),
+                                      on_change=reiniciar_pagina, args=('pagina_registros',))
+    
+    with col3:
+        if rol_usuario in ['ADMIN', 'APROBADOR']:
+            if "AREA" in df_filtrado.columns:
+                filtro_area = st.selectbox("Filtrar por Área", ["Todos"] + df_filtrado['AREA'].unique().tolist(),
+                                           on_change=reiniciar_pagina, args=('pagina_registros',))
+            else:
+                filtro_area = "Todos"
+        else:
+            filtro_area = "Todos"
+    
+    # Aplicar filtros adicionales intersectando los índices con el filtro del rol
+    criterios = dict(criterios_rol)
+    
+    if filtro_tipo != "Todos":
+        criterios['TIPO'] = filtro_tipo
+    
+    if filtro_estatus != "Todos":
+        criterios['ESTATUS'] = filtro_estatus
+    
+    if filtro_area != "Todos" and rol_usuario in ['ADMIN', 'APROBADOR']:
+        criterios['AREA'] = filtro_area
+    
+    df_final = filtrar_registros(criterios) if criterios != criterios_rol else df_filtrado
+    
+    # Orden y tamaño de página
+    col_orden, col_sentido, col_tamaño = st.columns([2, 2, 1])
+    
+    with col_orden:
+        campo_orden = st.selectbox("Ordenar por", list(CAMPOS_ORDEN_REGISTROS), key="registros_orden",
+                                   on_change=reiniciar_pagina, args=('pagina_registros',))
+    
+    with col_sentido:
+        sentido = st.radio("Sentido", ["Descendente", "Ascendente"], horizontal=True, key="registros_sentido",
+                           on_change=reiniciar_pagina, args=('pagina_registros',))
+    
+    with col_tamaño:
+        tamaño_pagina = st.selectbox("Por página", DOCUMENTOS_POR_PAGINA, index=1, key="registros_tamaño",
+                                     on_change=reiniciar_pagina, args=('pagina_registros',))
+    
+    # Paginación: solo los documentos de la página actual llegan a la interfaz
+    df_ordenado = ordenar_registros(df_final, CAMPOS_ORDEN_REGISTROS[campo_orden], sentido == "Descendente")
+    total_paginas = max(1, -(-len(df_ordenado) // tamaño_pagina))
+    pagina = min(st.session_state.get('pagina_registros', 0), total_paginas - 1)
+    df_pagina = df_ordenado.iloc[pagina * tamaño_pagina:(pagina + 1) * tamaño_pagina]
+    
+    col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+    with col_anterior:
+        if st.button("⬅️ Anterior", key="registros_anterior", disabled=pagina == 0):
+            st.session_state['pagina_registros'] = pagina - 1
+            st.rerun()
+    with col_pagina:
+        st.caption(f"Página {pagina + 1} de {total_paginas} · {len(df_ordenado)} documentos")
+    with col_siguiente:
+        if st.button("Siguiente ➡️", key="registros_siguiente", disabled=pagina >= total_paginas - 1):
+            st.session_state['pagina_registros'] = pagina + 1
+            st.rerun()
+    
+    # Lista compacta de la página (una sola tabla en lugar de columnas y botones por fila)
+    st.dataframe(tabla_compacta_registros(df_pagina), use_container_width=True, hide_index=True)
+    
+    # Las acciones se crean solo para el documento seleccionado
+    seleccionado = st.selectbox(
+        "Documento para ver acciones",
+        [None] + list(df_pagina.index),
+        format_func=lambda idx: "—" if idx is None else f"{df_pagina.at[idx, 'NOMBRE']} ({df_pagina.at[idx, 'HASH'][:8]})",
+        key="registros_seleccionado"
+    )
+    
+    if seleccionado is not None:
         st.markdown("---")
+        mostrar_documento_registro(seleccionado, df_pagina.loc[seleccionado], rol_usuario)
+    
+    st.markdown("---")
     
     # Botón para descargar CSV (solo para ADMIN, APROBADOR y SUPERVISOR)
     if rol_usuario in ['ADMIN', 'APROBADOR', 'SUPERVISOR']:
@@ -2324,17 +2583,16 @@ def mostrar_registros(rol_usuario, area_usuario):
     st.markdown("---")
     st.markdown("###  Información del Sistema Blockchain")
     
-    # Calcular estadísticas blockchain
+    # Las estadísticas blockchain se calculan solo para los documentos de la página actual
     total_blockchains = 0
     total_bloques = 0
     blockchains_integras = 0
     
-    for _, doc in df_final.iterrows():
-        blockchain_path = f"blockchain_{doc['HASH'][:16]}.csv"
-        if os.path.exists(blockchain_path):
+    for _, doc in df_pagina.iterrows():
+        cabeza = obtener_backend().obtener_cabeza(doc['HASH'])
+        if cabeza is not None:
             total_blockchains += 1
-            df_blockchain = cargar_blockchain_documento(doc['HASH'])
-            total_bloques += len(df_blockchain)
+            total_bloques += cabeza['numero_bloque'] + 1
             
             # Verificar integridad
             integridad_ok, _ = validar_integridad_cadena(doc['HASH'])
@@ -2347,14 +2605,14 @@ def mostrar_registros(rol_usuario, area_usuario):
         st.metric(" Total Documentos", len(df_final))
     
     with col2:
-        st.metric(" Blockchains Activas", total_blockchains)
+        st.metric(" Blockchains (página)", total_blockchains)
     
     with col3:
-        st.metric(" Total de Bloques", total_bloques)
+        st.metric(" Bloques (página)", total_bloques)
     
     with col4:
         porcentaje_integridad = (blockchains_integras / total_blockchains * 100) if total_blockchains > 0 else 0
-        st.metric(" Integridad", f"{porcentaje_integridad:.1f}%")
+        st.metric(" Integridad (página)", f"{porcentaje_integridad:.1f}%")
     
     # Información técnica adicional
     col_tech1, col_tech2, col_tech3 = st.columns(3)
@@ -2363,28 +2621,19 @@ def mostrar_registros(rol_usuario, area_usuario):
         st.metric(" Algoritmo Hash", "SHA-256")
     
     with col_tech2:
-        st.metric(" Almacenamiento", "CSV + Blockchain")
+        st.metric(" Almacenamiento", f"{ETIQUETAS_BACKEND[obtener_backend().nombre]} + Blockchain")
     
     with col_tech3:
         promedio_bloques = (total_bloques / total_blockchains) if total_blockchains > 0 else 0
-        st.metric(" Promedio Bloques/Doc", f"{promedio_bloques:.1f}")
+        st.metric(" Promedio Bloques/Doc (página)", f"{promedio_bloques:.1f}")
 
 def mostrar_aprobaciones_pendientes():
     """Muestra documentos pendientes de aprobación (solo para APROBADOR)"""
     st.title("Aprobaciones Pendientes")
     st.markdown("---")
     
-    df_registros = cargar_registros()
-    
-    if df_registros.empty:
-        st.info("No hay documentos registrados.")
-        return
-    
-    # Filtrar documentos pendientes (no aprobados ni rechazados)
-    df_pendientes = df_registros[
-        (~df_registros['ESTATUS'].isin(['Vigente', 'Rechazado'])) &
-        (df_registros['ESTATUS'].isin(['Borrador', 'Publicado', 'Editado']))
-    ]
+    # Documentos pendientes (no aprobados ni rechazados) desde el índice de ESTATUS
+    df_pendientes = filtrar_registros({'ESTATUS': ['Borrador', 'Publicado', 'Editado']})
     
     if df_pendientes.empty:
         st.success("No hay documentos pendientes de aprobación.")
@@ -2392,7 +2641,69 @@ def mostrar_aprobaciones_pendientes():
     
     st.write(f"**Documentos pendientes de aprobación:** {len(df_pendientes)}")
     
-    for idx, row in df_pendientes.iterrows():
+    # Decisiones en lote: una tabla editable y una sola transacción para todos los documentos
+    with st.expander("Aprobar o rechazar en lote"):
+        tabla_lote = pd.DataFrame({
+            'Decisión': "—",
+            'Comentario': "",
+            'Documento': df_pendientes['NOMBRE'].tolist(),
+            'Tipo': df_pendientes['TIPO'].tolist(),
+            'Área': df_pendientes['AREA'].tolist(),
+            'Hash': [f"{hash_doc[:16]}..." for hash_doc in df_pendientes['HASH']],
+        }, index=df_pendientes['HASH'].tolist())
+        
+        tabla_editada = st.data_editor(
+            tabla_lote,
+            hide_index=True,
+            use_container_width=True,
+            disabled=['Documento', 'Tipo', 'Área', 'Hash'],
+            column_config={
+                'Decisión': st.column_config.SelectboxColumn("Decisión", options=["—", "Aprobar", "Rechazar"], required=True),
+                'Comentario': st.column_config.TextColumn("Comentario", help="Obligatorio para rechazar"),
+            },
+            key="tabla_lote_aprobaciones"
+        )
+        
+        if st.button("Confirmar decisiones", type="primary", key="confirmar_lote_aprobaciones"):
+            decisiones = [
+                (hash_doc, 'Aprobado' if fila['Decisión'] == "Aprobar" else 'Rechazado',
+                 fila['Comentario'] if isinstance(fila['Comentario'], str) else "")
+                for hash_doc, fila in tabla_editada.iterrows() if fila['Decisión'] != "—"
+            ]
+            
+            if not decisiones:
+                st.warning("Elige Aprobar o Rechazar en al menos un documento.")
+            else:
+                confirmados, errores = decidir_documentos_en_lote(decisiones)
+                for hash_doc, mensaje in errores:
+                    st.error(f"{hash_doc[:16]}...: {mensaje}")
+                if confirmados:
+                    st.success(f"{len(confirmados)} documento(s) procesados en una sola transacción")
+                    if not errores:
+                        st.rerun()
+    
+    # Detalle por documento paginado: solo la página actual crea expanders y consulta acciones
+    col_tamaño, col_anterior, col_pagina, col_siguiente = st.columns([1, 1, 2, 1])
+    with col_tamaño:
+        tamaño_pagina = st.selectbox("Por página", DOCUMENTOS_POR_PAGINA, index=0, key="aprobaciones_tamaño",
+                                     on_change=reiniciar_pagina, args=('pagina_aprobaciones',))
+    
+    total_paginas = max(1, -(-len(df_pendientes) // tamaño_pagina))
+    pagina = min(st.session_state.get('pagina_aprobaciones', 0), total_paginas - 1)
+    df_pagina = df_pendientes.iloc[pagina * tamaño_pagina:(pagina + 1) * tamaño_pagina]
+    
+    with col_anterior:
+        if st.button("⬅️ Anterior", key="aprobaciones_anterior", disabled=pagina == 0):
+            st.session_state['pagina_aprobaciones'] = pagina - 1
+            st.rerun()
+    with col_pagina:
+        st.caption(f"Página {pagina + 1} de {total_paginas} · {len(df_pendientes)} documentos")
+    with col_siguiente:
+        if st.button("Siguiente ➡️", key="aprobaciones_siguiente", disabled=pagina >= total_paginas - 1):
+            st.session_state['pagina_aprobaciones'] = pagina + 1
+            st.rerun()
+    
+    for idx, row in df_pagina.iterrows():
         with st.expander(f" {row['NOMBRE']} - {row['TIPO']} (v{row['VERSION']})"):
             col1, col2 = st.columns(2)
             
@@ -2412,12 +2723,8 @@ def mostrar_aprobaciones_pendientes():
             usuario_actual = st.session_state.get('name', '')
             ya_aprobado = row['APROBADOR'] == usuario_actual
             
-            # Verificar si ya fue rechazado por el usuario actual
-            df_bitacora = cargar_bitacora(filtro_hash=row['HASH'])
-            ya_rechazado = not df_bitacora[
-                (df_bitacora['usuario'] == usuario_actual) & 
-                (df_bitacora['accion'] == 'Rechazado')
-            ].empty
+            # Verificar si ya fue rechazado por el usuario actual (índice de acciones por usuario)
+            ya_rechazado = obtener_backend().realizo_accion(row['HASH'], 'Rechazado', usuario_actual)
             
             if ya_aprobado:
                 st.success(f" **Ya aprobaste este documento**")
@@ -2466,39 +2773,99 @@ def mostrar_bitacora(rol_usuario, area_usuario):
         st.error("No tienes permisos para acceder a la bitácora.")
         return
     
-    df_bitacora = cargar_bitacora()
+    # El manifiesto da el total y las fechas sin leer los eventos
+    resumen = resumen_bitacora()
     
-    if df_bitacora.empty:
+    if not resumen['eventos']:
         st.info("No hay registros en la bitácora aún.")
         return
     
     # Filtrar según rol
     if rol_usuario == 'SUPERVISOR':
         # Supervisores solo ven la bitácora de su área
-        df_registros = cargar_registros()
-        hashes_area = df_registros[df_registros['AREA'] == area_usuario]['HASH'].tolist()
-        df_filtrado = df_bitacora[df_bitacora['hash'].isin(hashes_area)]
+        hashes_area = filtrar_registros({'AREA': area_usuario})['HASH'].tolist()
         st.subheader(f"Bitácora del Área: {area_usuario}")
     else:  # ADMIN o APROBADOR
-        df_filtrado = df_bitacora
+        hashes_area = None
         st.subheader("Bitácora General del Sistema")
+        st.write(f"**Total de registros:** {resumen['eventos']}")
+    
+    # Integridad: solo se revisan los eventos posteriores al último sello verificado
+    if st.session_state.get('verificacion_completa_bitacora'):
+        integridad = st.session_state.pop('verificacion_completa_bitacora')
+    else:
+        integridad = verificar_bitacora()
+    if integridad is not None:
+        col_integridad, col_verificar = st.columns([4, 1])
+        
+        with col_integridad:
+            if integridad['valida']:
+                if integridad['sello'] is None:
+                    st.info("La bitácora aún no tiene sellos firmados.")
+                else:
+                    st.success(f"Bitácora íntegra: encadenamiento y firmas verificados hasta el sello "
+                               f"#{integridad['sello']} ({integridad['fecha_sello']})")
+                st.caption(f"Eventos revisados: {integridad['revisados']} | "
+                           f"Eventos aún sin sellar: {integridad['sin_sellar']}"
+                           + (" | Verificación completa" if integridad['completa'] else ""))
+            else:
+                st.error("Se detectaron alteraciones en la bitácora")
+                for problema in integridad['problemas']:
+                    st.write(f"- {problema}")
+        
+        with col_verificar:
+            if st.button("Verificación completa", key="verificar_bitacora_completa"):
+                st.session_state['verificacion_completa_bitacora'] = verificar_bitacora(completa=True)
+                st.rerun()
+    
+    # Ventana visible: solo se leen las particiones que cubren el rango de fechas
+    ultima = pd.to_datetime(resumen['hasta'], errors='coerce')
+    ultima = datetime.now().date() if pd.isna(ultima) else ultima.date()
+    primera = pd.to_datetime(resumen['desde'], errors='coerce')
+    primera = ultima if pd.isna(primera) else min(primera.date(), ultima)
+    
+    col_rango, col_usuario, col_limite = st.columns([2, 2, 1])
+    
+    with col_rango:
+        rango = st.date_input(
+            "Rango de fechas",
+            value=(max(primera, ultima - timedelta(days=DIAS_VISTA_BITACORA)), ultima),
+            min_value=primera,
+            max_value=ultima
+        )
+    
+    with col_usuario:
+        # El índice por usuario da la lista completa y lee solo los eventos del elegido
+        filtro_usuario = st.selectbox("Filtrar por Usuario", ["Todos"] + usuarios_bitacora())
+    
+    with col_limite:
+        limite = st.selectbox("Eventos a mostrar", EVENTOS_POR_VISTA)
+    
+    if not isinstance(rango, (tuple, list)) or len(rango) != 2:
+        st.info("Selecciona la fecha final del rango.")
+        return
+    
+    df_filtrado = cargar_bitacora(
+        desde=rango[0].strftime("%Y-%m-%d 00:00:00"),
+        hasta=rango[1].strftime("%Y-%m-%d 23:59:59"),
+        ultimos=limite,
+        hashes=hashes_area,
+        filtro_usuario=None if filtro_usuario == "Todos" else filtro_usuario
+    )
     
     if df_filtrado.empty:
         st.info("No hay registros de bitácora para mostrar según tus permisos.")
         return
     
-    st.write(f"**Total de registros:** {len(df_filtrado)}")
+    st.write(f"**Registros en el rango (más recientes):** {len(df_filtrado)}")
     
     # Filtros
-    col1, col2, col3 = st.columns(3)
+    col1, col2 = st.columns(2)
     
     with col1:
         filtro_accion = st.selectbox("Filtrar por Acción", ["Todos"] + df_filtrado['accion'].unique().tolist())
     
     with col2:
-        filtro_usuario = st.selectbox("Filtrar por Usuario", ["Todos"] + df_filtrado['usuario'].unique().tolist())
-    
-    with col3:
         filtro_rol = st.selectbox("Filtrar por Rol", ["Todos"] + df_filtrado['rol'].unique().tolist())
     
     # Aplicar filtros
@@ -2507,9 +2874,6 @@ def mostrar_bitacora(rol_usuario, area_usuario):
     if filtro_accion != "Todos":
         df_final = df_final[df_final['accion'] == filtro_accion]
     
-    if filtro_usuario != "Todos":
-        df_final = df_final[df_final['usuario'] == filtro_usuario]
-    
     if filtro_rol != "Todos":
         df_final = df_final[df_final['rol'] == filtro_rol]
     
@@ -0,0 +1,35 @@
+import os
+
+# ==========================================
+# CONFIGURACIÓN DE RUTAS DE DATOS
+# ==========================================
+# Todos los archivos de datos (registro, bitácora, índices, cadenas) viven bajo
+# DIRECTORIO_DATOS. Los archivos de cada cadena se reparten en subdirectorios según el
+# prefijo del hash del documento: chains/ab/cd/blockchain_abcd....csv con los valores por
+# defecto (2 niveles de 2 caracteres hexadecimales, 256 subdirectorios por nivel).
+
+DIRECTORIO_DATOS = os.environ.get("CLEIN_DIRECTORIO_DATOS", ".")
+DIRECTORIO_CADENAS = os.path.join(DIRECTORIO_DATOS, "chains")
+NIVELES_FRAGMENTO = int(os.environ.get("CLEIN_NIVELES_FRAGMENTO", "2"))
+ANCHO_FRAGMENTO = int(os.environ.get("CLEIN_ANCHO_FRAGMENTO", "2"))
+
+# Carpeta de usuarios del proyecto (usuarios.yaml y reporte_blockchain_completo.json)
+DIRECTORIO_USUARIOS = os.environ.get(
+    "CLEIN_DIRECTORIO_USUARIOS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "USUARIOS Y BLOCKCHAINS")
+)
+
+os.makedirs(DIRECTORIO_DATOS, exist_ok=True)
+
+def ruta_datos(*partes):
+    """Devuelve una ruta dentro del directorio de datos"""
+    return os.path.join(DIRECTORIO_DATOS, *partes)
+
+def directorio_fragmento(hash_doc):
+    """Subdirectorio de cadenas que corresponde al prefijo del hash de un documento"""
+    prefijos = [hash_doc[i * ANCHO_FRAGMENTO:(i + 1) * ANCHO_FRAGMENTO] for i in range(NIVELES_FRAGMENTO)]
+    return os.path.join(DIRECTORIO_CADENAS, *prefijos)
+
+def ruta_fragmentada(hash_doc, nombre):
+    """Ruta de un archivo de la cadena de un documento dentro de su subdirectorio"""
+    return os.path.join(directorio_fragmento(hash_doc), nombre)
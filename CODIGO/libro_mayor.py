@@ -0,0 +1,430 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from archivos import escribir_atomico
+from configuracion import DIRECTORIO_USUARIOS, ruta_datos
+
+# ==========================================
+# CONSTANTES DEL LIBRO MAYOR
+# ==========================================
+# Cadena global que agrupa los eventos de todas las cadenas por documento en bloques de
+# varias transacciones (formato de reporte_blockchain_completo.json). Los bloques sellados
+# se guardan en un archivo de solo anexar (una línea JSON por bloque); las estadísticas y
+# el reporte se actualizan por bloque sin releer el libro. El reporte es el
+# reporte_blockchain_completo.json de la carpeta de usuarios.
+
+ARCHIVO_LIBRO = ruta_datos("libro_mayor.jsonl")
+ARCHIVO_PENDIENTES = ruta_datos("libro_pendientes.jsonl")
+ARCHIVO_ESTADO_LIBRO = ruta_datos("libro_estado.json")
+ARCHIVO_DOCUMENTOS_LIBRO = ruta_datos("libro_documentos.txt")
+REPORTE_LIBRO = os.path.join(DIRECTORIO_USUARIOS, "reporte_blockchain_completo.json")
+
+# Un lote se sella al llegar a TAMAÑO_LOTE transacciones o cuando la más antigua
+# lleva VENTANA_LOTE segundos esperando
+TAMAÑO_LOTE = int(os.environ.get("CLEIN_LOTE_TRANSACCIONES", "50"))
+VENTANA_LOTE = float(os.environ.get("CLEIN_VENTANA_LOTE", "300"))
+DIFICULTAD_LIBRO = 2
+RESERVA_ENCABEZADO = 4096
+
+DATOS_GENESIS = {
+    "tipo": "genesis",
+    "mensaje": "Bloque Génesis - Sistema de Gestión Documental",
+    "version": "1.0"
+}
+
+# Campos de un bloque de cadena que se copian a la transacción (con su nombre en el libro)
+CAMPOS_TRANSACCION = [
+    ('numero_bloque', 'numero_bloque_original'), ('hash_documento', 'hash_documento'),
+    ('nombre_documento', 'nombre_documento'), ('tipo', 'tipo'),
+    ('fecha_creacion', 'fecha_creacion'), ('fecha_actualizacion', 'fecha_actualizacion'),
+    ('version', 'version'), ('estatus', 'estatus'), ('modificacion', 'modificacion'),
+    ('creador', 'creador'), ('area', 'area'), ('revisor', 'revisor'),
+    ('aprobador', 'aprobador'), ('no_conformidad', 'no_conformidad'),
+    ('auditoria', 'auditoria'), ('timestamp', 'timestamp_original'),
+    ('accion', 'accion'), ('usuario_accion', 'usuario_accion')
+]
+
+CIERRE_REPORTE = "\n  ]\n}".encode('utf-8')
+APERTURA_CADENA = '\n  "blockchain_completa": [\n'.encode('utf-8')
+
+# ==========================================
+# HASH Y PRUEBA DE TRABAJO
+# ==========================================
+
+def calcular_hash_libro(indice, timestamp, datos, hash_anterior, nonce):
+    """Calcula el hash de un bloque del libro mayor"""
+    contenido = f"{indice}{timestamp}{json.dumps(datos, sort_keys=True)}{hash_anterior}{nonce}"
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+def minar_bloque(indice, timestamp, datos, hash_anterior, dificultad=DIFICULTAD_LIBRO):
+    """Busca el nonce cuyo hash empieza con 'dificultad' ceros; devuelve (nonce, hash)"""
+    prefijo = "0" * dificultad
+    base = hashlib.sha256(
+        f"{indice}{timestamp}{json.dumps(datos, sort_keys=True)}{hash_anterior}".encode()
+    )
+    nonce = 0
+    while True:
+        candidato = base.copy()
+        candidato.update(str(nonce).encode())
+        hash_bloque = candidato.hexdigest()
+        if hash_bloque.startswith(prefijo):
+            return nonce, hash_bloque
+        nonce += 1
+
+def _valor_json(valor):
+    """Convierte un valor de pandas en uno serializable (NaN y None pasan a null)"""
+    if valor is None:
+        return None
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return valor
+
+def crear_transaccion(bloque, archivo_origen):
+    """Convierte un bloque de la cadena de un documento en una transacción del libro"""
+    transaccion = {destino: _valor_json(bloque.get(origen)) for origen, destino in CAMPOS_TRANSACCION}
+    transaccion['numero_bloque_original'] = int(transaccion['numero_bloque_original'])
+    transaccion['archivo_origen'] = archivo_origen
+    return transaccion
+
+def _clave_transaccion(transaccion):
+    """Identifica la transacción por el documento y el número de bloque de origen"""
+    return transaccion['hash_documento'], int(transaccion['numero_bloque_original'])
+
+def _sangrar(texto, espacios):
+    """Sangra todas las líneas de un texto"""
+    return "\n".join(" " * espacios + linea for linea in texto.split("\n"))
+
+def _formatear_bloque(bloque):
+    """Texto de un bloque dentro del arreglo del reporte"""
+    return _sangrar(json.dumps(bloque, indent=2, ensure_ascii=False), 4).encode('utf-8')
+
+# ==========================================
+# LIBRO MAYOR
+# ==========================================
+
+class LibroMayor:
+    """Cadena global por lotes con estadísticas incrementales y reporte anexable"""
+
+    def __init__(self):
+        self._candado = threading.RLock()
+        self.estado = {
+            'indice': -1,
+            'hash': '0',
+            'tamaño_libro': 0,
+            'tamaño_reporte': 0,
+            'reserva': RESERVA_ENCABEZADO,
+            'estadisticas': {
+                'total_bloques': 0,
+                'total_transacciones': 0,
+                'documentos_unicos': 0,
+                'acciones_por_tipo': {},
+                'es_valida': True
+            }
+        }
+        self.documentos = set()
+        self.pendientes = []
+        # (hash_documento, numero_bloque_original) de las transacciones en espera
+        self._claves_pendientes = set()
+        self._cargar()
+
+    # ----- Carga y recuperación -----
+
+    def _cargar(self):
+        """Carga el estado y recupera los bloques o transacciones de un corte previo"""
+        if os.path.exists(ARCHIVO_ESTADO_LIBRO):
+            with open(ARCHIVO_ESTADO_LIBRO, 'r', encoding='utf-8') as f:
+                self.estado.update(json.load(f))
+
+        if os.path.exists(ARCHIVO_DOCUMENTOS_LIBRO):
+            with open(ARCHIVO_DOCUMENTOS_LIBRO, 'r', encoding='utf-8') as f:
+                self.documentos = {linea.strip() for linea in f if linea.strip()}
+
+        # Bloques anexados después de la última escritura del estado
+        ultimo_bloque = None
+        if os.path.exists(ARCHIVO_LIBRO):
+            with open(ARCHIVO_LIBRO, 'r+b') as f:
+                f.seek(self.estado['tamaño_libro'])
+                posicion = self.estado['tamaño_libro']
+                for linea in f:
+                    if not linea.endswith(b'\n'):
+                        break
+                    ultimo_bloque = json.loads(linea)
+                    self._acumular(ultimo_bloque)
+                    posicion += len(linea)
+                f.truncate(posicion)
+            self.estado['tamaño_libro'] = posicion
+
+        if self.estado['indice'] < 0:
+            timestamp = datetime.now().isoformat()
+            self._anexar_bloque({
+                'indice': 0,
+                'timestamp': timestamp,
+                'datos': DATOS_GENESIS,
+                'hash_anterior': '0',
+                'hash': calcular_hash_libro(0, timestamp, DATOS_GENESIS, '0', 0),
+                'nonce': 0
+            }, genesis=True)
+
+        if not os.path.exists(REPORTE_LIBRO) or os.path.getsize(REPORTE_LIBRO) != self.estado['tamaño_reporte']:
+            self.regenerar_reporte()
+
+        self._cargar_pendientes(ultimo_bloque)
+        self._guardar_estado()
+
+    def _cargar_pendientes(self, ultimo_bloque):
+        """Carga las transacciones en espera descartando las que ya se sellaron"""
+        if not os.path.exists(ARCHIVO_PENDIENTES):
+            return
+        pendientes = []
+        with open(ARCHIVO_PENDIENTES, 'rb') as f:
+            for linea in f:
+                if not linea.endswith(b'\n'):
+                    break
+                pendientes.append(json.loads(linea))
+
+        if ultimo_bloque is None and self.estado['indice'] > 0:
+            ultimo_bloque = self._leer_ultimo_bloque()
+        if ultimo_bloque is not None and isinstance(ultimo_bloque['datos'], list):
+            sellados = len(ultimo_bloque['datos'])
+            if [p['transaccion'] for p in pendientes[:sellados]] == ultimo_bloque['datos']:
+                pendientes = pendientes[sellados:]
+
+        self.pendientes = pendientes
+        self._claves_pendientes = {_clave_transaccion(p['transaccion']) for p in pendientes}
+        self._reescribir_pendientes()
+
+    def _leer_ultimo_bloque(self):
+        """Lee el último bloque del libro desde la cola del archivo"""
+        with open(ARCHIVO_LIBRO, 'rb') as f:
+            tamaño = f.seek(0, os.SEEK_END)
+            paso = 4096
+            while True:
+                inicio = max(0, tamaño - paso)
+                f.seek(inicio)
+                datos = f.read(tamaño - inicio)
+                lineas = datos.rstrip(b'\n').split(b'\n')
+                if len(lineas) > 1 or inicio == 0:
+                    return json.loads(lineas[-1])
+                paso *= 2
+
+    # ----- Estadísticas -----
+
+    def _acumular(self, bloque):
+        """Valida el enlace del bloque con el anterior y actualiza las estadísticas en O(1)"""
+        estadisticas = self.estado['estadisticas']
+        esperado = calcular_hash_libro(
+            bloque['indice'], bloque['timestamp'], bloque['datos'], bloque['hash_anterior'], bloque['nonce']
+        )
+        if bloque['indice'] == 0:
+            # El génesis no se mina
+            es_valido = (
+                self.estado['indice'] == -1
+                and bloque['hash_anterior'] == '0'
+                and bloque['hash'] == esperado
+            )
+        else:
+            es_valido = (
+                bloque['indice'] == self.estado['indice'] + 1
+                and bloque['hash_anterior'] == self.estado['hash']
+                and bloque['hash'] == esperado
+                and bloque['hash'].startswith("0" * DIFICULTAD_LIBRO)
+            )
+        estadisticas['es_valida'] = estadisticas['es_valida'] and es_valido
+        estadisticas['total_bloques'] += 1
+
+        if isinstance(bloque['datos'], list):
+            estadisticas['total_transacciones'] += len(bloque['datos'])
+            nuevos = []
+            for transaccion in bloque['datos']:
+                accion = transaccion.get('accion')
+                estadisticas['acciones_por_tipo'][accion] = estadisticas['acciones_por_tipo'].get(accion, 0) + 1
+                if transaccion['hash_documento'] not in self.documentos:
+                    self.documentos.add(transaccion['hash_documento'])
+                    nuevos.append(transaccion['hash_documento'])
+            if nuevos:
+                with open(ARCHIVO_DOCUMENTOS_LIBRO, 'a', encoding='utf-8') as f:
+                    f.write("".join(f"{hash_doc}\n" for hash_doc in nuevos))
+            estadisticas['documentos_unicos'] = len(self.documentos)
+
+        self.estado['indice'] = bloque['indice']
+        self.estado['hash'] = bloque['hash']
+
+    def _guardar_estado(self):
+        """Persiste el estado (estadísticas, punta del libro y tamaños de archivo)"""
+        escribir_atomico(ARCHIVO_ESTADO_LIBRO, json.dumps(self.estado, ensure_ascii=False).encode('utf-8'))
+
+    # ----- Reporte -----
+
+    def _encabezado(self, reserva):
+        """Encabezado del reporte (fecha y estadísticas) rellenado hasta 'reserva' bytes"""
+        estadisticas = _sangrar(json.dumps(self.estado['estadisticas'], indent=2, ensure_ascii=False), 2).lstrip()
+        texto = (
+            "{\n"
+            f'  "fecha_generacion": "{datetime.now().isoformat()}",\n'
+            f'  "estadisticas": {estadisticas},'
+        ).encode('utf-8')
+        if len(texto) > reserva:
+            return None
+        return texto + b" " * (reserva - len(texto))
+
+    def regenerar_reporte(self):
+        """Reescribe el reporte completo leyendo el libro línea por línea"""
+        with self._candado:
+            reserva = self.estado['reserva']
+            encabezado = self._encabezado(reserva)
+            while encabezado is None:
+                reserva *= 2
+                encabezado = self._encabezado(reserva)
+
+            ruta_temporal = f"{REPORTE_LIBRO}.tmp"
+            os.makedirs(os.path.dirname(REPORTE_LIBRO), exist_ok=True)
+            with open(ruta_temporal, 'wb') as reporte:
+                reporte.write(encabezado)
+                reporte.write(APERTURA_CADENA)
+                if os.path.exists(ARCHIVO_LIBRO):
+                    with open(ARCHIVO_LIBRO, 'rb') as libro:
+                        for numero, linea in enumerate(libro):
+                            if numero:
+                                reporte.write(b",\n")
+                            reporte.write(_formatear_bloque(json.loads(linea)))
+                reporte.write(CIERRE_REPORTE)
+                reporte.flush()
+                os.fsync(reporte.fileno())
+                tamaño = reporte.tell()
+            os.replace(ruta_temporal, REPORTE_LIBRO)
+
+            self.estado['reserva'] = reserva
+            self.estado['tamaño_reporte'] = tamaño
+
+    def _anexar_al_reporte(self, bloque, genesis=False):
+        """Agrega un bloque al final del reporte y reescribe el encabezado en su lugar"""
+        encabezado = self._encabezado(self.estado['reserva'])
+        if genesis or encabezado is None or not os.path.exists(REPORTE_LIBRO):
+            self.regenerar_reporte()
+            return
+
+        with open(REPORTE_LIBRO, 'r+b') as f:
+            f.seek(self.estado['tamaño_reporte'] - len(CIERRE_REPORTE))
+            f.write(b",\n" + _formatear_bloque(bloque) + CIERRE_REPORTE)
+            f.truncate()
+            tamaño = f.tell()
+            f.seek(0)
+            f.write(encabezado)
+            f.flush()
+            os.fsync(f.fileno())
+        self.estado['tamaño_reporte'] = tamaño
+
+    # ----- Bloques y transacciones -----
+
+    def _anexar_bloque(self, bloque, genesis=False):
+        """Anexa un bloque sellado al libro, las estadísticas y el reporte"""
+        linea = (json.dumps(bloque, ensure_ascii=False) + "\n").encode('utf-8')
+        with open(ARCHIVO_LIBRO, 'ab') as f:
+            f.write(linea)
+            f.flush()
+            os.fsync(f.fileno())
+        self._acumular(bloque)
+        self.estado['tamaño_libro'] += len(linea)
+        self._anexar_al_reporte(bloque, genesis=genesis)
+        self._guardar_estado()
+
+    def _reescribir_pendientes(self):
+        """Reescribe el archivo de transacciones en espera"""
+        ruta_temporal = f"{ARCHIVO_PENDIENTES}.tmp"
+        with open(ruta_temporal, 'wb') as f:
+            for pendiente in self.pendientes:
+                f.write((json.dumps(pendiente, ensure_ascii=False) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_temporal, ARCHIVO_PENDIENTES)
+
+    def registrar_transaccion(self, transaccion, sincronizar=True):
+        """Agrega una transacción al lote abierto y lo sella si está lleno o vencido.
+
+        Con sincronizar=False la línea se escribe sin fsync: la sincroniza sincronizar()
+        junto con el resto de las escrituras del punto de control. Una transacción que ya
+        está en espera (al rehacer el registro de transacciones) no se duplica.
+        """
+        with self._candado:
+            clave = _clave_transaccion(transaccion)
+            if clave in self._claves_pendientes:
+                return
+            pendiente = {'registrado': time.time(), 'transaccion': transaccion}
+            with open(ARCHIVO_PENDIENTES, 'ab') as f:
+                f.write((json.dumps(pendiente, ensure_ascii=False) + "\n").encode('utf-8'))
+                if sincronizar:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.pendientes.append(pendiente)
+            self._claves_pendientes.add(clave)
+            self.sellar_pendientes()
+
+    def sincronizar(self):
+        """Hace fsync del archivo de transacciones en espera"""
+        with self._candado:
+            if os.path.exists(ARCHIVO_PENDIENTES):
+                with open(ARCHIVO_PENDIENTES, 'ab') as f:
+                    os.fsync(f.fileno())
+
+    def claves_registradas(self):
+        """Claves (hash_documento, numero_bloque_original) de todas las transacciones del libro"""
+        with self._candado:
+            claves = set(self._claves_pendientes)
+            if os.path.exists(ARCHIVO_LIBRO):
+                with open(ARCHIVO_LIBRO, 'rb') as f:
+                    for linea in f:
+                        datos = json.loads(linea)['datos']
+                        if isinstance(datos, list):
+                            claves.update(_clave_transaccion(transaccion) for transaccion in datos)
+            return claves
+
+    def marcar_historial_importado(self):
+        """Registra en el estado que los bloques anteriores al libro ya se cargaron"""
+        with self._candado:
+            self.estado['historial_importado'] = True
+            self._guardar_estado()
+
+    def sellar_pendientes(self, forzar=False):
+        """Sella el lote abierto en un bloque; devuelve el bloque o None si aún no toca"""
+        with self._candado:
+            if not self.pendientes:
+                return None
+            vencido = time.time() - self.pendientes[0]['registrado'] >= VENTANA_LOTE
+            if not (forzar or vencido or len(self.pendientes) >= TAMAÑO_LOTE):
+                return None
+
+            lote = self.pendientes[:TAMAÑO_LOTE]
+            datos = [pendiente['transaccion'] for pendiente in lote]
+            indice = self.estado['indice'] + 1
+            timestamp = datetime.now().isoformat()
+            nonce, hash_bloque = minar_bloque(indice, timestamp, datos, self.estado['hash'])
+            bloque = {
+                'indice': indice,
+                'timestamp': timestamp,
+                'datos': datos,
+                'hash_anterior': self.estado['hash'],
+                'hash': hash_bloque,
+                'nonce': nonce
+            }
+            self._anexar_bloque(bloque)
+
+            self.pendientes = self.pendientes[len(lote):]
+            self._claves_pendientes.difference_update(_clave_transaccion(transaccion) for transaccion in datos)
+            self._reescribir_pendientes()
+            return bloque
+
+
+_libro_activo = {}
+
+def obtener_libro():
+    """Devuelve la instancia (única por proceso) del libro mayor"""
+    if 'libro' not in _libro_activo:
+        _libro_activo['libro'] = LibroMayor()
+    return _libro_activo['libro']
@@ -0,0 +1,419 @@
+import hashlib
+import os
+import threading
+from datetime import datetime
+
+from archivos import escribir_atomico
+from configuracion import ruta_datos, ruta_fragmentada
+
+# ==========================================
+# CONSTANTES DE MERKLE
+# ==========================================
+# Árbol por cadena: Merkle Mountain Range en orden post-orden, un nodo de 32 bytes por
+# posición, de solo anexar. Agregar un bloque escribe la hoja y los padres que cierra
+# (O(log n)) y una prueba de inclusión lee O(log n) nodos por posición.
+#
+# Árbol global: árbol binario completo en disposición de montículo (nodo i con hijos 2i y
+# 2i+1) sobre una ranura por documento; la hoja de cada documento compromete la raíz de
+# su cadena. Actualizar una ranura reescribe solo su camino hasta la raíz (O(log N)).
+
+DIRECTORIO_MERKLE = ruta_datos("merkle")
+TAMAÑO_NODO = 32
+NODO_VACIO = bytes(TAMAÑO_NODO)
+
+_candado_merkle = threading.RLock()
+_ranuras = {'posicion': 0, 'lista': [], 'indices': {}}
+
+def ruta_arbol_cadena(hash_doc):
+    """Devuelve la ruta del árbol Merkle de una cadena (junto a la cadena, o la plana si no se migró)"""
+    ruta = ruta_fragmentada(hash_doc, f"{hash_doc[:16]}.mmr")
+    ruta_plana = os.path.join(DIRECTORIO_MERKLE, f"{hash_doc[:16]}.mmr")
+    if not os.path.exists(ruta) and os.path.exists(ruta_plana):
+        return ruta_plana
+    return ruta
+
+def migrar_arbol_cadena(hash16):
+    """Mueve el árbol plano de una cadena a su subdirectorio"""
+    with _candado_merkle:
+        ruta_plana = os.path.join(DIRECTORIO_MERKLE, f"{hash16}.mmr")
+        if os.path.exists(ruta_plana):
+            ruta = ruta_fragmentada(hash16, f"{hash16}.mmr")
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            os.replace(ruta_plana, ruta)
+
+def candado_arboles():
+    """Candado de los archivos Merkle (para coordinar la migración con las escrituras)"""
+    return _candado_merkle
+
+def ruta_arbol_global():
+    """Devuelve la ruta del árbol Merkle global sobre las cadenas"""
+    return os.path.join(DIRECTORIO_MERKLE, "global.bin")
+
+def ruta_ranuras():
+    """Devuelve la ruta de la lista de ranuras (un hash de documento por línea)"""
+    return os.path.join(DIRECTORIO_MERKLE, "ranuras.txt")
+
+def ruta_sello():
+    """Devuelve la ruta de la raíz global sellada tras la última verificación completa"""
+    return os.path.join(DIRECTORIO_MERKLE, "sello.txt")
+
+def hash_hoja(dato):
+    """Hash de una hoja (prefijo 0x00 para separarla de los nodos internos)"""
+    return hashlib.sha256(b'\x00' + dato).digest()
+
+def hash_nodo(izquierdo, derecho):
+    """Hash de un nodo interno (prefijo 0x01)"""
+    return hashlib.sha256(b'\x01' + izquierdo + derecho).digest()
+
+def _escribir_sincronizado(ruta, datos, modo='ab'):
+    """Escribe datos en un archivo y hace fsync"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, modo) as f:
+        f.write(datos)
+        f.flush()
+        os.fsync(f.fileno())
+
+# ==========================================
+# ÁRBOL POR CADENA (MERKLE MOUNTAIN RANGE)
+# ==========================================
+
+def _nodos_para(hojas):
+    """Cantidad de nodos de un MMR con el número de hojas indicado"""
+    return 2 * hojas - bin(hojas).count('1')
+
+def _hojas_para(nodos):
+    """Mayor número de hojas cuyo MMR cabe en la cantidad de nodos indicada"""
+    bajo, alto = 0, nodos
+    while bajo < alto:
+        medio = (bajo + alto + 1) // 2
+        if _nodos_para(medio) <= nodos:
+            bajo = medio
+        else:
+            alto = medio - 1
+    return bajo
+
+def _picos(hojas):
+    """Devuelve (posición, altura, primera_hoja) de cada pico, de izquierda a derecha"""
+    picos = []
+    inicio = 0
+    primera_hoja = 0
+    for altura in range(hojas.bit_length() - 1, -1, -1):
+        if hojas & (1 << altura):
+            tamaño = (1 << (altura + 1)) - 1
+            picos.append((inicio + tamaño - 1, altura, primera_hoja))
+            inicio += tamaño
+            primera_hoja += 1 << altura
+    return picos
+
+def _leer_nodo(f, posicion):
+    """Lee el nodo de una posición del archivo del árbol"""
+    f.seek(posicion * TAMAÑO_NODO)
+    return f.read(TAMAÑO_NODO)
+
+def contar_hojas(hash_doc):
+    """Número de bloques registrados en el árbol de una cadena"""
+    try:
+        return _hojas_para(os.path.getsize(ruta_arbol_cadena(hash_doc)) // TAMAÑO_NODO)
+    except OSError:
+        return 0
+
+def _agregar_hoja(f, hojas, hash_bloque):
+    """Anexa una hoja y los padres que completa; devuelve los bytes a escribir"""
+    nuevos = []
+    posicion = _nodos_para(hojas)
+    actual = hash_hoja(hash_bloque.encode())
+    nuevos.append(actual)
+
+    # Cada bit 1 al final de 'hojas' es un pico existente de la misma altura que se fusiona
+    altura = 0
+    while hojas & (1 << altura):
+        izquierdo = _leer_nodo(f, posicion - ((1 << (altura + 1)) - 1))
+        actual = hash_nodo(izquierdo, actual)
+        nuevos.append(actual)
+        posicion += 1
+        altura += 1
+    return b''.join(nuevos)
+
+def agregar_bloque_cadena(hash_doc, hash_bloque):
+    """Agrega el hash de un bloque al árbol de su cadena y devuelve la nueva raíz"""
+    with _candado_merkle:
+        ruta = ruta_arbol_cadena(hash_doc)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'ab+') as f:
+            f.seek(0, os.SEEK_END)
+            nodos = f.tell() // TAMAÑO_NODO
+            hojas = _hojas_para(nodos)
+
+            # Descartar nodos de una escritura interrumpida
+            if f.tell() != _nodos_para(hojas) * TAMAÑO_NODO:
+                f.truncate(_nodos_para(hojas) * TAMAÑO_NODO)
+
+            f.write(_agregar_hoja(f, hojas, hash_bloque))
+            f.flush()
+            os.fsync(f.fileno())
+        return raiz_cadena(hash_doc)
+
+def reconstruir_arbol_cadena(hash_doc, hashes_bloques):
+    """Reconstruye el árbol de una cadena a partir de los hashes de sus bloques"""
+    with _candado_merkle:
+        ruta = ruta_arbol_cadena(hash_doc)
+        ruta_temporal = f"{ruta}.tmp"
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta_temporal, 'wb+') as f:
+            for hojas, hash_bloque in enumerate(hashes_bloques):
+                nuevos = _agregar_hoja(f, hojas, hash_bloque)
+                f.seek(0, os.SEEK_END)
+                f.write(nuevos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_temporal, ruta)
+
+def _raiz_desde_picos(valores):
+    """Combina los picos de derecha a izquierda en una sola raíz"""
+    if not valores:
+        return NODO_VACIO
+    raiz = valores[-1]
+    for valor in reversed(valores[:-1]):
+        raiz = hash_nodo(valor, raiz)
+    return raiz
+
+def raiz_cadena(hash_doc, en_bytes=True):
+    """Devuelve la raíz Merkle de la cadena de un documento"""
+    ruta = ruta_arbol_cadena(hash_doc)
+    hojas = contar_hojas(hash_doc)
+    if hojas == 0:
+        raiz = NODO_VACIO
+    else:
+        with open(ruta, 'rb') as f:
+            raiz = _raiz_desde_picos([_leer_nodo(f, posicion) for posicion, _, _ in _picos(hojas)])
+    return raiz if en_bytes else raiz.hex()
+
+def prueba_inclusion(hash_doc, numero_bloque):
+    """Genera la prueba de inclusión O(log n) de un bloque en la raíz de su cadena"""
+    hojas = contar_hojas(hash_doc)
+    if numero_bloque < 0 or numero_bloque >= hojas:
+        return None
+
+    camino = []
+    with open(ruta_arbol_cadena(hash_doc), 'rb') as f:
+        picos = _picos(hojas)
+        inicio = 0
+        for indice_pico, (posicion_pico, altura, primera_hoja) in enumerate(picos):
+            if numero_bloque < primera_hoja + (1 << altura):
+                break
+            inicio = posicion_pico + 1
+
+        # Descender dentro del pico registrando los hermanos
+        hermanos = []
+        hoja_relativa = numero_bloque - primera_hoja
+        while altura > 0:
+            tamaño_hijo = (1 << altura) - 1
+            mitad = 1 << (altura - 1)
+            if hoja_relativa < mitad:
+                hermanos.append(('derecha', _leer_nodo(f, inicio + 2 * tamaño_hijo - 1)))
+            else:
+                hermanos.append(('izquierda', _leer_nodo(f, inicio + tamaño_hijo - 1)))
+                inicio += tamaño_hijo
+                hoja_relativa -= mitad
+            altura -= 1
+        camino.extend(reversed(hermanos))
+
+        # Combinar con los demás picos en el mismo orden que _raiz_desde_picos
+        valores_picos = [_leer_nodo(f, posicion) for posicion, _, _ in picos]
+        if indice_pico < len(picos) - 1:
+            camino.append(('derecha', _raiz_desde_picos(valores_picos[indice_pico + 1:])))
+        for valor in reversed(valores_picos[:indice_pico]):
+            camino.append(('izquierda', valor))
+
+    return {
+        'hash_documento': hash_doc,
+        'numero_bloque': numero_bloque,
+        'total_bloques': hojas,
+        'camino': [(lado, valor.hex()) for lado, valor in camino]
+    }
+
+def verificar_prueba(hoja, camino, raiz_esperada):
+    """Recorre un camino de inclusión desde el hash de la hoja y lo compara con la raíz"""
+    actual = hoja
+    for lado, valor in camino:
+        hermano = bytes.fromhex(valor)
+        actual = hash_nodo(hermano, actual) if lado == 'izquierda' else hash_nodo(actual, hermano)
+    return actual.hex() == raiz_esperada
+
+def verificar_prueba_bloque(hash_bloque, prueba, raiz_esperada):
+    """Verifica que un bloque pertenece a la cadena cuya raíz es raiz_esperada"""
+    return verificar_prueba(hash_hoja(hash_bloque.encode()), prueba['camino'], raiz_esperada)
+
+# ==========================================
+# ÁRBOL GLOBAL SOBRE LAS CADENAS
+# ==========================================
+
+def _cargar_ranuras():
+    """Lee las ranuras nuevas (un documento por línea, la ranura es el número de línea)"""
+    ruta = ruta_ranuras()
+    if not os.path.exists(ruta):
+        _ranuras.update(posicion=0, lista=[], indices={})
+        return _ranuras
+    tamaño = os.path.getsize(ruta)
+    if tamaño < _ranuras['posicion']:
+        _ranuras.update(posicion=0, lista=[], indices={})
+    if tamaño > _ranuras['posicion']:
+        with open(ruta, 'rb') as f:
+            f.seek(_ranuras['posicion'])
+            datos = f.read(tamaño - _ranuras['posicion'])
+        fin = datos.rfind(b'\n')
+        for linea in datos[:fin + 1].decode('utf-8').splitlines():
+            if linea and linea not in _ranuras['indices']:
+                _ranuras['indices'][linea] = len(_ranuras['lista'])
+                _ranuras['lista'].append(linea)
+        _ranuras['posicion'] += fin + 1
+    return _ranuras
+
+def _hoja_global(hash_doc, raiz):
+    """Hoja del árbol global: compromete el documento y la raíz de su cadena"""
+    return hash_hoja(hash_doc.encode() + raiz)
+
+def _capacidad_global():
+    """Cantidad de hojas del árbol global según el tamaño del archivo"""
+    try:
+        nodos = os.path.getsize(ruta_arbol_global()) // TAMAÑO_NODO
+    except OSError:
+        return 0
+    return (nodos + 1) // 2
+
+def _padre_global(izquierdo, derecho):
+    """Nodo interno del árbol global (dos subárboles vacíos dan un nodo vacío)"""
+    if izquierdo == NODO_VACIO and derecho == NODO_VACIO:
+        return NODO_VACIO
+    return hash_nodo(izquierdo, derecho)
+
+def _construir_arbol_global(hojas, capacidad):
+    """Construye en memoria el arreglo de nodos (índices 1..2C-1) del árbol global"""
+    nodos = [NODO_VACIO] * (2 * capacidad)
+    for ranura, hoja in enumerate(hojas):
+        nodos[capacidad + ranura] = hoja
+    for indice in range(capacidad - 1, 0, -1):
+        nodos[indice] = _padre_global(nodos[2 * indice], nodos[2 * indice + 1])
+    return nodos
+
+def _escribir_arbol_global(nodos):
+    """Publica el árbol global completo con un reemplazo atómico"""
+    os.makedirs(DIRECTORIO_MERKLE, exist_ok=True)
+    escribir_atomico(ruta_arbol_global(), b''.join(nodos[1:]))
+
+def actualizar_documento_global(hash_doc, raiz):
+    """Actualiza la hoja de un documento y su camino hasta la raíz global"""
+    with _candado_merkle:
+        ranuras = _cargar_ranuras()
+        if hash_doc not in ranuras['indices']:
+            _escribir_sincronizado(ruta_ranuras(), f"{hash_doc}\n".encode('utf-8'))
+            ranuras = _cargar_ranuras()
+        ranura = ranuras['indices'][hash_doc]
+        capacidad = _capacidad_global()
+
+        if ranura >= capacidad:
+            # Duplicar la capacidad (costo amortizado constante por documento)
+            nueva_capacidad = max(1, capacidad)
+            while nueva_capacidad <= ranura:
+                nueva_capacidad *= 2
+            hojas = []
+            if capacidad:
+                with open(ruta_arbol_global(), 'rb') as f:
+                    hojas = [_leer_nodo(f, capacidad + i - 1) for i in range(capacidad)]
+            hojas += [NODO_VACIO] * (ranura + 1 - len(hojas))
+            hojas[ranura] = _hoja_global(hash_doc, raiz)
+            _escribir_arbol_global(_construir_arbol_global(hojas, nueva_capacidad))
+            return
+
+        # Reescribir solo el camino de la hoja a la raíz
+        with open(ruta_arbol_global(), 'r+b') as f:
+            indice = capacidad + ranura
+            actual = _hoja_global(hash_doc, raiz)
+            f.seek((indice - 1) * TAMAÑO_NODO)
+            f.write(actual)
+            while indice > 1:
+                hermano = _leer_nodo(f, (indice ^ 1) - 1)
+                actual = _padre_global(actual, hermano) if indice % 2 == 0 else _padre_global(hermano, actual)
+                indice //= 2
+                f.seek((indice - 1) * TAMAÑO_NODO)
+                f.write(actual)
+            f.flush()
+            os.fsync(f.fileno())
+
+def raiz_global():
+    """Devuelve la raíz Merkle global (hexadecimal) sobre todas las cadenas"""
+    if _capacidad_global() == 0:
+        return NODO_VACIO.hex()
+    with open(ruta_arbol_global(), 'rb') as f:
+        return f.read(TAMAÑO_NODO).hex()
+
+def prueba_inclusion_global(hash_doc):
+    """Genera la prueba O(log N) de que la raíz de una cadena está en la raíz global"""
+    with _candado_merkle:
+        ranuras = _cargar_ranuras()
+    if hash_doc not in ranuras['indices']:
+        return None
+
+    capacidad = _capacidad_global()
+    camino = []
+    with open(ruta_arbol_global(), 'rb') as f:
+        indice = capacidad + ranuras['indices'][hash_doc]
+        while indice > 1:
+            hermano = _leer_nodo(f, (indice ^ 1) - 1)
+            camino.append(('derecha' if indice % 2 == 0 else 'izquierda', hermano))
+            indice //= 2
+
+    return {
+        'hash_documento': hash_doc,
+        'raiz_cadena': raiz_cadena(hash_doc, en_bytes=False),
+        'camino': [(lado, valor.hex()) for lado, valor in camino]
+    }
+
+def verificar_prueba_global(prueba, raiz_esperada):
+    """Verifica que la raíz de una cadena está comprometida en la raíz global"""
+    actual = _hoja_global(prueba['hash_documento'], bytes.fromhex(prueba['raiz_cadena']))
+    for lado, valor in prueba['camino']:
+        hermano = bytes.fromhex(valor)
+        if lado == 'izquierda':
+            actual = _padre_global(hermano, actual)
+        else:
+            actual = _padre_global(actual, hermano)
+    return actual.hex() == raiz_esperada
+
+def reconstruir_arbol_global():
+    """Reconstruye el árbol global a partir de las raíces de todas las cadenas"""
+    with _candado_merkle:
+        ranuras = _cargar_ranuras()
+        hojas = [_hoja_global(hash_doc, raiz_cadena(hash_doc)) for hash_doc in ranuras['lista']]
+        capacidad = 1
+        while capacidad < len(hojas):
+            capacidad *= 2
+        if hojas:
+            _escribir_arbol_global(_construir_arbol_global(hojas, capacidad))
+
+# ==========================================
+# REGISTRO DE BLOQUES Y SELLO
+# ==========================================
+
+def registrar_bloque(hash_doc, hash_bloque):
+    """Agrega un bloque al árbol de su cadena y propaga la nueva raíz al árbol global"""
+    with _candado_merkle:
+        raiz = agregar_bloque_cadena(hash_doc, hash_bloque)
+        actualizar_documento_global(hash_doc, raiz)
+        return raiz
+
+def sellar_raiz_global():
+    """Guarda la raíz global actual como la última verificada"""
+    raiz = raiz_global()
+    contenido = f"{raiz},{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n".encode('utf-8')
+    os.makedirs(DIRECTORIO_MERKLE, exist_ok=True)
+    escribir_atomico(ruta_sello(), contenido)
+    return raiz
+
+def obtener_sello():
+    """Devuelve (raíz sellada, fecha) o (None, None) si nunca se selló"""
+    if not os.path.exists(ruta_sello()):
+        return None, None
+    with open(ruta_sello(), 'r', encoding='utf-8') as f:
+        raiz, fecha = f.read().strip().split(',', 1)
+    return raiz, fecha
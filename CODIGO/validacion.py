@@ -0,0 +1,382 @@
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import merkle
+from almacenamiento import (obtener_backend, sincronizar_arboles_merkle, aplicar_bloque,
+                            calcular_hash_acumulado)
+
+# ==========================================
+# VALIDACIÓN DE CADENAS
+# ==========================================
+
+def calcular_hash_bloque(bloque):
+    """Calcula el hash SHA-256 de un bloque"""
+    bloque_string = f"{bloque['numero_bloque']}{bloque['hash_documento']}{bloque['timestamp']}{bloque['accion']}{bloque['hash_bloque_anterior']}"
+    return hashlib.sha256(bloque_string.encode()).hexdigest()
+
+def validar_bloques(bloques, numero_anterior=-1, hash_anterior='0'):
+    """Valida en una sola pasada una secuencia ordenada de bloques.
+
+    numero_anterior y hash_anterior describen el bloque que precede al primero de la
+    secuencia (por defecto, la posición previa al génesis). Devuelve
+    (es_valida, mensaje, numero_ultimo, hash_ultimo).
+    """
+    for bloque in bloques:
+        numero = int(bloque['numero_bloque'])
+
+        # Validar hash del bloque
+        if calcular_hash_bloque(bloque) != bloque['hash_bloque']:
+            return False, f"Hash inválido en bloque {numero}", numero_anterior, hash_anterior
+
+        # Validar la secuencia y el enlace con el bloque anterior
+        if numero != numero_anterior + 1:
+            return False, f"Bloque faltante antes del bloque {numero}", numero_anterior, hash_anterior
+        if str(bloque['hash_bloque_anterior']) != str(hash_anterior):
+            return False, f"Enlace roto en bloque {numero}", numero_anterior, hash_anterior
+
+        numero_anterior, hash_anterior = numero, bloque['hash_bloque']
+
+    return True, "Cadena íntegra", numero_anterior, hash_anterior
+
+def calcular_hashes_bloques(df_bloques):
+    """Calcula el hash de todos los bloques de un DataFrame armando las cadenas por columna"""
+    cadenas = (
+        df_bloques['numero_bloque'].astype(str)
+        + df_bloques['hash_documento'].astype(str)
+        + df_bloques['timestamp'].astype(str)
+        + df_bloques['accion'].astype(str)
+        + df_bloques['hash_bloque_anterior'].astype(str)
+    )
+    sha256 = hashlib.sha256
+    return np.array([sha256(cadena.encode()).hexdigest() for cadena in cadenas], dtype=object)
+
+def validar_cadenas_df(df_bloques, anteriores=None, documentos=None):
+    """Valida por columnas una o varias cadenas concatenadas (bloques de cada documento
+    contiguos y ordenados por número).
+
+    documentos indica a qué cadena pertenece cada fila (por defecto, su hash_documento) y
+    anteriores, por documento, el (numero, hash) que precede a su primer bloque. Devuelve
+    {documento: (es_valida, mensaje, numero_ultimo, hash_ultimo, bloques)} con los mismos
+    mensajes que validar_bloques.
+    """
+    if df_bloques.empty:
+        return {}
+    anteriores = anteriores or {}
+
+    if documentos is None:
+        documentos = df_bloques['hash_documento']
+    documentos = np.asarray(documentos, dtype=object).astype(str)
+    numeros = df_bloques['numero_bloque'].astype(np.int64).to_numpy()
+    hashes = df_bloques['hash_bloque'].astype(str).to_numpy()
+    enlaces = df_bloques['hash_bloque_anterior'].astype(str).to_numpy()
+
+    # Bloque previo de cada fila: la fila anterior si es del mismo documento y, en la
+    # primera fila de cada documento, el valor de 'anteriores' (o la posición previa al génesis)
+    mismo_documento = np.zeros(len(documentos), dtype=bool)
+    mismo_documento[1:] = documentos[1:] == documentos[:-1]
+    numeros_previos = np.empty(len(numeros), dtype=np.int64)
+    numeros_previos[1:] = numeros[:-1]
+    hashes_previos = np.empty(len(hashes), dtype=object)
+    hashes_previos[1:] = hashes[:-1]
+    for fila in np.flatnonzero(~mismo_documento):
+        numeros_previos[fila], hashes_previos[fila] = anteriores.get(documentos[fila], (-1, '0'))
+        hashes_previos[fila] = str(hashes_previos[fila])
+
+    hash_invalido = calcular_hashes_bloques(df_bloques) != hashes
+    bloque_faltante = numeros != numeros_previos + 1
+    enlace_roto = enlaces != hashes_previos
+
+    # Última fila de cada documento y primera fila con algún fallo
+    ultimas = {}
+    for fila in np.flatnonzero(np.append(documentos[1:] != documentos[:-1], True)):
+        ultimas[documentos[fila]] = fila
+    primeras = np.flatnonzero(~mismo_documento)
+    conteos = np.diff(np.append(primeras, len(documentos)))
+    bloques_por_documento = dict(zip(documentos[primeras], conteos))
+
+    fallos = {}
+    for fila in np.flatnonzero(hash_invalido | bloque_faltante | enlace_roto):
+        if documentos[fila] in fallos:
+            continue
+        numero = int(numeros[fila])
+        if hash_invalido[fila]:
+            mensaje = f"Hash inválido en bloque {numero}"
+        elif bloque_faltante[fila]:
+            mensaje = f"Bloque faltante antes del bloque {numero}"
+        else:
+            mensaje = f"Enlace roto en bloque {numero}"
+        fallos[documentos[fila]] = (False, mensaje, int(numeros_previos[fila]), hashes_previos[fila])
+
+    resultados = {}
+    for documento, fila in ultimas.items():
+        resultado = fallos.get(documento, (True, "Cadena íntegra", int(numeros[fila]), hashes[fila]))
+        resultados[documento] = resultado + (int(bloques_por_documento[documento]),)
+    return resultados
+
+def _validar_cadena(hash_doc, completa=False):
+    """Valida una cadena sin guardar el punto de control.
+
+    Devuelve (es_valida, mensaje, numero_ultimo, hash_ultimo, numero_control, bloques_validados).
+    """
+    backend = obtener_backend()
+    punto_control = None if completa else backend.obtener_punto_control(hash_doc)
+
+    if punto_control is not None:
+        numero_control = punto_control['numero_bloque']
+        bloques = backend.cargar_bloques_desde(hash_doc, numero_control)
+        if not bloques:
+            return False, f"Cadena truncada antes del bloque {numero_control} (punto de control)", None, None, numero_control, 0
+
+        # Comparación con la punta validada anteriormente
+        bloque_control = bloques[0]
+        if (int(bloque_control['numero_bloque']) != numero_control
+                or bloque_control['hash_bloque'] != punto_control['hash_bloque']
+                or calcular_hash_bloque(bloque_control) != punto_control['hash_bloque']):
+            mensaje = f"Cadena alterada hasta el bloque {numero_control} (no coincide con el punto de control)"
+            return False, mensaje, None, None, numero_control, 1
+
+        es_valida, mensaje, numero_ultimo, hash_ultimo = validar_bloques(
+            bloques[1:], numero_control, punto_control['hash_bloque']
+        )
+        return es_valida, mensaje, numero_ultimo, hash_ultimo, numero_control, len(bloques)
+
+    # Sin punto de control: validar la cadena completa por columnas
+    df_blockchain = backend.cargar_blockchain(hash_doc)
+    if df_blockchain.empty:
+        return False, "Cadena no encontrada", None, None, None, 0
+    resultado = validar_cadenas_df(df_blockchain, documentos=[hash_doc] * len(df_blockchain))[hash_doc]
+    return resultado[:4] + (None, len(df_blockchain))
+
+def validar_cadena(hash_doc, completa=False):
+    """Valida la cadena de un documento a partir de su último punto de control.
+
+    Con un punto de control (bloque k con hash H) solo se recalculan el bloque k y los
+    posteriores: se detecta cualquier cambio desde k en adelante, pero no la edición de
+    un bloque anterior a k que conserve su hash_bloque guardado (el bloque k solo enlaza
+    con ese valor, no lo recalcula). Esos cambios solo los detecta completa=True, que
+    ignora el punto de control y recorre la cadena desde el génesis.
+    """
+    es_valida, mensaje, numero_ultimo, hash_ultimo, numero_control, _ = _validar_cadena(hash_doc, completa)
+
+    # Avanzar el punto de control hasta el último bloque validado
+    if es_valida and numero_ultimo != numero_control:
+        obtener_backend().guardar_punto_control(hash_doc, numero_ultimo, hash_ultimo)
+
+    return es_valida, mensaje
+
+def validar_desde_instantanea(hash_doc, instantanea=None):
+    """Valida la cadena a partir de una instantánea de confianza (por defecto, la más reciente).
+
+    Solo se leen y recalculan el bloque de la instantánea y los posteriores.
+    """
+    backend = obtener_backend()
+    instantanea = instantanea or backend.obtener_instantanea(hash_doc)
+    if instantanea is None:
+        return validar_cadena(hash_doc, completa=True)
+
+    numero = int(instantanea['numero_bloque'])
+    bloques = backend.cargar_bloques_desde(hash_doc, numero)
+    if (not bloques or int(bloques[0]['numero_bloque']) != numero
+            or bloques[0]['hash_bloque'] != instantanea['hash_bloque']
+            or calcular_hash_bloque(bloques[0]) != instantanea['hash_bloque']):
+        return False, f"La cadena no coincide con la instantánea del bloque {numero}"
+
+    es_valida, mensaje, _, _ = validar_bloques(bloques[1:], numero, instantanea['hash_bloque'])
+    return es_valida, mensaje
+
+def verificar_instantaneas(hash_doc):
+    """Reproduce la cadena completa y comprueba el estado y el hash acumulado de cada instantánea"""
+    backend = obtener_backend()
+    instantaneas = {}
+    instantanea = backend.obtener_instantanea(hash_doc)
+    while instantanea is not None:
+        instantaneas[int(instantanea['numero_bloque'])] = instantanea
+        instantanea = backend.obtener_instantanea(hash_doc, int(instantanea['numero_bloque']) - 1)
+    if not instantaneas:
+        return True, "Sin instantáneas"
+
+    estado = {}
+    hash_acumulado = '0'
+    for bloque in backend.cargar_bloques_desde(hash_doc, 0):
+        numero = int(bloque['numero_bloque'])
+        aplicar_bloque(estado, bloque)
+        hash_acumulado = calcular_hash_acumulado(hash_acumulado, bloque)
+        instantanea = instantaneas.pop(numero, None)
+        if instantanea is not None and (instantanea['hash_bloque'] != bloque['hash_bloque']
+                                        or instantanea['hash_acumulado'] != hash_acumulado
+                                        or instantanea['estado'] != estado):
+            return False, f"La instantánea del bloque {numero} no coincide con la cadena"
+
+    if instantaneas:
+        return False, f"Instantánea del bloque {min(instantaneas)} sin bloque correspondiente"
+    return True, "Instantáneas íntegras"
+
+# Resultado de la última validación de cada cadena, asociado a la cabeza con que se obtuvo
+_validaciones_en_cache = {}
+
+def validar_cadena_en_cache(hash_doc):
+    """Devuelve la validación de una cadena reutilizando el resultado si su cabeza no cambió"""
+    cabeza = obtener_backend().obtener_cabeza(hash_doc)
+    if cabeza is None:
+        return False, "Cadena no encontrada"
+    clave = (int(cabeza['numero_bloque']), cabeza['hash_bloque'], cabeza.get('tamaño'))
+    en_cache = _validaciones_en_cache.get(hash_doc)
+    if en_cache is not None and en_cache[0] == clave:
+        return en_cache[1]
+    resultado = validar_cadena(hash_doc)
+    _validaciones_en_cache[hash_doc] = (clave, resultado)
+    return resultado
+
+# ==========================================
+# VERIFICACIÓN PARALELA
+# ==========================================
+# Cada proceso del grupo valida un lote de cadenas y devuelve los resultados sin escribir;
+# el proceso principal guarda los puntos de control para no tener varios escritores
+# sobre el mismo índice. Los procesos se crean con "spawn" y no con fork: un hijo creado
+# con fork hereda, tomados, los candados del hilo escritor, de la migración o de los
+# documentos y puede quedar bloqueado para siempre.
+
+PROCESOS_VERIFICACION = int(os.environ.get("CLEIN_PROCESOS_VERIFICACION", os.cpu_count() or 1))
+
+def _validar_completas(hashes_docs):
+    """Valida un lote de cadenas completas concatenándolas en una sola pasada por columnas"""
+    backend = obtener_backend()
+    cadenas = []
+    for hash_doc in dict.fromkeys(hashes_docs):
+        df_blockchain = backend.cargar_blockchain(hash_doc)
+        if not df_blockchain.empty:
+            cadenas.append((hash_doc, df_blockchain))
+
+    resultados = {}
+    if cadenas:
+        df_lote = pd.concat([df for _, df in cadenas], ignore_index=True)
+        documentos = np.concatenate([[hash_doc] * len(df) for hash_doc, df in cadenas])
+        for hash_doc, resultado in validar_cadenas_df(df_lote, documentos=documentos).items():
+            resultados[hash_doc] = resultado[:4] + (None, resultado[4])
+
+    return [
+        resultados.get(hash_doc, (False, "Cadena no encontrada", None, None, None, 0))
+        for hash_doc in hashes_docs
+    ]
+
+def _validar_lote(hashes_docs, completa):
+    """Valida un lote de cadenas dentro de un proceso del grupo"""
+    if completa:
+        validaciones = _validar_completas(hashes_docs)
+    else:
+        validaciones = [_validar_cadena(hash_doc) for hash_doc in hashes_docs]
+
+    resultados = []
+    for hash_doc, validacion in zip(hashes_docs, validaciones):
+        es_valida, mensaje, numero_ultimo, hash_ultimo, numero_control, bloques = validacion
+        resultados.append({
+            'hash_documento': hash_doc,
+            'es_valida': es_valida,
+            'mensaje': mensaje,
+            'bloques': bloques,
+            'sin_cadena': mensaje == "Cadena no encontrada",
+            'punto_control': (numero_ultimo, hash_ultimo) if es_valida and numero_ultimo != numero_control else None
+        })
+    return resultados
+
+def verificar_sistema_paralelo(hashes_docs, completa=True, procesos=None):
+    """Valida todas las cadenas en un grupo de procesos y produce cada resultado al terminar.
+
+    Produce (resultado, metricas); metricas acumula cadenas, bloques, segundos,
+    cadenas_por_segundo y bloques_por_segundo hasta ese momento.
+    """
+    hashes_docs = list(hashes_docs)
+    procesos = max(1, procesos or PROCESOS_VERIFICACION)
+    backend = obtener_backend()
+    metricas = {'cadenas': 0, 'bloques': 0, 'segundos': 0.0, 'cadenas_por_segundo': 0.0, 'bloques_por_segundo': 0.0}
+    inicio = time.perf_counter()
+
+    def _publicar(resultado):
+        if resultado['punto_control'] is not None:
+            backend.guardar_punto_control(resultado['hash_documento'], *resultado['punto_control'])
+        metricas['cadenas'] += 1
+        metricas['bloques'] += resultado['bloques']
+        metricas['segundos'] = max(time.perf_counter() - inicio, 1e-9)
+        metricas['cadenas_por_segundo'] = metricas['cadenas'] / metricas['segundos']
+        metricas['bloques_por_segundo'] = metricas['bloques'] / metricas['segundos']
+        return resultado, dict(metricas)
+
+    # Pocas cadenas o un solo proceso: no compensa arrancar el grupo
+    if procesos == 1 or len(hashes_docs) < 2 * procesos:
+        for hash_doc in hashes_docs:
+            yield _publicar(_validar_lote([hash_doc], completa)[0])
+        return
+
+    tamaño_lote = max(1, min(64, len(hashes_docs) // (procesos * 4)))
+    lotes = [hashes_docs[i:i + tamaño_lote] for i in range(0, len(hashes_docs), tamaño_lote)]
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn")) as grupo:
+        futuros = [grupo.submit(_validar_lote, lote, completa) for lote in lotes]
+        for futuro in as_completed(futuros):
+            for resultado in futuro.result():
+                yield _publicar(resultado)
+
+# ==========================================
+# ESTADO GLOBAL (RAÍZ MERKLE)
+# ==========================================
+
+def sellar_sistema(hashes_docs):
+    """Sella la raíz global después de una verificación sin problemas"""
+    sincronizar_arboles_merkle(obtener_backend(), hashes_docs)
+    return merkle.sellar_raiz_global()
+
+def verificar_sistema(hashes_docs, completa=False):
+    """Valida todas las cadenas existentes y, si están íntegras, sella la raíz global.
+
+    Devuelve la lista de (hash_documento, mensaje) de las cadenas con problemas.
+    """
+    backend = obtener_backend()
+    problemas = []
+    for hash_doc in hashes_docs:
+        if backend.obtener_cabeza(hash_doc) is None:
+            continue
+        es_valida, mensaje = validar_cadena(hash_doc, completa=completa)
+        if not es_valida:
+            problemas.append((hash_doc, mensaje))
+
+    if not problemas:
+        sellar_sistema(hashes_docs)
+    return problemas
+
+def cabeza_en_sello(backend, hash_doc, raiz_sellada):
+    """Recalcula el último bloque de la cadena en disco y comprueba, con pruebas de
+    inclusión, que es la última hoja de su árbol y que ese árbol está en la raíz sellada"""
+    cabeza = backend.obtener_cabeza(hash_doc)
+    if cabeza is None:
+        return True
+    numero = int(cabeza['numero_bloque'])
+    bloques = backend.cargar_bloques_desde(hash_doc, numero)
+    if len(bloques) != 1 or calcular_hash_bloque(bloques[0]) != bloques[0]['hash_bloque']:
+        return False
+    prueba = merkle.prueba_inclusion(hash_doc, numero)
+    prueba_global = merkle.prueba_inclusion_global(hash_doc)
+    return (prueba is not None and prueba['total_bloques'] == numero + 1 and prueba_global is not None
+            and merkle.verificar_prueba_bloque(bloques[0]['hash_bloque'], prueba, prueba_global['raiz_cadena'])
+            and merkle.verificar_prueba_global(prueba_global, raiz_sellada))
+
+def estado_sistema(hashes_docs):
+    """Compara la raíz Merkle global con la sellada y la cabeza de cada cadena con su árbol.
+
+    Los árboles viven aparte de las cadenas: además de la raíz, se recalcula el último
+    bloque de cada cadena en disco y se comprueba que sea la última hoja de su árbol
+    (O(log n) por cadena). Si todo coincide no se revalida nada; si no, se validan las
+    cadenas (de forma incremental) y se vuelve a sellar. Un bloque intermedio editado
+    solo se detecta con la verificación completa. Devuelve (problemas, raiz_global).
+    """
+    backend = obtener_backend()
+    raiz_sellada, _ = merkle.obtener_sello()
+    if (raiz_sellada is not None and raiz_sellada == merkle.raiz_global()
+            and all(cabeza_en_sello(backend, hash_doc, raiz_sellada) for hash_doc in hashes_docs)):
+        return [], raiz_sellada
+    problemas = verificar_sistema(hashes_docs)
+    return problemas, merkle.raiz_global()
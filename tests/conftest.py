@@ -0,0 +1,80 @@
+import hashlib
+import importlib
+import os
+import subprocess
+import sys
+import textwrap
+from types import SimpleNamespace
+
+import pytest
+
+PRUEBAS = os.path.dirname(os.path.abspath(__file__))
+CODIGO = os.path.join(os.path.dirname(PRUEBAS), "CODIGO")
+sys.path.insert(0, CODIGO)
+
+# Módulos que leen las rutas del entorno al importarse (se vuelven a importar en cada prueba)
+MODULOS = ['configuracion', 'archivos', 'bitacora', 'merkle', 'libro_mayor', 'almacenamiento', 'validacion']
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    """Variables de entorno de una instalación vacía en un directorio temporal"""
+    monkeypatch.setenv("CLEIN_DIRECTORIO_DATOS", str(tmp_path / "datos"))
+    monkeypatch.setenv("CLEIN_DIRECTORIO_USUARIOS", str(tmp_path / "usuarios"))
+    monkeypatch.setenv("CLEIN_ARCHIVO_CLAVE_BITACORA", str(tmp_path / "clave" / "clave_bitacora.key"))
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join([CODIGO, PRUEBAS]))
+    for variable in ("CLEIN_CLAVE_BITACORA", "CLEIN_BACKEND", "CLEIN_FORMATO_CADENA"):
+        monkeypatch.delenv(variable, raising=False)
+    return tmp_path
+
+def importar_clein():
+    """Importa de nuevo los módulos de CODIGO contra las rutas del entorno actual"""
+    for nombre in MODULOS:
+        sys.modules.pop(nombre, None)
+    return SimpleNamespace(**{nombre: importlib.import_module(nombre) for nombre in MODULOS})
+
+def importar_aplicacion():
+    """Importa de nuevo la aplicación (clein.py) sobre los módulos importados por importar_clein"""
+    pytest.importorskip("streamlit")
+    sys.modules.pop('clein', None)
+    return importlib.import_module('clein')
+
+@pytest.fixture
+def clein(entorno):
+    """Módulos de CODIGO importados de nuevo contra el directorio temporal"""
+    yield importar_clein()
+    for nombre in MODULOS:
+        sys.modules.pop(nombre, None)
+
+@pytest.fixture
+def aplicacion(clein):
+    """Módulo de la aplicación (clein.py) importado sobre los módulos de la prueba"""
+    yield importar_aplicacion()
+    sys.modules.pop('clein', None)
+
+def ejecutar_proceso(codigo, directorio):
+    """Ejecuta código en otro proceso de Python con el mismo entorno (para simular cortes)"""
+    return subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(codigo)], cwd=directorio, env=dict(os.environ),
+        capture_output=True, text=True, timeout=120
+    )
+
+def hash_documento(nombre):
+    """Hash SHA-256 de un documento de prueba"""
+    return hashlib.sha256(nombre.encode('utf-8')).hexdigest()
+
+def nuevo_bloque(validacion, hash_doc, anterior=None, accion="Creado"):
+    """Bloque siguiente a 'anterior' (o el génesis) con su hash calculado"""
+    bloque = {
+        'numero_bloque': int(anterior['numero_bloque']) + 1 if anterior else 0,
+        'hash_documento': hash_doc,
+        'nombre_documento': "Procedimiento de prueba",
+        'tipo': "Procedimiento",
+        'estatus': "Borrador",
+        'timestamp': "2025-08-01 10:00:00",
+        'accion': accion,
+        'hash_bloque_anterior': anterior['hash_bloque'] if anterior else '0',
+        'modificacion': 'Revisión con "comillas", comas\ny saltos de línea',
+        'usuario_accion': "pruebas"
+    }
+    bloque['hash_bloque'] = validacion.calcular_hash_bloque(bloque)
+    return bloque
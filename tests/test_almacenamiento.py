@@ -0,0 +1,498 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import ejecutar_proceso, hash_documento, importar_clein, nuevo_bloque
+
+# ==========================================
+# ARCHIVOS DE CADENA (SOLO ANEXAR)
+# ==========================================
+
+@pytest.mark.parametrize("corte", ["inicio", "salto_entre_comillas", "sin_salto_final"])
+def test_fila_incompleta_al_final_se_descarta(clein, corte):
+    """Una fila cortada por una escritura interrumpida no cuenta como cabeza y se trunca al anexar"""
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    hash_doc = hash_documento("cola incompleta")
+    genesis = nuevo_bloque(validacion, hash_doc)
+    siguiente = nuevo_bloque(validacion, hash_doc, genesis, accion="Publicado")
+    almacenamiento.anexar_bloque(hash_doc, genesis)
+    ruta = almacenamiento.ruta_blockchain(hash_doc)
+    tamaño_genesis = os.path.getsize(ruta)
+    almacenamiento.anexar_bloque(hash_doc, siguiente)
+
+    # Dejar solo una parte de la segunda fila, como tras un corte de energía
+    with open(ruta, 'rb') as f:
+        fila = f.read()[tamaño_genesis:]
+    largo = {'inicio': 5, 'salto_entre_comillas': fila.index(b'\n') + 1, 'sin_salto_final': len(fila) - 1}[corte]
+    with open(ruta, 'rb+') as f:
+        f.truncate(tamaño_genesis + largo)
+
+    assert almacenamiento.obtener_cabeza(hash_doc)['numero_bloque'] == 0
+
+    almacenamiento.anexar_bloque(hash_doc, siguiente)
+
+    df_blockchain = almacenamiento.obtener_backend().cargar_blockchain(hash_doc)
+    assert df_blockchain['numero_bloque'].tolist() == [0, 1]
+    assert df_blockchain['modificacion'].tolist() == [genesis['modificacion']] * 2
+    assert almacenamiento.obtener_cabeza(hash_doc)['hash_bloque'] == siguiente['hash_bloque']
+    assert validacion.validar_cadena(hash_doc, completa=True)[0]
+
+def test_ultimo_bloque_se_lee_desde_el_final(clein):
+    """leer_ultimo_bloque reconoce la última fila aunque un comentario tenga saltos de línea"""
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    hash_doc = hash_documento("lectura inversa")
+    anterior = None
+    for accion in ("Creado", "Publicado", "Revisado"):
+        anterior = nuevo_bloque(validacion, hash_doc, anterior, accion)
+        almacenamiento.anexar_bloque(hash_doc, anterior)
+
+    ruta = almacenamiento.ruta_blockchain(hash_doc)
+    ultimo = almacenamiento.leer_ultimo_bloque(ruta)
+    assert ultimo['numero_bloque'] == '2'
+    assert ultimo['accion'] == "Revisado"
+    assert ultimo['modificacion'] == anterior['modificacion']
+    assert [b['accion'] for b in almacenamiento.iterar_bloques_inverso(ruta)] == ["Revisado", "Publicado", "Creado"]
+
+# ==========================================
+# FORMATO BINARIO DE CADENA
+# ==========================================
+
+def _bloque_leido(almacenamiento, bloque):
+    """Bloque como lo devuelve la lectura binaria (número entero y textos, vacíos como '')"""
+    return {col: (int(bloque[col]) if col == 'numero_bloque' else str(bloque.get(col, '')))
+            for col in almacenamiento.COLUMNAS_BLOQUE}
+
+def test_cadena_binaria_se_lee_igual_que_se_escribio(clein, monkeypatch):
+    """Los registros .blk y el diccionario .dic devuelven los mismos bloques escritos"""
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    monkeypatch.setattr(almacenamiento, 'FORMATO_CADENA', 'binario')
+    hash_doc = hash_documento("formato binario")
+    bloques = []
+    for accion in ("Creado", "Publicado", "Aprobado"):
+        bloques.append(nuevo_bloque(validacion, hash_doc, bloques[-1] if bloques else None, accion))
+        almacenamiento.anexar_bloque(hash_doc, bloques[-1])
+
+    ruta = almacenamiento.ruta_blockchain(hash_doc)
+    assert ruta.endswith(almacenamiento.EXTENSION_BINARIA)
+    assert os.path.getsize(ruta) == almacenamiento.FORMATO_CABECERA.size + 3 * almacenamiento.FORMATO_REGISTRO.size
+
+    # Los textos repetidos se guardan una sola vez en el diccionario
+    with open(almacenamiento.ruta_diccionario(ruta), 'rb') as f:
+        assert f.read().count(bloques[0]['modificacion'].encode('utf-8')) == 1
+
+    esperados = [_bloque_leido(almacenamiento, bloque) for bloque in bloques]
+    assert almacenamiento.leer_cadena_binaria(ruta).to_dict('records') == esperados
+    assert almacenamiento.leer_bloque_binario(ruta, 1) == esperados[1]
+    assert almacenamiento.leer_bloque_binario(ruta, 3) is None
+    assert list(almacenamiento.iterar_bloques_inverso(ruta)) == esperados[::-1]
+    assert almacenamiento.obtener_cabeza(hash_doc)['hash_bloque'] == bloques[-1]['hash_bloque']
+    assert validacion.validar_cadena(hash_doc, completa=True)[0]
+
+def test_registro_binario_incompleto_se_descarta(clein, monkeypatch):
+    """Un registro a medio escribir no se cuenta y el siguiente anexo lo trunca"""
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    monkeypatch.setattr(almacenamiento, 'FORMATO_CADENA', 'binario')
+    hash_doc = hash_documento("binario incompleto")
+    genesis = nuevo_bloque(validacion, hash_doc)
+    almacenamiento.anexar_bloque(hash_doc, genesis)
+    ruta = almacenamiento.ruta_blockchain(hash_doc)
+    with open(ruta, 'ab') as f:
+        f.write(b'\x01\x00\x00')
+
+    assert almacenamiento.contar_bloques_binario(ruta) == 1
+    siguiente = nuevo_bloque(validacion, hash_doc, genesis, accion="Publicado")
+    almacenamiento.anexar_bloque(hash_doc, siguiente)
+    assert [b['hash_bloque'] for b in almacenamiento.leer_cadena_binaria(ruta).to_dict('records')] == [
+        genesis['hash_bloque'], siguiente['hash_bloque']
+    ]
+
+def test_convertir_cadena_csv_a_binaria(clein):
+    """La conversión conserva todos los bloques y reemplaza el CSV por el .blk"""
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    hash_doc = hash_documento("conversión")
+    bloques = []
+    for accion in ("Creado", "Revisado"):
+        bloques.append(nuevo_bloque(validacion, hash_doc, bloques[-1] if bloques else None, accion))
+        almacenamiento.anexar_bloque(hash_doc, bloques[-1])
+    ruta_csv = almacenamiento.ruta_blockchain(hash_doc)
+
+    assert almacenamiento.convertir_cadena_a_binaria(hash_doc)
+
+    ruta = almacenamiento.ruta_blockchain(hash_doc)
+    assert not os.path.exists(ruta_csv)
+    assert ruta.endswith(almacenamiento.EXTENSION_BINARIA)
+    assert almacenamiento.leer_cadena_binaria(ruta).to_dict('records') == [_bloque_leido(almacenamiento, b) for b in bloques]
+
+def test_migracion_convierte_cadena_a_binaria(aplicacion, clein, monkeypatch):
+    """Con el formato binario la migración convierte la cadena plana sin cambiar lo que lee la aplicación"""
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    hash_doc = hash_documento("migración a binario")
+    bloques = []
+    for accion in ("Creado", "Publicado", "Revisado"):
+        bloques.append(nuevo_bloque(validacion, hash_doc, bloques[-1] if bloques else None, accion))
+        if accion == "Publicado":
+            bloques[-1]['modificacion'] = ''
+            bloques[-1]['hash_bloque'] = validacion.calcular_hash_bloque(bloques[-1])
+        almacenamiento.anexar_bloque(hash_doc, bloques[-1])
+
+    # Dejar la cadena en la disposición plana, como antes de la fragmentación
+    ruta_csv = almacenamiento.ruta_blockchain(hash_doc)
+    os.replace(ruta_csv, almacenamiento.ruta_datos(os.path.basename(ruta_csv)))
+    df_csv = aplicacion.cargar_blockchain_documento(hash_doc)
+
+    monkeypatch.setattr(almacenamiento, 'FORMATO_CADENA', 'binario')
+    assert almacenamiento.migrar_cadenas_fragmentadas() == 1
+
+    ruta = almacenamiento.ruta_blockchain(hash_doc)
+    assert ruta.endswith(almacenamiento.EXTENSION_BINARIA)
+    assert not os.path.exists(almacenamiento.ruta_datos(os.path.basename(ruta_csv)))
+    df_binario = aplicacion.cargar_blockchain_documento(hash_doc)
+
+    # Mismas columnas lógicas; el CSV lee los textos vacíos como NaN y el binario como ''
+    assert df_binario.columns.tolist() == df_csv.columns.tolist() == almacenamiento.COLUMNAS_BLOQUE
+    assert df_binario['numero_bloque'].tolist() == df_csv['numero_bloque'].tolist() == [0, 1, 2]
+    assert (df_binario.to_dict('records') == df_csv.fillna('').astype(str)
+            .assign(numero_bloque=df_csv['numero_bloque']).to_dict('records'))
+    assert almacenamiento.obtener_cabeza(hash_doc)['hash_bloque'] == bloques[-1]['hash_bloque']
+    assert validacion.validar_cadena(hash_doc, completa=True)[0]
+
+# ==========================================
+# REGISTRO DE ESCRITURA ANTICIPADA
+# ==========================================
+
+# Primera transacción confirmada y aplicada: alta del documento, génesis y evento
+ALTA_DOCUMENTO = """
+    import os
+    import almacenamiento
+    import validacion
+    from conftest import hash_documento, nuevo_bloque
+
+    backend = almacenamiento.obtener_backend()
+    backend.recuperar()
+    hash_doc = hash_documento("registro de transacciones")
+    genesis = nuevo_bloque(validacion, hash_doc)
+    with almacenamiento.transaccion(backend) as actual:
+        actual.guardar_registro({'HASH': hash_doc, 'NOMBRE': "Procedimiento de prueba", 'ESTATUS': "Borrador"})
+        actual.anexar_bloque(hash_doc, genesis)
+        actual.registrar_bitacora({'hash': hash_doc, 'fecha_hora': "2025-08-01 10:00:00", 'accion': "Creado"})
+    siguiente = nuevo_bloque(validacion, hash_doc, genesis, accion="Publicado")
+    operaciones = [
+        {'tipo': 'registro', 'hash': hash_doc, 'cambios': {'ESTATUS': "Publicado"}},
+        {'tipo': 'bloque', 'hash': hash_doc, 'bloque': siguiente},
+        {'tipo': 'bitacora', 'evento': {'hash': hash_doc, 'fecha_hora': "2025-08-01 11:00:00", 'accion': "Publicado"}},
+    ]
+"""
+
+def test_transaccion_durable_se_rehace_tras_un_corte(entorno):
+    """Un corte después del fsync del registro de transacciones y antes de aplicarla no la pierde"""
+    resultado = ejecutar_proceso(ALTA_DOCUMENTO + """
+    def cortar(*args, **kwargs):
+        os._exit(3)
+
+    almacenamiento.RegistroTransacciones._aplicar = cortar
+    backend.confirmar_transaccion(operaciones)
+    """, entorno)
+    assert resultado.returncode == 3, resultado.stderr
+
+    clein = importar_clein()
+    backend = clein.almacenamiento.obtener_backend()
+    assert backend.recuperar() == 1
+
+    hash_doc = hash_documento("registro de transacciones")
+    assert backend.buscar_documento(hash_doc)['ESTATUS'] == "Publicado"
+    assert backend.obtener_cabeza(hash_doc)['accion'] == "Publicado"
+    assert clein.validacion.validar_cadena(hash_doc, completa=True)[0]
+    assert backend.cargar_bitacora(filtro_hash=hash_doc)['accion'].tolist() == ["Publicado", "Creado"]
+    assert os.path.getsize(clein.almacenamiento.ARCHIVO_TRANSACCIONES) == 0
+
+def test_transaccion_a_medio_escribir_se_descarta(entorno):
+    """Una línea incompleta al final del registro de transacciones no se aplica y se trunca"""
+    resultado = ejecutar_proceso(ALTA_DOCUMENTO + """
+    import hashlib
+    import json
+
+    contenido = json.dumps({'secuencia': 2, 'operaciones': operaciones}).encode('utf-8')
+    linea = hashlib.sha256(contenido).hexdigest().encode('ascii') + b' ' + contenido + b'\\n'
+    with open(almacenamiento.ARCHIVO_TRANSACCIONES, 'ab') as f:
+        f.write(linea[:len(linea) // 2])
+        f.flush()
+        os.fsync(f.fileno())
+    os._exit(3)
+    """, entorno)
+    assert resultado.returncode == 3, resultado.stderr
+
+    clein = importar_clein()
+    backend = clein.almacenamiento.obtener_backend()
+    backend.recuperar()
+
+    hash_doc = hash_documento("registro de transacciones")
+    assert backend.buscar_documento(hash_doc)['ESTATUS'] == "Borrador"
+    assert backend.obtener_cabeza(hash_doc)['numero_bloque'] == 0
+    assert backend.cargar_bitacora(filtro_hash=hash_doc)['accion'].tolist() == ["Creado"]
+    assert os.path.getsize(clein.almacenamiento.ARCHIVO_TRANSACCIONES) == 0
+
+# ==========================================
+# CONCURRENCIA OPTIMISTA
+# ==========================================
+
+@pytest.mark.parametrize("backend_nombre", ["csv", "sqlite"])
+def test_cabeza_desactualizada_lanza_conflicto(entorno, monkeypatch, backend_nombre):
+    """Dos sesiones que leyeron la misma cabeza: la segunda en confirmar se descarta entera"""
+    monkeypatch.setenv("CLEIN_BACKEND", backend_nombre)
+    clein = importar_clein()
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    backend = almacenamiento.obtener_backend()
+    assert backend.nombre == backend_nombre
+
+    hash_doc = hash_documento(f"conflicto {backend_nombre}")
+    genesis = nuevo_bloque(validacion, hash_doc)
+    with almacenamiento.transaccion(backend) as actual:
+        actual.guardar_registro({'HASH': hash_doc, 'NOMBRE': "Procedimiento de prueba", 'ESTATUS': "Borrador"})
+        actual.anexar_bloque(hash_doc, genesis)
+
+    # Ambas sesiones construyen el bloque #1 sobre la misma cabeza leída
+    cabeza = backend.obtener_cabeza(hash_doc)
+    primera = nuevo_bloque(validacion, hash_doc, cabeza, accion="Publicado")
+    segunda = nuevo_bloque(validacion, hash_doc, cabeza, accion="Rechazado")
+    with almacenamiento.transaccion(backend) as actual:
+        actual.actualizar_registro(hash_doc, {'ESTATUS': "Publicado"})
+        actual.anexar_bloque(hash_doc, primera)
+
+    with pytest.raises(almacenamiento.ConflictoConcurrencia):
+        with almacenamiento.transaccion(backend) as actual:
+            actual.actualizar_registro(hash_doc, {'ESTATUS': "Rechazado"})
+            actual.anexar_bloque(hash_doc, segunda)
+
+    assert backend.buscar_documento(hash_doc)['ESTATUS'] == "Publicado"
+    assert backend.obtener_cabeza(hash_doc)['hash_bloque'] == primera['hash_bloque']
+    assert validacion.validar_cadena(hash_doc, completa=True)[0]
+
+@pytest.mark.parametrize("backend_nombre", ["csv", "sqlite"])
+def test_transacciones_concurrentes_se_confirman_en_un_lote(entorno, monkeypatch, backend_nombre):
+    """Las transacciones pendientes a la vez se confirman en un solo lote y en el orden de envío"""
+    monkeypatch.setenv("CLEIN_BACKEND", backend_nombre)
+    clein = importar_clein()
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    backend = almacenamiento.obtener_backend()
+
+    hash_doc = hash_documento(f"confirmación en grupo {backend_nombre}")
+    genesis = nuevo_bloque(validacion, hash_doc)
+    with almacenamiento.transaccion(backend) as actual:
+        actual.guardar_registro({'HASH': hash_doc, 'NOMBRE': "Procedimiento de prueba", 'ESTATUS': "Borrador"})
+        actual.anexar_bloque(hash_doc, genesis)
+
+    # Una ventana amplia asegura que el escritor junte todas las transacciones enviadas
+    monkeypatch.setattr(backend.escritor, 'ventana', 0.5)
+    lotes = backend.escritor.lotes
+    bloques, futuros = [genesis], []
+    for numero in range(1, 6):
+        bloques.append(nuevo_bloque(validacion, hash_doc, bloques[-1], accion=f"Revisión {numero}"))
+        pendiente = almacenamiento.Transaccion(backend)
+        pendiente.actualizar_registro(hash_doc, {'ESTATUS': f"Revisión {numero}"})
+        pendiente.anexar_bloque(hash_doc, bloques[-1])
+        futuros.append(pendiente.enviar())
+    # Construida sobre el génesis: la cadena ya avanzó dentro del mismo lote
+    atrasada = almacenamiento.Transaccion(backend)
+    atrasada.anexar_bloque(hash_doc, nuevo_bloque(validacion, hash_doc, genesis, accion="Rechazado"))
+    futuros.append(atrasada.enviar())
+    assert not any(futuro.done() for futuro in futuros)
+
+    for futuro, bloque in zip(futuros, bloques[1:]):
+        assert [(h, b['hash_bloque']) for h, b in futuro.result(timeout=30)] == [(hash_doc, bloque['hash_bloque'])]
+    assert isinstance(futuros[-1].exception(timeout=30), almacenamiento.ConflictoConcurrencia)
+    assert backend.escritor.lotes == lotes + 1
+
+    assert backend.cargar_blockchain(hash_doc)['hash_bloque'].tolist() == [b['hash_bloque'] for b in bloques]
+    assert backend.buscar_documento(hash_doc)['ESTATUS'] == "Revisión 5"
+    assert validacion.validar_cadena(hash_doc, completa=True)[0]
+
+# ==========================================
+# INSTANTÁNEAS DE ESTADO
+# ==========================================
+
+@pytest.mark.parametrize("backend_nombre", ["csv", "sqlite"])
+def test_estado_desde_instantanea_igual_a_reproduccion_completa(entorno, monkeypatch, backend_nombre):
+    """El estado y el hash acumulado en cada bloque coinciden con reproducir la cadena desde el génesis"""
+    monkeypatch.setenv("CLEIN_BACKEND", backend_nombre)
+    clein = importar_clein()
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    monkeypatch.setattr(almacenamiento, 'INTERVALO_INSTANTANEAS', 3)
+    backend = almacenamiento.obtener_backend()
+
+    hash_doc = hash_documento(f"instantáneas {backend_nombre}")
+    bloque = None
+    for numero, estatus in enumerate(["Borrador", "Publicado", "Publicado", "Vigente", "", "Obsoleto", "Vigente", "Obsoleto"]):
+        bloque = nuevo_bloque(validacion, hash_doc, bloque, accion=f"Acción {numero}")
+        bloque['estatus'] = estatus
+        bloque['version'] = numero // 2
+        bloque['hash_bloque'] = validacion.calcular_hash_bloque(bloque)
+        backend.anexar_bloque(hash_doc, bloque)
+    assert backend.obtener_instantanea(hash_doc)['numero_bloque'] == 5
+
+    # Reproducción completa sin instantáneas
+    estado, hash_acumulado, esperados = {}, '0', []
+    for bloque in backend.cargar_bloques_desde(hash_doc, 0):
+        almacenamiento.aplicar_bloque(estado, bloque)
+        hash_acumulado = almacenamiento.calcular_hash_acumulado(hash_acumulado, bloque)
+        esperados.append({'numero_bloque': int(bloque['numero_bloque']), 'hash_bloque': bloque['hash_bloque'],
+                          'hash_acumulado': hash_acumulado, 'estado': dict(estado)})
+
+    for esperado in esperados:
+        assert almacenamiento.estado_documento(backend, hash_doc, esperado['numero_bloque']) == esperado
+    assert almacenamiento.estado_documento(backend, hash_doc) == esperados[-1]
+    assert esperados[4]['estado']['estatus'] == "Vigente"
+
+# ==========================================
+# MIGRACIÓN A LA DISPOSICIÓN FRAGMENTADA
+# ==========================================
+
+@pytest.mark.parametrize("formato", ["csv", "binario"])
+def test_migracion_interrumpida_entre_enlace_y_borrado_se_completa(entorno, monkeypatch, formato):
+    """Un corte con la cadena enlazada en ambas rutas no la pierde ni la duplica al reanudar"""
+    monkeypatch.setenv("CLEIN_FORMATO_CADENA", formato)
+    resultado = ejecutar_proceso("""
+    import os
+    import almacenamiento
+    import validacion
+    from conftest import hash_documento, nuevo_bloque
+
+    hash_doc = hash_documento("migración interrumpida")
+    almacenamiento.anexar_bloque(hash_doc, nuevo_bloque(validacion, hash_doc))
+    ruta = almacenamiento.ruta_blockchain(hash_doc)
+    for origen in (ruta, almacenamiento.ruta_diccionario(ruta) if ruta.endswith('.blk') else None):
+        if origen:
+            os.replace(origen, almacenamiento.ruta_datos(os.path.basename(origen)))
+
+    # Cortar justo después de enlazar en el destino, antes de borrar el archivo plano
+    os.unlink = lambda ruta: os._exit(3)
+    almacenamiento.migrar_cadenas_fragmentadas()
+    """, entorno)
+    assert resultado.returncode == 3, resultado.stderr
+
+    clein = importar_clein()
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    hash_doc = hash_documento("migración interrumpida")
+    plano = almacenamiento.ruta_datos(os.path.basename(almacenamiento.ruta_blockchain(hash_doc)))
+    assert os.path.exists(plano) and os.path.exists(almacenamiento.ruta_fragmentada(hash_doc, os.path.basename(plano)))
+
+    assert almacenamiento.migrar_cadenas_fragmentadas() == 1
+    assert almacenamiento._archivos_planos() == []
+    assert not any(nombre.startswith("blockchain_") for nombre in os.listdir(almacenamiento.DIRECTORIO_DATOS))
+
+    backend = almacenamiento.obtener_backend()
+    genesis = backend.obtener_cabeza(hash_doc)
+    siguiente = nuevo_bloque(validacion, hash_doc, genesis, accion="Publicado")
+    backend.anexar_bloque(hash_doc, siguiente)
+    assert almacenamiento.ruta_blockchain(hash_doc) == almacenamiento.ruta_fragmentada(hash_doc, os.path.basename(plano))
+    assert backend.cargar_blockchain(hash_doc)['numero_bloque'].tolist() == [0, 1]
+    assert validacion.validar_cadena(hash_doc, completa=True)[0]
+
+# ==========================================
+# ÍNDICE ORDENADO DE DIGESTOS
+# ==========================================
+
+def test_indice_digestos_antes_y_despues_de_fusionar(clein, entorno):
+    """buscar da la misma fila con los cambios pendientes, tras fusionarlos y tras guardar y cargar"""
+    almacenamiento = clein.almacenamiento
+    # Digests que terminan en bytes nulos (numpy los devuelve recortados) y sus vecinos sin ellos
+    con_nulos = ['ab' * 31 + '00', 'cd' * 30 + '0000', '00' * 32]
+    hashes = [hash_documento(f"documento {numero}") for numero in range(5)] + con_nulos
+    hashes.append(hashes[1])
+    indice = almacenamiento.IndiceDigestos(str(entorno / "digestos.bin"))
+    indice.construir(hashes + ["no es un hash"])
+
+    # Un hash repetido conserva su primera fila
+    esperado = {hash_doc: fila for fila, hash_doc in reversed(list(enumerate(hashes)))}
+    ausentes = ['ab' * 32, 'ab' * 31 + '01', 'cd' * 31 + '00', 'ef' * 31 + '00', "no es un hash"]
+
+    def comprobar():
+        for hash_doc, fila in esperado.items():
+            assert indice.buscar(hash_doc) == fila, hash_doc
+        for hash_doc in ausentes:
+            assert indice.buscar(hash_doc) is None, hash_doc
+
+    comprobar()
+
+    # Cambios pendientes: altas (una con nulos finales), una baja y un alta que ya existía
+    indice.agregar('ef' * 31 + '00', 20)
+    indice.agregar(hash_documento("documento nuevo"), 21)
+    indice.agregar(hashes[0], 22)
+    indice.quitar(hashes[2])
+    indice.quitar('cd' * 30 + '0000')
+    esperado.update({'ef' * 31 + '00': 20, hash_documento("documento nuevo"): 21})
+    for hash_doc in (hashes[2], 'cd' * 30 + '0000'):
+        del esperado[hash_doc]
+        ausentes.append(hash_doc)
+    ausentes.remove('ef' * 31 + '00')
+    comprobar()
+
+    indice.fusionar()
+    assert not indice.agregados and not indice.quitados
+    assert list(indice.digestos) == sorted(indice.digestos)
+    comprobar()
+
+    firma = (1, 2, 3)
+    indice.guardar(firma)
+    indice = almacenamiento.IndiceDigestos(indice.ruta)
+    assert indice.cargar(firma, []) is False
+    comprobar()
+
+# ==========================================
+# ÍNDICES SECUNDARIOS DEL REGISTRO
+# ==========================================
+
+@pytest.mark.parametrize("backend_nombre", ["csv", "sqlite"])
+def test_filtrar_registros_igual_a_recorrido_completo(entorno, monkeypatch, backend_nombre):
+    """Los filtros por AREA, ESTATUS y TIPO dan las mismas filas que recorrer todo el registro"""
+    monkeypatch.setenv("CLEIN_BACKEND", backend_nombre)
+    clein = importar_clein()
+    almacenamiento = clein.almacenamiento
+    backend = almacenamiento.obtener_backend()
+
+    areas, tipos = ["Calidad", "Producción", "Almacén"], ["Procedimiento", "Formato"]
+    hashes = [hash_documento(f"índice secundario {numero}") for numero in range(12)]
+    with almacenamiento.transaccion(backend) as actual:
+        for numero, hash_doc in enumerate(hashes[:8]):
+            actual.guardar_registro({'HASH': hash_doc, 'NOMBRE': f"Documento {numero}", 'AREA': areas[numero % 3],
+                                     'TIPO': tipos[numero % 2], 'ESTATUS': "Borrador"})
+    if backend_nombre == "csv":
+        # Parte de las filas queda en el CSV base y el resto como cambios en memoria
+        backend.transacciones.punto_control()
+
+    with almacenamiento.transaccion(backend) as actual:
+        for numero, hash_doc in enumerate(hashes[8:], start=8):
+            actual.guardar_registro({'HASH': hash_doc, 'NOMBRE': f"Documento {numero}", 'AREA': areas[numero % 3],
+                                     'TIPO': tipos[numero % 2], 'ESTATUS': "Borrador"})
+        # Cambios de estatus y de área en filas del CSV base y en altas recientes
+        for hash_doc in (hashes[0], hashes[3], hashes[9]):
+            actual.actualizar_registro(hash_doc, {'ESTATUS': "Pendiente de aprobación"})
+        actual.actualizar_registro(hashes[3], {'ESTATUS': "Vigente"})
+        actual.actualizar_registro(hashes[4], {'AREA': "Calidad", 'ESTATUS': "Rechazado"})
+        actual.actualizar_registro(hashes[10], {'TIPO': "Procedimiento"})
+
+    def filas(df_registros):
+        return df_registros[almacenamiento.COLUMNAS_REGISTRO].fillna('').astype(str).to_dict('records')
+
+    def comprobar():
+        todos = backend.cargar_registros()
+        for criterios in [
+            {'AREA': "Calidad"},
+            {'ESTATUS': "Pendiente de aprobación"},
+            {'ESTATUS': ["Vigente", "Rechazado"]},
+            {'AREA': ["Calidad", "Almacén"], 'TIPO': "Procedimiento"},
+            {'AREA': "Producción", 'ESTATUS': "Borrador", 'TIPO': "Formato"},
+            {'AREA': "Inexistente"},
+            {'AREA': None},
+        ]:
+            mascara = pd.Series(True, index=todos.index)
+            for columna, valores in almacenamiento.normalizar_criterios(criterios).items():
+                mascara &= todos[columna].isin(valores)
+            assert filas(backend.filtrar_registros(criterios)) == filas(todos[mascara]), criterios
+        assert backend.filtrar_registros({'ESTATUS': "Pendiente de aprobación"})['HASH'].tolist() == [hashes[0], hashes[9]]
+
+    comprobar()
+    if backend_nombre == "csv":
+        # Y con todo el registro en el CSV base tras el siguiente punto de control
+        backend.transacciones.punto_control()
+        comprobar()
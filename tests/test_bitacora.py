@@ -0,0 +1,162 @@
+import json
+import sqlite3
+
+import pytest
+
+from conftest import hash_documento, importar_clein
+
+# Partición donde caen los eventos de prueba
+PARTICION = "eventos_2025-08.csv"
+
+# ==========================================
+# SELLOS Y VERIFICACIÓN DE LA BITÁCORA
+# ==========================================
+
+def _evento(numero):
+    """Evento de prueba con un comentario distinto por número"""
+    return {
+        'hash': hash_documento("bitácora"),
+        'fecha_hora': f"2025-08-01 10:{numero:02d}:00",
+        'usuario': "pruebas",
+        'rol': "Administrador",
+        'accion': "Revisado",
+        'comentario_opcional': f"comentario {numero:02d}"
+    }
+
+def _bitacora_sellada(clein, eventos=6):
+    """Bitácora CSV con 'eventos' eventos sellados y verificados una vez"""
+    bitacora = clein.bitacora.obtener_bitacora()
+    for numero in range(eventos):
+        bitacora.anexar(_evento(numero))
+    bitacora.sellar()
+    assert bitacora.verificar()['valida']
+    return bitacora
+
+def _alterar_particion(bitacora, antes, despues):
+    """Reemplaza un texto en la partición de agosto de 2025 sin cambiar su tamaño"""
+    ruta = bitacora._ruta(PARTICION)
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    assert contenido.count(antes) == 1 and len(antes) == len(despues)
+    with open(ruta, 'wb') as f:
+        f.write(contenido.replace(antes, despues))
+
+def test_evento_alterado_en_la_particion_se_detecta(clein):
+    """Editar un evento sellado rompe su hash y la verificación completa lo informa"""
+    bitacora = _bitacora_sellada(clein)
+    _alterar_particion(bitacora, b"comentario 02", b"comentario 99")
+
+    resultado = bitacora.verificar(completa=True)
+    assert not resultado['valida']
+    assert any("evento alterado" in problema for problema in resultado['problemas'])
+
+def test_registro_de_verificacion_falsificado_obliga_a_revisar_todo(clein):
+    """Un registro de verificación sin firma válida se ignora y se revisa desde el primer evento"""
+    bitacora = _bitacora_sellada(clein)
+    _alterar_particion(bitacora, b"comentario 01", b"comentario 98")
+
+    # Adelantar la fecha del registro sin poder volver a firmarlo
+    with open(bitacora.ruta_verificacion, 'r', encoding='utf-8') as f:
+        verificacion = json.load(f)
+    verificacion['fecha_hora'] = "2099-01-01 00:00:00"
+    with open(bitacora.ruta_verificacion, 'w', encoding='utf-8') as f:
+        json.dump(verificacion, f)
+
+    resultado = bitacora.verificar()
+    assert not resultado['valida']
+    assert any("evento alterado" in problema for problema in resultado['problemas'])
+
+def test_sello_con_otra_clave_no_verifica(entorno, monkeypatch):
+    """Los sellos firmados con una clave no verifican con otra"""
+    monkeypatch.setenv("CLEIN_CLAVE_BITACORA", "clave original")
+    clein = importar_clein()
+    _bitacora_sellada(clein)
+
+    monkeypatch.setenv("CLEIN_CLAVE_BITACORA", "otra clave")
+    resultado = importar_clein().bitacora.obtener_bitacora().verificar()
+    assert not resultado['valida']
+    assert "Firma inválida en el sello #1" in resultado['problemas']
+
+def test_clave_dentro_del_directorio_de_datos_se_rechaza(entorno, monkeypatch):
+    """El archivo de clave no puede quedar donde se escriben los datos"""
+    monkeypatch.setenv("CLEIN_ARCHIVO_CLAVE_BITACORA", str(entorno / "datos" / "clave_bitacora.key"))
+    bitacora = importar_clein().bitacora
+    with pytest.raises(bitacora.ErrorClaveBitacora):
+        bitacora.obtener_bitacora()
+
+# ==========================================
+# BITÁCORA EN SQLITE
+# ==========================================
+
+def test_evento_alterado_en_sqlite_se_detecta(entorno, monkeypatch):
+    """Editar un evento sellado en la base de datos rompe su hash"""
+    monkeypatch.setenv("CLEIN_BACKEND", "sqlite")
+    monkeypatch.setenv("CLEIN_TRANSACCIONES_POR_PUNTO", "4")
+    clein = importar_clein()
+    almacenamiento = clein.almacenamiento
+    backend = almacenamiento.obtener_backend()
+    for numero in range(8):
+        with almacenamiento.transaccion(backend) as actual:
+            actual.registrar_bitacora(_evento(numero))
+
+    resultado = backend.verificar_bitacora()
+    assert resultado['valida'] and resultado['sello'] == 2
+
+    with sqlite3.connect(almacenamiento.BASE_DATOS_SQLITE) as conexion:
+        conexion.execute(
+            "UPDATE eventos SET comentario_opcional = 'comentario 99' WHERE comentario_opcional = 'comentario 02'"
+        )
+    resultado = backend.verificar_bitacora(completa=True)
+    assert not resultado['valida']
+    assert resultado['problemas']
+
+# ==========================================
+# ÍNDICE POR DOCUMENTO Y POR USUARIO
+# ==========================================
+
+@pytest.mark.parametrize("backend_nombre", ["csv", "sqlite"])
+def test_busqueda_por_documento_igual_a_recorrido_completo(entorno, monkeypatch, backend_nombre):
+    """Los eventos por hash, por lista de hashes y por usuario coinciden con filtrar la bitácora completa"""
+    monkeypatch.setenv("CLEIN_BACKEND", backend_nombre)
+    clein = importar_clein()
+    almacenamiento = clein.almacenamiento
+    backend = almacenamiento.obtener_backend()
+    hashes = [hash_documento(f"índice de bitácora {numero}") for numero in range(20)]
+    usuarios = ["ana", "beto", "carla"]
+
+    def registrar(desde, hasta):
+        # Eventos repartidos entre dos particiones mensuales
+        with almacenamiento.transaccion(backend) as actual:
+            for numero in range(desde, hasta):
+                actual.registrar_bitacora({
+                    'hash': hashes[numero % len(hashes)],
+                    'fecha_hora': f"2025-{7 + numero % 2:02d}-{1 + numero // 4:02d} 10:{numero % 60:02d}:00",
+                    'usuario': usuarios[numero % len(usuarios)],
+                    'rol': "Administrador",
+                    'accion': "Revisado",
+                    'comentario_opcional': f"evento {numero}"
+                })
+
+    def eventos(df_bitacora):
+        return df_bitacora[clein.bitacora.COLUMNAS_BITACORA].to_dict('records')
+
+    def comprobar():
+        completa = backend.cargar_bitacora()
+        for hash_doc in hashes:
+            esperados = completa[completa['hash'] == hash_doc]
+            assert eventos(backend.cargar_bitacora(filtro_hash=hash_doc)) == eventos(esperados)
+            assert eventos(backend.cargar_bitacora(filtro_hash=hash_doc, ultimos=2)) == eventos(esperados.head(2))
+        # Una lista grande de documentos lee las particiones enteras en lugar de usar el índice
+        for seleccion in (hashes[:2], hashes[::2]):
+            esperados = completa[completa['hash'].isin(seleccion)]
+            assert eventos(backend.cargar_bitacora(hashes=seleccion)) == eventos(esperados)
+        for usuario in usuarios:
+            esperados = completa[completa['usuario'] == usuario]
+            assert eventos(backend.cargar_bitacora(filtro_usuario=usuario)) == eventos(esperados)
+        assert eventos(backend.cargar_bitacora(filtro_hash=hash_documento("sin eventos"))) == []
+
+    registrar(0, 60)
+    comprobar()
+    # Los índices se ponen al día con los eventos agregados después de consultarlos
+    registrar(60, 80)
+    comprobar()
@@ -0,0 +1,184 @@
+import pytest
+
+from conftest import hash_documento, importar_aplicacion, importar_clein
+
+# ==========================================
+# UTILIDADES DE LAS PRUEBAS
+# ==========================================
+
+def _iniciar_sesion(aplicacion, nombre, rol="Aprobador"):
+    """Deja en la sesión de Streamlit al usuario que decide"""
+    aplicacion.st.session_state['name'] = nombre
+    aplicacion.st.session_state['rol'] = rol
+    aplicacion.st.session_state['area'] = "Calidad"
+
+def _registrar_documento(aplicacion, nombre, estatus="Publicado"):
+    """Registra un documento con su génesis y devuelve su hash"""
+    hash_doc = hash_documento(nombre)
+    aplicacion.guardar_registro({
+        'HASH': hash_doc, 'NOMBRE': nombre, 'TIPO': "Procedimiento",
+        'FECHA_CREACION': "2025-08-01 10:00:00", 'FECHA_ACTUALIZACION': "2025-08-01 10:00:00",
+        'VERSION': "1", 'ESTATUS': estatus, 'MODIFICACION': "", 'CREADOR': "Autor", 'AREA': "Calidad",
+        'REVISOR': "", 'APROBADOR': "", 'NO_CONFORMIDAD': "", 'AUDITORIA': ""
+    })
+    return hash_doc
+
+# ==========================================
+# DECISIONES EN LOTE
+# ==========================================
+
+def test_lote_mixto_se_confirma_en_un_solo_commit(aplicacion):
+    """Aprobaciones y rechazos válidos van en una transacción; los inválidos vuelven como errores"""
+    _iniciar_sesion(aplicacion, "Revisora")
+    aprobar, otra, rechazar, sin_comentario, vigente = [
+        _registrar_documento(aplicacion, f"Documento {letra}") for letra in "ABCD"
+    ] + [_registrar_documento(aplicacion, "Documento E", estatus="Vigente")]
+    backend = aplicacion.obtener_backend()
+    secuencia, lotes = backend.transacciones.secuencia, backend.escritor.lotes
+
+    confirmados, errores = aplicacion.decidir_documentos_en_lote([
+        (aprobar, 'Aprobado', ""),
+        (otra, 'Aprobado', "Listo para publicar"),
+        (rechazar, 'Rechazado', "Falta la firma"),
+        (sin_comentario, 'Rechazado', "  "),
+        (vigente, 'Aprobado', ""),
+        (aprobar, 'Rechazado', "Repetido en el lote"),
+    ])
+
+    assert confirmados == [aprobar, otra, rechazar]
+    assert errores == [
+        (sin_comentario, "El rechazo requiere un comentario"),
+        (vigente, "El documento ya está vigente"),
+        (aprobar, "El documento aparece más de una vez en el lote"),
+    ]
+    # Una sola transacción en el registro de transacciones, confirmada en un solo lote
+    assert backend.transacciones.secuencia == secuencia + 1
+    assert backend.escritor.lotes == lotes + 1
+
+    for hash_doc, decision, estatus in [
+        (aprobar, 'Aprobado', "Vigente"), (otra, 'Aprobado', "Vigente"), (rechazar, 'Rechazado', "Rechazado")
+    ]:
+        documento = aplicacion.cargar_documento(hash_doc)
+        assert documento['ESTATUS'] == estatus
+        cadena = aplicacion.cargar_blockchain_documento(hash_doc)
+        assert cadena['accion'].tolist()[-1] == decision and cadena['usuario_accion'].tolist()[-1] == "Revisora"
+        assert aplicacion.cargar_bitacora(filtro_hash=hash_doc)['accion'].tolist()[0] == decision
+        assert aplicacion.validar_integridad_cadena(hash_doc, completa=True)[0]
+    assert aplicacion.cargar_documento(aprobar)['APROBADOR'] == "Revisora"
+    assert "Rechazado: Falta la firma" in aplicacion.cargar_documento(rechazar)['MODIFICACION']
+    for hash_doc, estatus in [(sin_comentario, "Publicado"), (vigente, "Vigente")]:
+        assert aplicacion.cargar_documento(hash_doc)['ESTATUS'] == estatus
+        assert len(aplicacion.cargar_blockchain_documento(hash_doc)) == 1
+
+def test_decision_repetida_se_detecta_con_el_indice(aplicacion, monkeypatch):
+    """La decisión repetida del mismo usuario se detecta con realizo_accion, sin leer la cadena"""
+    _iniciar_sesion(aplicacion, "Revisora")
+    hash_doc = _registrar_documento(aplicacion, "Documento rechazado y reenviado")
+    # Rechazado por la revisora y devuelto a revisión sin cambiar el estatus del registro
+    aplicacion.agregar_bloque_a_cadena(hash_doc, 'Rechazado', aplicacion.cargar_documento(hash_doc))
+    backend = aplicacion.obtener_backend()
+    assert backend.realizo_accion(hash_doc, 'Rechazado', "Revisora")
+    assert not backend.realizo_accion(hash_doc, 'Rechazado', "Otro revisor")
+
+    def sin_lectura_completa(*args, **kwargs):
+        raise AssertionError("la validación no debe leer la cadena completa")
+
+    monkeypatch.setattr(backend, 'cargar_blockchain', sin_lectura_completa)
+    monkeypatch.setattr(backend, 'cargar_registros', sin_lectura_completa)
+
+    confirmados, errores = aplicacion.decidir_documentos_en_lote([(hash_doc, 'Rechazado', "Sigue sin firma")])
+    assert confirmados == []
+    assert errores == [(hash_doc, aplicacion.DECISIONES['Rechazado']['repetida'])]
+
+    # Otro usuario sí puede tomar la misma decisión
+    _iniciar_sesion(aplicacion, "Otro revisor")
+    confirmados, errores = aplicacion.decidir_documentos_en_lote([(hash_doc, 'Rechazado', "Sigue sin firma")])
+    assert confirmados == [hash_doc] and errores == []
+    assert backend.realizo_accion(hash_doc, 'Rechazado', "Otro revisor")
+
+@pytest.mark.parametrize("backend_nombre", ["csv", "sqlite"])
+def test_cabeza_desactualizada_descarta_todo_el_lote(entorno, monkeypatch, backend_nombre):
+    """Si otra sesión avanza la cadena de un documento del lote, no se aplica ninguna decisión"""
+    monkeypatch.setenv("CLEIN_BACKEND", backend_nombre)
+    importar_clein()
+    aplicacion = importar_aplicacion()
+    _iniciar_sesion(aplicacion, "Revisora")
+    primero, segundo = [_registrar_documento(aplicacion, f"Lote atómico {numero}") for numero in (1, 2)]
+    backend = aplicacion.obtener_backend()
+    assert backend.nombre == backend_nombre
+
+    # Otra sesión anexa un bloque al primer documento después de que el lote leyó su cabeza
+    anotar_decision = aplicacion.anotar_decision
+
+    def anotar_y_adelantar(hash_doc, *args):
+        anotar_decision(hash_doc, *args)
+        if hash_doc == segundo:
+            aplicacion.agregar_bloque_a_cadena(primero, "Revisado", aplicacion.cargar_documento(primero))
+
+    monkeypatch.setattr(aplicacion, 'anotar_decision', anotar_y_adelantar)
+    confirmados, errores = aplicacion.decidir_documentos_en_lote([
+        (primero, 'Aprobado', ""), (segundo, 'Rechazado', "Falta la firma")
+    ])
+
+    assert confirmados == []
+    assert errores == [(primero, aplicacion.MENSAJE_CONFLICTO), (segundo, aplicacion.MENSAJE_CONFLICTO)]
+    for hash_doc, acciones in [(primero, ["Documento Creado", "Revisado"]), (segundo, ["Documento Creado"])]:
+        assert aplicacion.cargar_documento(hash_doc)['ESTATUS'] == "Publicado"
+        assert aplicacion.cargar_blockchain_documento(hash_doc)['accion'].tolist() == acciones
+        assert aplicacion.cargar_bitacora(filtro_hash=hash_doc).empty
+        assert aplicacion.validar_integridad_cadena(hash_doc, completa=True)[0]
+
+# ==========================================
+# IMPORTACIÓN MASIVA DE CARPETAS
+# ==========================================
+
+def test_importar_carpeta_omite_duplicados(aplicacion, entorno):
+    """Los archivos repetidos en la carpeta o ya registrados se omiten; el resto entra en un solo commit"""
+    _iniciar_sesion(aplicacion, "Importador", rol="Administrador")
+    existente = _registrar_documento(aplicacion, "Documento existente")
+    carpeta = entorno / "archivo"
+    (carpeta / "sub").mkdir(parents=True)
+    contenidos = {
+        "procedimiento_compras_v2.pdf": b"procedimiento de compras",
+        "sub/copia.pdf": b"procedimiento de compras",
+        "formato_alta.docx": b"formato de alta",
+        "sub/reporte_ventas_3.XLSX": b"reporte de ventas",
+        "existente.txt": "Documento existente".encode('utf-8'),
+        "notas.md": b"no es un documento",
+    }
+    for nombre, contenido in contenidos.items():
+        (carpeta / nombre).write_bytes(contenido)
+    backend = aplicacion.obtener_backend()
+    secuencia = backend.transacciones.secuencia
+
+    resumen = aplicacion.importar_carpeta(str(carpeta), hilos=4)
+
+    assert resumen['archivos'] == 5 and resumen['errores'] == []
+    assert resumen['duplicados'] == [str(carpeta / "existente.txt"), str(carpeta / "sub" / "copia.pdf")]
+    importados = {registro['NOMBRE']: registro for registro in resumen['importados']}
+    assert len(importados) == 3
+    for relativa in ("procedimiento_compras_v2.pdf", "formato_alta.docx", "sub/reporte_ventas_3.XLSX"):
+        nombre = (carpeta / relativa).name
+        registro = importados[aplicacion.limpiar_nombre_archivo(nombre)]
+        assert registro['HASH'] == aplicacion.calcular_hash(contenidos[relativa])
+        assert registro['TIPO'] == aplicacion.detectar_tipo_archivo(nombre)
+        assert registro['VERSION'] == aplicacion.detectar_version(nombre)
+        assert aplicacion.cargar_documento(registro['HASH'])['ESTATUS'] == "Publicado"
+        assert aplicacion.cargar_blockchain_documento(registro['HASH'])['accion'].tolist() == ["Documento Creado"]
+        assert aplicacion.cargar_bitacora(filtro_hash=registro['HASH'])['accion'].tolist() == ["Documento Subido"]
+    # Registros, génesis y bitácora de toda la carpeta en una sola transacción
+    assert backend.transacciones.secuencia == secuencia + 1
+    assert len(aplicacion.cargar_blockchain_documento(existente)) == 1
+    assert len(aplicacion.cargar_registros()) == 4
+
+    # La verificación de integridad recorre los mismos archivos que la importación
+    escaneados, error = aplicacion.escanear_archivos_carpeta(str(carpeta))
+    assert error is None
+    assert sorted(archivo['ruta_completa'] for archivo in escaneados) == [
+        str(ruta) for ruta in aplicacion.listar_archivos_importacion(carpeta)
+    ]
+
+    # Una segunda importación de la misma carpeta no registra nada
+    resumen = aplicacion.importar_carpeta(str(carpeta), hilos=4)
+    assert resumen['importados'] == [] and len(resumen['duplicados']) == 5
+    assert backend.transacciones.secuencia == secuencia + 1
@@ -0,0 +1,77 @@
+import hashlib
+
+import pytest
+
+from conftest import hash_documento, nuevo_bloque
+
+# ==========================================
+# PRUEBAS DE INCLUSIÓN
+# ==========================================
+
+def _hash_bloque(hash_doc, numero):
+    """Hash de bloque de prueba"""
+    return hashlib.sha256(f"{hash_doc}{numero}".encode('utf-8')).hexdigest()
+
+@pytest.mark.parametrize("total", [1, 2, 3, 7, 8, 11])
+def test_prueba_de_cada_bloque_verifica_contra_la_raiz(clein, total):
+    """Cada bloque tiene una prueba válida en su cadena, y la cadena en la raíz global"""
+    merkle = clein.merkle
+    documentos = [hash_documento(f"merkle {total} {i}") for i in range(3)]
+    for hash_doc in documentos:
+        for numero in range(total):
+            merkle.registrar_bloque(hash_doc, _hash_bloque(hash_doc, numero))
+
+    raiz_global = merkle.raiz_global()
+    for hash_doc in documentos:
+        raiz = merkle.raiz_cadena(hash_doc, en_bytes=False)
+        for numero in range(total):
+            prueba = merkle.prueba_inclusion(hash_doc, numero)
+            assert prueba['total_bloques'] == total
+            assert merkle.verificar_prueba_bloque(_hash_bloque(hash_doc, numero), prueba, raiz)
+        prueba_global = merkle.prueba_inclusion_global(hash_doc)
+        assert prueba_global['raiz_cadena'] == raiz
+        assert merkle.verificar_prueba_global(prueba_global, raiz_global)
+
+    assert merkle.prueba_inclusion(documentos[0], total) is None
+    assert merkle.prueba_inclusion_global(hash_documento("sin cadena")) is None
+
+def test_pruebas_alteradas_no_verifican(clein):
+    """Un bloque distinto, un camino cambiado o una raíz anterior no pasan la verificación"""
+    merkle = clein.merkle
+    hash_doc = hash_documento("merkle alterado")
+    for numero in range(5):
+        merkle.registrar_bloque(hash_doc, _hash_bloque(hash_doc, numero))
+    raiz = merkle.raiz_cadena(hash_doc, en_bytes=False)
+    prueba = merkle.prueba_inclusion(hash_doc, 2)
+
+    assert not merkle.verificar_prueba_bloque(_hash_bloque(hash_doc, 3), prueba, raiz)
+    lado, valor = prueba['camino'][0]
+    alterada = dict(prueba, camino=[(lado, valor[:-1] + ('0' if valor[-1] != '0' else '1'))] + prueba['camino'][1:])
+    assert not merkle.verificar_prueba_bloque(_hash_bloque(hash_doc, 2), alterada, raiz)
+
+    raiz_global = merkle.raiz_global()
+    merkle.registrar_bloque(hash_doc, _hash_bloque(hash_doc, 5))
+    raiz_nueva = merkle.raiz_cadena(hash_doc, en_bytes=False)
+    assert not merkle.verificar_prueba_bloque(_hash_bloque(hash_doc, 2), prueba, raiz_nueva)
+    assert not merkle.verificar_prueba_global(merkle.prueba_inclusion_global(hash_doc), raiz_global)
+
+def test_cabeza_en_sello_detecta_un_bloque_editado(clein):
+    """Tras sellar, la cabeza de una cadena editada en disco ya no está en la raíz sellada"""
+    almacenamiento, validacion = clein.almacenamiento, clein.validacion
+    backend = almacenamiento.obtener_backend()
+    hash_doc = hash_documento("sello")
+    anterior = None
+    for accion in ("Creado", "Publicado"):
+        anterior = nuevo_bloque(validacion, hash_doc, anterior, accion)
+        with almacenamiento.transaccion(backend) as actual:
+            actual.anexar_bloque(hash_doc, anterior)
+
+    raiz_sellada = validacion.sellar_sistema([hash_doc])
+    assert validacion.cabeza_en_sello(backend, hash_doc, raiz_sellada)
+
+    ruta = almacenamiento.ruta_blockchain(hash_doc)
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    with open(ruta, 'wb') as f:
+        f.write(contenido.replace(b'Publicado', b'Rechazado'))
+    assert not validacion.cabeza_en_sello(backend, hash_doc, raiz_sellada)